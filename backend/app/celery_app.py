@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+from typing import Any, Coroutine, Optional
+
+from celery import Celery
+from dotenv import load_dotenv
+from kombu import Queue
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Queues by priority: a worker takes from "high" whenever it has units and
+# only then from "default" and "low" (queue_order_strategy below)
+QUEUES = ("high", "default", "low")
+
+# Seconds a delivered unit stays invisible before the broker hands it to
+# another worker; must exceed the longest scrape of a single URL
+VISIBILITY_TIMEOUT = int(os.getenv("CELERY_VISIBILITY_TIMEOUT", "3600"))
+UNIT_TIME_LIMIT = int(os.getenv("SCRAPE_UNIT_TIME_LIMIT", "900"))
+UNIT_MAX_RETRIES = int(os.getenv("SCRAPE_UNIT_MAX_RETRIES", "3"))
+
+broker_url = os.getenv("CELERY_BROKER_URL") or os.getenv("REDIS_URL") or "memory://"
+
+celery_app = Celery("ai_scraper", broker=broker_url)
+celery_app.conf.update(
+    task_queues=[Queue(name) for name in QUEUES],
+    task_default_queue="default",
+    task_serializer="json",
+    accept_content=["json"],
+    # A unit is only acknowledged once it has run, and goes back on the
+    # queue if its worker dies, so no URL is lost with a crashed worker
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_time_limit=UNIT_TIME_LIMIT + 60,
+    task_soft_time_limit=UNIT_TIME_LIMIT,
+    broker_transport_options={
+        "visibility_timeout": VISIBILITY_TIMEOUT,
+        # The Redis transport polls queues round-robin by default, which
+        # would drain "low" as eagerly as "high"
+        "queue_order_strategy": "priority",
+    },
+    task_ignore_result=True,
+)
+
+# Each worker process keeps one event loop so the browser pool, HTTP client
+# and rate limiter survive from one unit to the next
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_worker_service = None
+
+
+def run_async(coro: Coroutine) -> Any:
+    """Run a coroutine on this worker process's event loop"""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+
+def get_worker_service():
+    """Return the ScraperService used by this worker process"""
+    global _worker_service
+    if _worker_service is None:
+        from .services.scraper_service import ScraperService
+        _worker_service = ScraperService()
+        run_async(_worker_service.warm_up())
+    return _worker_service
+
+
+@celery_app.task(bind=True, name="scraper.scrape_unit", autoretry_for=(Exception,),
+                 max_retries=UNIT_MAX_RETRIES, retry_backoff=5, retry_backoff_max=300,
+                 retry_jitter=True)
+def scrape_unit(self, job_id: str, site: str, url: str, max_products: int = 100,
+                use_ai_parsing: bool = True) -> int:
+    """Scrape one URL of a job with its site's scraper"""
+    final_attempt = self.request.retries >= self.max_retries
+    service = get_worker_service()
+    saved = run_async(service.run_unit(
+        job_id, site, url,
+        max_products=max_products,
+        use_ai_parsing=use_ai_parsing,
+        attempt=self.request.retries + 1,
+        final_attempt=final_attempt
+    ))
+    # The loop only runs during tasks, so deliver this unit's alerts before returning
+    run_async(service.flush_alerts())
+    return saved
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, JSON, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import ARRAY
 from .database import Base
@@ -7,6 +7,16 @@ import uuid
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Upsert target for scrape batches: one row per listing per site
+        UniqueConstraint("competitor", "url", name="uq_products_competitor_url"),
+        # Incremental exports of changed listings
+        Index("ix_products_scraped_at_id", "scraped_at", "id"),
+        # Keyset pagination of the product listing per competitor (the primary key serves the rest)
+        Index("ix_products_competitor_id", "competitor", "id"),
+        # Price range filter
+        Index("ix_products_price", "price"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
@@ -19,15 +29,61 @@ class Product(Base):
     rating = Column(Float, nullable=True)
     review_count = Column(Integer, nullable=True)
     availability = Column(String(50), nullable=True)
-    scraped_at = Column(DateTime(timezone=True),
-                        server_default=func.now(), index=True)
+    # Last time the listing's price or availability changed
+    scraped_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Last time the listing was scraped, changed or not
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now())
     confidence_score = Column(Float, default=1.0)
-    metadata = Column(JSON, nullable=True)  # Store additional data
+    # Same product across retailers, assigned by the product matcher
+    canonical_id = Column(String(36), nullable=True, index=True)
+    # "metadata" is reserved by the declarative API, so map it under another name
+    extra_metadata = Column("metadata", JSON, nullable=True)  # Store additional data
 
     def __repr__(self):
         return f"<Product(name='{self.name}', price={self.price}, competitor='{self.competitor}')>"
 
 
+# Name prefix filter (lower(name) LIKE 'prefix%')
+Index("ix_products_name_prefix", func.lower(Product.name).label("name_lower"),
+      postgresql_ops={"name_lower": "text_pattern_ops"})
+
+
+class ProductPriceStats(Base):
+    """Running price statistics of one listing, updated as batches are ingested"""
+    __tablename__ = "product_price_stats"
+
+    product_id = Column(Integer, primary_key=True)
+    competitor = Column(String(50), nullable=False, index=True)
+    observations = Column(Integer, nullable=False, default=0)
+    price_sum = Column(Float, nullable=False, default=0.0)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    ewma_price = Column(Float, nullable=False)
+    last_price = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ProductPriceStats(product_id={self.product_id}, ewma_price={self.ewma_price})>"
+
+
+class CompetitorPriceStats(Base):
+    """Running price statistics of one competitor, one row per site"""
+    __tablename__ = "competitor_price_stats"
+
+    competitor = Column(String(50), primary_key=True)
+    products = Column(Integer, nullable=False, default=0)
+    observations = Column(Integer, nullable=False, default=0)
+    price_sum = Column(Float, nullable=False, default=0.0)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    # Moving average of batch mean prices
+    ewma_price = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<CompetitorPriceStats(competitor='{self.competitor}', products={self.products})>"
+
+
 class ScrapingJob(Base):
     __tablename__ = "scraping_jobs"
 
@@ -44,22 +100,28 @@ class ScrapingJob(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     error_message = Column(Text, nullable=True)
     progress = Column(Float, default=0.0)  # 0.0 to 1.0
-    metadata = Column(JSON, nullable=True)
+    extra_metadata = Column("metadata", JSON, nullable=True)
 
     def __repr__(self):
         return f"<ScrapingJob(id='{self.job_id}', status='{self.status}')>"
 
 
 class PriceHistory(Base):
+    """Price changes of a listing; unchanged observations are not stored"""
     __tablename__ = "price_history"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, nullable=False, index=True)
+    product_id = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
     recorded_at = Column(DateTime(timezone=True),
                          server_default=func.now(), index=True)
     source = Column(String(50), nullable=False)  # amazon, bestbuy, walmart
 
+    __table_args__ = (
+        # Price history of one product over a time range
+        Index("ix_price_history_product_recorded_at", "product_id", "recorded_at"),
+    )
+
     def __repr__(self):
         return f"<PriceHistory(product_id={self.product_id}, price={self.price}, source='{self.source}')>"
 
@@ -96,3 +158,26 @@ class ScrapingSession(Base):
 
     def __repr__(self):
         return f"<ScrapingSession(session_id='{self.session_id}', site='{self.site}')>"
+
+
+class PriceRollup(Base):
+    """Open/high/low/close of every observed price of a listing per hour or day"""
+    __tablename__ = "price_rollups"
+
+    product_id = Column(Integer, primary_key=True)
+    granularity = Column(String(8), primary_key=True)  # hour, day
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    source = Column(String(50), nullable=False)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    observations = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        # Daily trends per competitor over a time window
+        Index("ix_price_rollups_granularity_source_bucket", "granularity", "source", "bucket_start"),
+    )
+
+    def __repr__(self):
+        return f"<PriceRollup(product_id={self.product_id}, {self.granularity}={self.bucket_start})>"
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import AliasChoices, BaseModel, Field, HttpUrl
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -17,6 +17,12 @@ class JobStatusEnum(str, Enum):
     FAILED = "failed"
 
 
+class JobPriority(str, Enum):
+    HIGH = "high"
+    DEFAULT = "default"
+    LOW = "low"
+
+
 class ScrapingRequest(BaseModel):
     urls: List[HttpUrl] = Field(..., description="List of URLs to scrape")
     target_sites: List[SiteType] = Field(...,
@@ -29,6 +35,8 @@ class ScrapingRequest(BaseModel):
         default=True, description="Include product images")
     include_reviews: bool = Field(
         default=False, description="Include product reviews")
+    priority: JobPriority = Field(
+        default=JobPriority.DEFAULT, description="Worker queue the job's URLs are sent to")
 
     class Config:
         schema_extra = {
@@ -58,7 +66,9 @@ class ProductResponse(BaseModel):
     availability: Optional[str] = None
     scraped_at: datetime
     confidence_score: float
-    metadata: Optional[Dict[str, Any]] = None
+    canonical_id: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = Field(
+        None, validation_alias=AliasChoices("extra_metadata", "metadata"))
 
     class Config:
         from_attributes = True
@@ -81,6 +91,42 @@ class ProductResponse(BaseModel):
         }
 
 
+class ProductPage(BaseModel):
+    items: List[ProductResponse]
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as ``cursor`` to fetch the next page; null on the last page")
+
+
+class ExportFormat(str, Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class HistoryGranularity(str, Enum):
+    RAW = "raw"
+    HOUR = "hour"
+    DAY = "day"
+
+
+class PricePoint(BaseModel):
+    timestamp: datetime
+    # Set for raw price changes
+    price: Optional[float] = None
+    # Set for hourly and daily buckets
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+    close: Optional[float] = None
+    observations: Optional[int] = None
+
+
+class PriceHistoryResponse(BaseModel):
+    product_id: int
+    granularity: HistoryGranularity
+    points: List[PricePoint]
+
+
 class JobStatus(BaseModel):
     job_id: str
     status: JobStatusEnum
@@ -1,28 +1,95 @@
+import asyncio
+import json
 import os
 import logging
-from typing import Dict, Any, List, Optional
-import openai
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from .html_pruner import estimate_tokens, prune_html
+from .llm_cache import LLMCache, cache_key, get_llm_cache
+from .llm_client import CircuitOpenError, LLMClient, get_llm_client
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the extraction prompts change so cached answers are not reused
+PROMPT_TEMPLATE_VERSION = "2"
+BATCH_TEMPLATE_VERSION = "batch-1"
+
+PRODUCT_FIELDS = ["name", "price", "original_price", "rating", "review_count", "availability", "image_url"]
+
+# Function the model calls with one entry per product card of a batch
+RECORD_PRODUCTS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "record_products",
+        "description": "Record the product extracted from each numbered product card.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "products": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer", "description": "Number of the card"},
+                            "name": {"type": ["string", "null"]},
+                            "price": {"type": ["number", "null"], "description": "Current price"},
+                            "original_price": {"type": ["number", "null"], "description": "Price before discount"},
+                            "rating": {"type": ["number", "null"], "description": "Rating out of 5"},
+                            "review_count": {"type": ["integer", "null"]},
+                            "availability": {"type": ["string", "null"]},
+                            "image_url": {"type": ["string", "null"]}
+                        },
+                        "required": ["index", "name", "price"]
+                    }
+                }
+            },
+            "required": ["products"]
+        }
+    }
+}
+
+BATCH_SYSTEM_PROMPT = (
+    "You are an expert web scraping assistant. Each numbered card is the HTML of one "
+    "product listing. Call record_products with exactly one entry per card, using the "
+    "card's number as index. Use null for anything a card does not show."
+)
+
 
 class AIService:
-    def __init__(self):
-        self.client = openai.AsyncOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            timeout=30.0
-        )
+    def __init__(self, cache: Optional[LLMCache] = None, llm: Optional[LLMClient] = None):
+        self.llm = llm or get_llm_client()
         self.model = "gpt-4"  # or "gpt-3.5-turbo" for cost optimization
+        self._cache = cache
+        # Prompt tokens of product HTML packed into one batched request
+        self.batch_token_budget = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "3000"))
+        self.batch_max_cards = int(os.getenv("LLM_BATCH_MAX_CARDS", "25"))
+        self.batch_retries = int(os.getenv("LLM_BATCH_RETRIES", "1"))
+
+    @property
+    def available(self) -> bool:
+        """False while the provider is degraded and AI parsing should be skipped"""
+        return self.llm.available
+
+    @property
+    def cache(self) -> LLMCache:
+        if self._cache is None:
+            self._cache = get_llm_cache()
+        return self._cache
 
     async def extract_product_data(self, html_content: str, site: str) -> Dict[str, Any]:
-        """Extract product data from HTML using AI"""
+        """Extract product data from HTML using AI, reusing cached answers for seen markup"""
+        key = cache_key(self.model, PROMPT_TEMPLATE_VERSION, site, html_content)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return dict(cached["data"])
+
         try:
             prompt = self._create_extraction_prompt(html_content, site)
 
-            response = await self.client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model=self.model,
                 messages=[
                     {
@@ -41,6 +108,8 @@ class AIService:
             # Parse AI response
             content = response.choices[0].message.content
             extracted_data = self._parse_ai_response(content)
+            if not isinstance(extracted_data, dict):
+                extracted_data = {}
 
             # Add confidence score based on AI response quality
             confidence_score = self._calculate_confidence(
@@ -49,14 +118,136 @@ class AIService:
 
             logger.info(
                 f"AI extracted data with confidence: {confidence_score}")
+            if extracted_data.get("name") or extracted_data.get("price"):
+                await self.cache.set(key, {
+                    "data": extracted_data,
+                    "tokens": getattr(response.usage, "total_tokens", 0)
+                })
             return extracted_data
 
+        except CircuitOpenError:
+            logger.warning(f"Skipping AI extraction for {site}: provider circuit is open")
+            return self._get_fallback_data("circuit_open")
         except Exception as e:
             logger.error(f"AI extraction failed: {e}")
-            return self._get_fallback_data()
+            return self._get_fallback_data(str(e))
+
+    async def extract_products_batch(self, cards: List[str], site: str) -> List[Optional[Dict[str, Any]]]:
+        """Extract one product per HTML card, packing many cards into each request.
+
+        Cards are pruned, answered from the cache where possible and packed
+        into requests of up to ``batch_token_budget`` prompt tokens. The
+        model returns a structured array through function calling; results
+        are mapped back to their card by index, and only cards whose result
+        fails validation are sent again. The returned list is aligned with
+        ``cards``, with None for cards that could not be extracted.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(cards)
+        keys = [cache_key(self.model, BATCH_TEMPLATE_VERSION, site, card) for card in cards]
+
+        pending: List[Tuple[int, str]] = []
+        for index, card in enumerate(cards):
+            cached = await self.cache.get(keys[index])
+            if cached is not None:
+                results[index] = dict(cached["data"])
+                continue
+            pruned = prune_html(card, site, max_chars=self.batch_token_budget * 4)
+            if pruned.html:
+                pending.append((index, pruned.html))
+
+        for attempt in range(self.batch_retries + 1):
+            if not pending:
+                break
+            if not self.available:
+                logger.warning(f"Skipping AI extraction of {len(pending)} {site} cards: provider circuit is open")
+                break
+            batches = self._pack_batches(pending)
+            extracted = await asyncio.gather(
+                *(self._extract_batch(batch, site) for batch in batches),
+                return_exceptions=True
+            )
+
+            failed = []
+            for batch, outcome in zip(batches, extracted):
+                if isinstance(outcome, Exception):
+                    logger.error(f"Batched AI extraction failed for {len(batch)} {site} cards: {outcome}")
+                    failed.extend(batch)
+                    continue
+                records, tokens = outcome
+                for index, html in batch:
+                    record = records.get(index)
+                    if record is None or not self._valid_extraction(record):
+                        failed.append((index, html))
+                        continue
+                    record["confidence_score"] = self._calculate_confidence(None, record)
+                    results[index] = record
+                    await self.cache.set(keys[index], {"data": record, "tokens": tokens // len(batch)})
+
+            if failed and attempt < self.batch_retries:
+                logger.info(f"Retrying AI extraction of {len(failed)} {site} cards")
+            pending = failed
+
+        logger.info(
+            f"Batched AI extraction recovered {sum(1 for r in results if r)} of {len(cards)} {site} products")
+        return results
+
+    def _pack_batches(self, cards: List[Tuple[int, str]]) -> List[List[Tuple[int, str]]]:
+        """Group cards into batches that fit the prompt token budget"""
+        batches, batch, tokens = [], [], 0
+        for index, html in cards:
+            card_tokens = estimate_tokens(html)
+            if batch and (tokens + card_tokens > self.batch_token_budget
+                          or len(batch) >= self.batch_max_cards):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append((index, html))
+            tokens += card_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _extract_batch(self, batch: List[Tuple[int, str]], site: str) -> Tuple[Dict[int, Dict[str, Any]], int]:
+        """One request for a batch of cards; returns records by card index and tokens used"""
+        cards = "\n\n".join(f"Card {index}:\n{html}" for index, html in batch)
+        response = await self.llm.chat_completion(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": f"Product cards from {site}:\n\n{cards}"}
+            ],
+            tools=[RECORD_PRODUCTS_TOOL],
+            tool_choice={"type": "function", "function": {"name": "record_products"}},
+            temperature=0.1,
+            max_tokens=min(4000, 120 * len(batch) + 200)
+        )
+
+        message = response.choices[0].message
+        tool_calls = getattr(message, "tool_calls", None) or []
+        if tool_calls:
+            payload = self._parse_ai_response(tool_calls[0].function.arguments)
+        else:
+            payload = self._parse_ai_response(message.content or "")
+        products = payload.get("products", []) if isinstance(payload, dict) else payload
+
+        records = {}
+        for product in products if isinstance(products, list) else []:
+            if isinstance(product, dict) and isinstance(product.get("index"), int):
+                records[product["index"]] = {field: product.get(field) for field in PRODUCT_FIELDS}
+        return records, getattr(response.usage, "total_tokens", 0)
+
+    @staticmethod
+    def _valid_extraction(record: Dict[str, Any]) -> bool:
+        """A usable product has a name and a positive numeric price"""
+        price = record.get("price")
+        return (bool(str(record.get("name") or "").strip())
+                and isinstance(price, (int, float)) and not isinstance(price, bool) and price > 0)
 
     async def validate_product_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Validate and clean product data using AI"""
+        """Validate and clean product data using AI.
+
+        Routine checks run locally in ``product_validation.validate_products``;
+        this is only the opt-in second opinion for records it had to repair.
+        """
         try:
             prompt = f"""
             Validate and clean this product data. Return only valid, cleaned data as JSON:
@@ -70,7 +261,7 @@ class AIService:
             - Remove any invalid or empty fields
             """
 
-            response = await self.client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model=self.model,
                 messages=[
                     {
@@ -116,7 +307,7 @@ class AIService:
             Return insights as a JSON array of strings.
             """
 
-            response = await self.client.chat.completions.create(
+            response = await self.llm.chat_completion(
                 model=self.model,
                 messages=[
                     {
@@ -145,7 +336,7 @@ class AIService:
             return ["Market analysis available", "Price comparison data ready"]
 
     def _create_extraction_prompt(self, html_content: str, site: str) -> str:
-        """Create extraction prompt for specific site"""
+        """Create extraction prompt for specific site from its pruned HTML"""
         site_prompts = {
             "amazon": """
             Extract product information from this Amazon page HTML:
@@ -194,24 +385,36 @@ class AIService:
             """
         }
 
-        return site_prompts.get(site, site_prompts["amazon"]).format(html_content=html_content[:2000])
+        pruned = prune_html(html_content, site)
+        logger.info(
+            f"Pruned {site} HTML from ~{pruned.original_tokens} to ~{pruned.pruned_tokens} tokens "
+            f"({pruned.tokens_saved} saved, {pruned.subtrees} subtrees kept)")
+        return site_prompts.get(site, site_prompts["amazon"]).format(html_content=pruned.html)
 
-    def _parse_ai_response(self, content: str) -> Dict[str, Any]:
-        """Parse AI response and extract JSON"""
+    def _parse_ai_response(self, content: str) -> Any:
+        """Parse the first JSON object or array in an AI response.
+
+        Handles bare JSON, fenced code blocks and JSON surrounded by prose;
+        each candidate is decoded on its own, so braces in the surrounding
+        text cannot corrupt it.
+        """
+        content = (content or "").strip()
         try:
-            import json
-            # Try to extract JSON from response
-            if "{" in content and "}" in content:
-                start = content.find("{")
-                end = content.rfind("}") + 1
-                json_str = content[start:end]
-                return json.loads(json_str)
-            else:
-                logger.warning("No JSON found in AI response")
-                return {}
-        except Exception as e:
-            logger.error(f"Failed to parse AI response: {e}")
-            return {}
+            return json.loads(content)
+        except ValueError:
+            pass
+
+        decoder = json.JSONDecoder()
+        for position, char in enumerate(content):
+            if char not in "{[":
+                continue
+            try:
+                value, _ = decoder.raw_decode(content, position)
+                return value
+            except ValueError:
+                continue
+        logger.warning("No JSON found in AI response")
+        return {}
 
     def _calculate_confidence(self, usage: Any, data: Dict[str, Any]) -> float:
         """Calculate confidence score based on AI response quality"""
@@ -238,13 +441,17 @@ class AIService:
             logger.error(f"Confidence calculation failed: {e}")
             return 0.5
 
-    def _get_fallback_data(self) -> Dict[str, Any]:
-        """Return fallback data when AI extraction fails"""
+    def _get_fallback_data(self, reason: str = "AI extraction failed") -> Dict[str, Any]:
+        """Return fallback data when AI extraction fails.
+
+        The price is left empty rather than 0.0 so a failed extraction can
+        never be mistaken for a free product.
+        """
         return {
-            "name": "Product Name Unavailable",
-            "price": 0.0,
+            "name": None,
+            "price": None,
             "confidence_score": 0.0,
-            "error": "AI extraction failed"
+            "error": reason
         }
 
     def _prepare_product_summary(self, products: List[Dict[str, Any]]) -> str:
@@ -0,0 +1,306 @@
+import asyncio
+import bisect
+import logging
+import os
+import smtplib
+import time
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from ..database import AsyncSessionLocal
+from ..models import Alert
+from .product_matching import normalize_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+alerts_table = Alert.__table__
+
+# Bucket key part matching any competitor or any product name
+ANY = "*"
+
+
+class IndexedAlert:
+    """An active alert as held by the index"""
+
+    __slots__ = ("id", "email", "threshold", "product_name", "competitor", "tokens")
+
+    def __init__(self, id: int, email: str, threshold: float, product_name: Optional[str] = None,
+                 competitor: Optional[str] = None):
+        self.id = id
+        self.email = email
+        self.threshold = threshold
+        self.product_name = product_name
+        self.competitor = competitor
+        self.tokens = frozenset(normalize_tokens(product_name or ""))
+
+    @property
+    def bucket(self) -> Tuple[str, str]:
+        # The longest name token is usually the most selective one
+        token = max(sorted(self.tokens), key=len) if self.tokens else ANY
+        return self.competitor or ANY, token
+
+
+class AlertIndex:
+    """Active alerts bucketed by (competitor, name token), thresholds kept sorted.
+
+    A price change only visits the buckets of its competitor and name
+    tokens (plus the catch-all buckets) and, within each, bisects to the
+    alerts whose threshold the price just crossed.
+    """
+
+    def __init__(self):
+        self._thresholds: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}
+        self._alerts: Dict[int, IndexedAlert] = {}
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def add(self, alert: IndexedAlert):
+        self.remove(alert.id)
+        self._alerts[alert.id] = alert
+        bisect.insort(self._thresholds.setdefault(alert.bucket, []), (alert.threshold, alert.id))
+
+    def remove(self, alert_id: int):
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return
+        entries = self._thresholds[alert.bucket]
+        entries.remove((alert.threshold, alert.id))
+        if not entries:
+            del self._thresholds[alert.bucket]
+
+    def matches(self, competitor: str, name: str, price: float,
+                previous_price: Optional[float] = None) -> List[IndexedAlert]:
+        """Alerts whose threshold the price fell to or below with this change"""
+        tokens = frozenset(normalize_tokens(name))
+        matched = []
+        for competitor_key in (competitor, ANY):
+            for token in tokens | {ANY}:
+                entries = self._thresholds.get((competitor_key, token))
+                if not entries:
+                    continue
+                start = bisect.bisect_left(entries, (price, -1))
+                # Alerts at or above the old price were already crossed before
+                end = len(entries) if previous_price is None else bisect.bisect_left(entries, (previous_price, -1))
+                for _, alert_id in entries[start:end]:
+                    alert = self._alerts[alert_id]
+                    if alert.tokens <= tokens:
+                        matched.append(alert)
+        return matched
+
+
+class Notification:
+    """One triggered alert waiting in the outbox"""
+
+    def __init__(self, alert: IndexedAlert, change: Dict[str, Any], competitor: str):
+        self.alert = alert
+        self.change = change
+        self.competitor = competitor
+
+    def line(self) -> str:
+        return (f"{self.change['name']} at {self.competitor} is now {self.change['price']:.2f} "
+                f"(your alert: {self.alert.threshold:.2f}) {self.change.get('url') or ''}").strip()
+
+
+class SMTPSender:
+    """Sends batches of messages over one SMTP connection"""
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = False, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def _send(self, messages: List[EmailMessage]):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            for message in messages:
+                smtp.send_message(message)
+
+    async def send(self, messages: List[EmailMessage]):
+        await asyncio.to_thread(self._send, messages)
+
+
+class LogSender:
+    """Used when no SMTP server is configured"""
+
+    async def send(self, messages: List[EmailMessage]):
+        for message in messages:
+            logger.info(f"Alert email to {message['To']} (SMTP not configured): {message['Subject']}")
+
+
+def create_sender():
+    host = os.getenv("SMTP_HOST")
+    if not host:
+        return LogSender()
+    return SMTPSender(
+        host, int(os.getenv("SMTP_PORT", "25")),
+        username=os.getenv("SMTP_USERNAME"), password=os.getenv("SMTP_PASSWORD"),
+        starttls=os.getenv("SMTP_STARTTLS", "0") == "1")
+
+
+class AlertOutbox:
+    """Queue of notifications delivered in batches by a background task.
+
+    Notifications collected within ``flush_interval`` seconds (or up to
+    ``batch_size``) are grouped into one email per recipient and sent over
+    a single connection; a failed batch is retried with backoff up to
+    ``max_attempts`` times.
+    """
+
+    def __init__(self, sender=None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, max_attempts: int = 3,
+                 from_address: Optional[str] = None):
+        self.sender = sender or create_sender()
+        self.batch_size = batch_size or int(os.getenv("ALERT_BATCH_SIZE", "100"))
+        self.flush_interval = flush_interval if flush_interval is not None else float(
+            os.getenv("ALERT_FLUSH_INTERVAL", "5"))
+        self.max_attempts = max_attempts
+        self.from_address = from_address or os.getenv("ALERT_FROM_EMAIL", "alerts@ai-scraper.local")
+        self._queue: "asyncio.Queue[Notification]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self.counters = {"queued": 0, "sent": 0, "emails": 0, "failed": 0}
+
+    def put(self, notification: Notification):
+        self._queue.put_nowait(notification)
+        self.counters["queued"] += 1
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def _messages(self, batch: List[Notification]) -> List[EmailMessage]:
+        by_recipient: Dict[str, List[Notification]] = {}
+        for notification in batch:
+            by_recipient.setdefault(notification.alert.email, []).append(notification)
+        messages = []
+        for recipient, notifications in by_recipient.items():
+            message = EmailMessage()
+            message["From"] = self.from_address
+            message["To"] = recipient
+            message["Subject"] = (f"Price alert: {notifications[0].change['name']}" if len(notifications) == 1
+                                  else f"Price alerts: {len(notifications)} products below your thresholds")
+            message.set_content("\n".join(notification.line() for notification in notifications))
+            messages.append(message)
+        return messages
+
+    async def _deliver(self, batch: List[Notification]):
+        messages = self._messages(batch)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self.sender.send(messages)
+                self.counters["sent"] += len(batch)
+                self.counters["emails"] += len(messages)
+                return
+            except Exception as e:
+                logger.warning(f"Alert delivery attempt {attempt} failed: {e}")
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(min(30.0, 2 ** attempt))
+        self.counters["failed"] += len(batch)
+
+    async def _run(self):
+        while not self._queue.empty():
+            await asyncio.sleep(self.flush_interval)
+            batch = []
+            while not self._queue.empty() and len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+            if batch:
+                await self._deliver(batch)
+
+    async def flush(self):
+        """Deliver everything queued now"""
+        while not self._queue.empty():
+            batch = []
+            while not self._queue.empty() and len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+            await self._deliver(batch)
+
+    async def close(self):
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+        await self.flush()
+
+
+class AlertEngine:
+    """Evaluates active price alerts against price changes as they are ingested.
+
+    Active alerts are held in an ``AlertIndex``, reloaded from the database
+    every ``refresh_interval`` seconds so alerts configured through another
+    process (the API) reach the workers that ingest prices.
+    """
+
+    def __init__(self, session_factory=None, outbox: Optional[AlertOutbox] = None,
+                 refresh_interval: Optional[float] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.outbox = outbox or AlertOutbox()
+        self.refresh_interval = refresh_interval if refresh_interval is not None else float(
+            os.getenv("ALERT_REFRESH_INTERVAL", "60"))
+        self.index = AlertIndex()
+        self._loaded_at: Optional[float] = None
+        self.counters = {"changes": 0, "triggered": 0}
+
+    async def load(self):
+        """Rebuild the index from the active alerts"""
+        statement = select(alerts_table).where(alerts_table.c.is_active.is_(True))
+        async with self.session_factory() as db:
+            rows = (await db.execute(statement)).all()
+        index = AlertIndex()
+        for row in rows:
+            index.add(IndexedAlert(row.id, row.email, row.price_threshold, row.product_name, row.competitor))
+        self.index = index
+        self._loaded_at = time.monotonic()
+        logger.info(f"Alert index loaded with {len(index)} active alerts")
+
+    async def _refresh_if_stale(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        try:
+            await self.load()
+        except Exception as e:
+            # Keep evaluating against the alerts we have
+            self._loaded_at = time.monotonic()
+            logger.warning(f"Could not reload alerts: {e}")
+
+    async def create(self, email: str, price_threshold: float, product_name: Optional[str] = None,
+                     competitor: Optional[str] = None, is_active: bool = True) -> int:
+        """Store a new alert and, if active, start evaluating it"""
+        async with self.session_factory() as db:
+            async with db.begin():
+                result = await db.execute(alerts_table.insert().values(
+                    email=email, price_threshold=price_threshold, product_name=product_name,
+                    competitor=competitor, is_active=is_active
+                ).returning(alerts_table.c.id))
+                alert_id = result.scalar_one()
+        if is_active:
+            self.index.add(IndexedAlert(alert_id, email, price_threshold, product_name, competitor))
+        return alert_id
+
+    async def on_price_changes(self, competitor: str, changes: List[Dict[str, Any]]) -> int:
+        """Queue notifications for alerts crossed by these price changes"""
+        if not changes:
+            return 0
+        await self._refresh_if_stale()
+        triggered = 0
+        for change in changes:
+            self.counters["changes"] += 1
+            for alert in self.index.matches(competitor, change["name"], change["price"],
+                                            change.get("previous_price")):
+                self.outbox.put(Notification(alert, change, competitor))
+                triggered += 1
+        self.counters["triggered"] += triggered
+        return triggered
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "active_alerts": len(self.index), "outbox": dict(self.outbox.counters)}
+
+    async def close(self):
+        await self.outbox.close()
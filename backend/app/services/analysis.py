@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.sql import func
+
+from ..database import AsyncSessionLocal
+from ..models import CompetitorPriceStats, Product, PriceRollup
+from .job_store import create_redis_client
+
+logger = logging.getLogger(__name__)
+
+products_table = Product.__table__
+rollups_table = PriceRollup.__table__
+competitor_stats_table = CompetitorPriceStats.__table__
+
+# Bumped after every saved scrape batch; cached analyses of older versions are stale
+VERSION_KEY = "analysis:ingest_version"
+
+
+def competitor_stats_query():
+    """Running price statistics per competitor, one summary row each"""
+    stats = competitor_stats_table.c
+    return select(
+        stats.competitor,
+        stats.products.label("count"),
+        stats.observations,
+        stats.price_sum,
+        stats.min_price,
+        stats.max_price,
+        stats.ewma_price
+    ).order_by(stats.competitor)
+
+
+def best_deals_query(limit: int):
+    """Listings priced below the median of the same product across sites.
+
+    Listings are matched across competitors by their canonical product id;
+    only products listed by at least two competitors have a meaningful
+    cross-site median.
+    """
+    canonical_id = products_table.c.canonical_id
+    matched = select(
+        canonical_id,
+        func.percentile_cont(0.5).within_group(products_table.c.price).label("median_price"),
+        func.count(products_table.c.competitor.distinct()).label("competitors")
+    ).where(
+        canonical_id.is_not(None),
+        products_table.c.price > 0
+    ).group_by(canonical_id).having(
+        func.count(products_table.c.competitor.distinct()) >= 2
+    ).cte("matched")
+
+    discount = ((matched.c.median_price - products_table.c.price) / matched.c.median_price).label("discount")
+    return select(
+        products_table.c.id,
+        products_table.c.name,
+        products_table.c.competitor,
+        products_table.c.price,
+        products_table.c.url,
+        canonical_id,
+        matched.c.median_price,
+        matched.c.competitors,
+        discount
+    ).join(
+        matched, canonical_id == matched.c.canonical_id
+    ).where(
+        products_table.c.price > 0,
+        products_table.c.price < matched.c.median_price
+    ).order_by(discount.desc(), products_table.c.id).limit(limit)
+
+
+def price_trends_query(since: datetime):
+    """Daily average closing price per competitor since ``since``, from the daily rollups"""
+    rollups = rollups_table.c
+    return select(
+        rollups.source,
+        rollups.bucket_start.label("day"),
+        func.avg(rollups.close).label("avg_price"),
+        func.sum(rollups.observations).label("observations")
+    ).where(
+        rollups.granularity == "day",
+        rollups.bucket_start >= since
+    ).group_by(rollups.source, rollups.bucket_start).order_by(rollups.source, rollups.bucket_start)
+
+
+def _money(value: Optional[float]) -> Optional[float]:
+    return round(float(value), 2) if value is not None else None
+
+
+def build_analysis(competitor_rows: List[Dict[str, Any]], deal_rows: List[Dict[str, Any]],
+                   trend_rows: List[Dict[str, Any]], window_days: int) -> Dict[str, Any]:
+    """Assemble the analysis document from the aggregate query rows"""
+    price_comparison = {
+        row["competitor"]: {
+            "count": int(row["count"]),
+            "observations": int(row["observations"]),
+            "avg_price": _money(row["price_sum"] / row["observations"]) if row["observations"] else None,
+            "min_price": _money(row["min_price"]),
+            "max_price": _money(row["max_price"]),
+            "ewma_price": _money(row["ewma_price"])
+        }
+        for row in competitor_rows
+    }
+    total = sum(stats["count"] for stats in price_comparison.values())
+    observations = sum(int(row["observations"]) for row in competitor_rows)
+    total_price = sum(float(row["price_sum"]) for row in competitor_rows)
+
+    best_deals = [
+        {
+            "product_id": row["id"],
+            "canonical_id": row["canonical_id"],
+            "name": row["name"],
+            "competitor": row["competitor"],
+            "price": _money(row["price"]),
+            "url": row["url"],
+            "median_price": _money(row["median_price"]),
+            "competitors": int(row["competitors"]),
+            "discount_pct": round(float(row["discount"]) * 100, 1)
+        }
+        for row in deal_rows
+    ]
+
+    trends: Dict[str, Dict[str, Any]] = {}
+    for row in trend_rows:
+        trend = trends.setdefault(row["source"], {"points": [], "change_pct": None})
+        trend["points"].append({
+            "date": row["day"].date().isoformat() if isinstance(row["day"], datetime) else str(row["day"]),
+            "avg_price": _money(row["avg_price"]),
+            "observations": int(row["observations"])
+        })
+    for trend in trends.values():
+        first, last = trend["points"][0]["avg_price"], trend["points"][-1]["avg_price"]
+        if len(trend["points"]) > 1 and first:
+            trend["change_pct"] = round((last - first) / first * 100, 1)
+
+    return {
+        "total_products": total,
+        "average_price": _money(total_price / observations) if observations else None,
+        "price_range": {
+            "min": min((s["min_price"] for s in price_comparison.values()), default=None),
+            "max": max((s["max_price"] for s in price_comparison.values()), default=None)
+        },
+        "price_comparison": price_comparison,
+        "best_deals": best_deals,
+        "trends": {"window_days": window_days, "competitors": trends},
+        "market_insights": market_insights(price_comparison, best_deals, trends),
+        "generated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+
+def market_insights(price_comparison: Dict[str, Dict[str, Any]], best_deals: List[Dict[str, Any]],
+                    trends: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Plain-language observations derived from the aggregates"""
+    insights = []
+    if len(price_comparison) >= 2:
+        cheapest = min(price_comparison, key=lambda name: price_comparison[name]["ewma_price"])
+        insights.append(
+            f"{cheapest} has the lowest recent average price "
+            f"({price_comparison[cheapest]['ewma_price']:.2f})")
+    largest = max(price_comparison, key=lambda name: price_comparison[name]["count"], default=None)
+    if largest is not None:
+        insights.append(f"{largest} lists the most products ({price_comparison[largest]['count']})")
+    if best_deals:
+        deal = best_deals[0]
+        insights.append(
+            f"Best deal: {deal['name']} at {deal['competitor']}, "
+            f"{deal['discount_pct']}% below the cross-site median")
+    moves = [(name, trend["change_pct"]) for name, trend in trends.items() if trend["change_pct"]]
+    if moves:
+        name, change = max(moves, key=lambda move: abs(move[1]))
+        direction = "up" if change > 0 else "down"
+        insights.append(f"{name} prices are {direction} {abs(change)}% over the window")
+    return insights
+
+
+class CompetitiveAnalysis:
+    """Competitive analysis aggregated in the database and cached between scrapes.
+
+    Per-competitor figures come from the running statistics maintained on
+    ingest, so reading them costs one row per competitor; deals and trends
+    are grouped queries backed by the canonical_id index and the daily price
+    rollups. The result is kept until a new scrape batch bumps the ingest
+    version in Redis (shared by API and worker processes) or ``cache_ttl``
+    expires; concurrent requests for a stale analysis wait on a single
+    recompute.
+    """
+
+    def __init__(self, session_factory=None, client=None, cache_ttl: Optional[int] = None,
+                 window_days: Optional[int] = None, deals_limit: Optional[int] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.client = client or create_redis_client()
+        self.cache_ttl = cache_ttl or int(os.getenv("ANALYSIS_CACHE_TTL", "900"))
+        self.window_days = window_days or int(os.getenv("ANALYSIS_TREND_DAYS", "30"))
+        self.deals_limit = deals_limit or int(os.getenv("ANALYSIS_DEALS_LIMIT", "20"))
+        self._cached: Optional[Dict[str, Any]] = None
+        self._cached_version: Optional[str] = None
+        self._cached_at = 0.0
+        self._lock = asyncio.Lock()
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0, "last_compute_ms": None}
+
+    async def _version(self) -> Optional[str]:
+        try:
+            return await self.client.get(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read analysis version: {e}")
+            return None
+
+    def _fresh(self, version: Optional[str]) -> bool:
+        return (self._cached is not None and self._cached_version == version
+                and time.monotonic() - self._cached_at < self.cache_ttl)
+
+    async def get(self) -> Dict[str, Any]:
+        """Cached analysis, recomputed once per ingest version"""
+        version = await self._version()
+        if self._fresh(version):
+            self.counters["hits"] += 1
+            return self._cached
+        async with self._lock:
+            if self._fresh(version):
+                self.counters["hits"] += 1
+                return self._cached
+            self.counters["misses"] += 1
+            started = time.monotonic()
+            analysis = await self.compute()
+            self.counters["last_compute_ms"] = round((time.monotonic() - started) * 1000, 1)
+            self._cached, self._cached_version, self._cached_at = analysis, version, time.monotonic()
+            return analysis
+
+    async def compute(self) -> Dict[str, Any]:
+        """Run the aggregate queries and build the analysis"""
+        since = datetime.now(timezone.utc) - timedelta(days=self.window_days)
+        async with self.session_factory() as db:
+            competitors = (await db.execute(competitor_stats_query())).mappings().all()
+            deals = (await db.execute(best_deals_query(self.deals_limit))).mappings().all()
+            trends = (await db.execute(price_trends_query(since))).mappings().all()
+        return build_analysis(competitors, deals, trends, self.window_days)
+
+    async def invalidate(self):
+        """Mark cached analyses stale after new products were stored"""
+        self.counters["invalidations"] += 1
+        self._cached = None
+        try:
+            await self.client.incr(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not bump analysis version: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "cached": self._cached is not None}
+
+    async def close(self):
+        await self.client.close()
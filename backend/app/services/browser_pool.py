@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+import random
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page
+
+logger = logging.getLogger(__name__)
+
+BROWSER_ARGS = [
+    "--no-sandbox",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage"
+]
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+]
+
+# Hide automation indicators on every page opened in a pooled context
+STEALTH_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined,
+    });
+"""
+
+
+class ContextLease:
+    """A pooled browser context shared by all pages of one site"""
+
+    def __init__(self, site: str, browser_index: int, context: BrowserContext):
+        self.site = site
+        self.browser_index = browser_index
+        self.context = context
+        self.navigations = 0
+        self.active_pages = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """Process-wide pool of Chromium processes with per-site context reuse.
+
+    A fixed number of browsers is launched lazily on first use. Each site
+    gets its own context on one of those browsers; the context is retired
+    once it has served ``max_navigations`` pages and closed as soon as its
+    last page is released. ``max_pages`` bounds the number of open pages
+    across the whole pool.
+    """
+
+    def __init__(self, size: Optional[int] = None, max_pages: Optional[int] = None,
+                 max_navigations: Optional[int] = None, headless: bool = True):
+        self.size = size or int(os.getenv("BROWSER_POOL_SIZE", "2"))
+        self.max_pages = max_pages or int(os.getenv("BROWSER_POOL_MAX_PAGES", "8"))
+        self.max_navigations = max_navigations or int(
+            os.getenv("BROWSER_CONTEXT_MAX_NAVIGATIONS", "50"))
+        self.headless = headless
+
+        self._playwright = None
+        self._browsers: List[Browser] = []
+        self._contexts: Dict[str, ContextLease] = {}
+        self._page_slots = asyncio.Semaphore(self.max_pages)
+        self._lock = asyncio.Lock()
+        self._pages_in_use = 0
+        self._stats = {
+            "pages_opened": 0,
+            "contexts_created": 0,
+            "contexts_recycled": 0
+        }
+
+    async def start(self):
+        """Launch the browser processes if they are not running yet"""
+        async with self._lock:
+            await self._ensure_browsers()
+
+    async def _ensure_browsers(self):
+        if self._browsers:
+            return
+        self._playwright = await async_playwright().start()
+        for _ in range(self.size):
+            browser = await self._playwright.chromium.launch(
+                headless=self.headless,
+                args=BROWSER_ARGS
+            )
+            self._browsers.append(browser)
+        logger.info(f"Browser pool started with {self.size} browsers")
+
+    async def _new_context(self, site: str) -> ContextLease:
+        # Place the context on the browser currently hosting the fewest sites
+        load = [0] * len(self._browsers)
+        for lease in self._contexts.values():
+            load[lease.browser_index] += 1
+        browser_index = load.index(min(load))
+
+        context = await self._browsers[browser_index].new_context(
+            user_agent=random.choice(USER_AGENTS)
+        )
+        await context.add_init_script(STEALTH_SCRIPT)
+        self._stats["contexts_created"] += 1
+        return ContextLease(site, browser_index, context)
+
+    async def _acquire_context(self, site: str) -> ContextLease:
+        async with self._lock:
+            await self._ensure_browsers()
+            lease = self._contexts.get(site)
+            if lease is None or lease.retired:
+                lease = await self._new_context(site)
+                self._contexts[site] = lease
+            lease.active_pages += 1
+            lease.navigations += 1
+            if lease.navigations >= self.max_navigations:
+                # Stop handing out this context; it is closed once drained
+                lease.retired = True
+            return lease
+
+    async def _release_context(self, lease: ContextLease):
+        async with self._lock:
+            lease.active_pages -= 1
+            if lease.retired and lease.active_pages == 0:
+                if self._contexts.get(lease.site) is lease:
+                    del self._contexts[lease.site]
+                self._stats["contexts_recycled"] += 1
+                try:
+                    await lease.context.close()
+                except Exception as e:
+                    logger.warning(f"Error closing context for {lease.site}: {e}")
+
+    @asynccontextmanager
+    async def page(self, site: str):
+        """Borrow a page in the pooled context for ``site``"""
+        async with self._page_slots:
+            lease = await self._acquire_context(site)
+            page: Optional[Page] = None
+            try:
+                self._pages_in_use += 1
+                page = await lease.context.new_page()
+                self._stats["pages_opened"] += 1
+                yield page
+            finally:
+                self._pages_in_use -= 1
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception as e:
+                        logger.warning(f"Error closing page for {site}: {e}")
+                await self._release_context(lease)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool usage counters"""
+        return {
+            "browsers": len(self._browsers),
+            "contexts": len(self._contexts),
+            "max_pages": self.max_pages,
+            "pages_in_use": self._pages_in_use,
+            **self._stats
+        }
+
+    async def close(self):
+        """Close all contexts and browsers"""
+        async with self._lock:
+            for lease in self._contexts.values():
+                try:
+                    await lease.context.close()
+                except Exception as e:
+                    logger.warning(f"Error closing context for {lease.site}: {e}")
+            self._contexts.clear()
+            for browser in self._browsers:
+                try:
+                    await browser.close()
+                except Exception as e:
+                    logger.warning(f"Error closing browser: {e}")
+            self._browsers.clear()
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Return the process-wide browser pool"""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+    return _browser_pool
+
+
+async def close_browser_pool():
+    """Shut down the process-wide browser pool"""
+    global _browser_pool
+    if _browser_pool is not None:
+        await _browser_pool.close()
+        _browser_pool = None
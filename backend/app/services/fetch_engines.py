@@ -0,0 +1,184 @@
+import logging
+import os
+import random
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+from selectolax.parser import HTMLParser
+
+from .browser_pool import USER_AGENTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+    "Upgrade-Insecure-Requests": "1"
+}
+
+# Status codes that mean the static fetch was refused rather than empty
+BLOCKED_STATUS_CODES = {403, 429, 503}
+
+# Markers of bot-check interstitials served with a 200 status
+CHALLENGE_MARKERS = (
+    "/errors/validateCaptcha",
+    "Type the characters you see in this image",
+    "Robot or human?",
+    "px-captcha"
+)
+
+
+def looks_blocked(status: Optional[int], html: str) -> bool:
+    """Whether a response is a refusal or a bot challenge rather than content"""
+    if status in BLOCKED_STATUS_CODES:
+        return True
+    head = html[:20000]
+    return any(marker in head for marker in CHALLENGE_MARKERS)
+
+
+class FetchResult:
+    """Outcome of fetching one URL through a fetch engine"""
+
+    def __init__(self, url: str, status: int, html: str, engine: str):
+        self.url = url
+        self.status = status
+        self.html = html
+        self.engine = engine
+
+    @property
+    def blocked(self) -> bool:
+        """Whether the site refused the request or served a bot challenge"""
+        return looks_blocked(self.status, self.html)
+
+
+class FetchStats:
+    """Per-engine counters, with fallbacks broken down by site and reason"""
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, Any]] = {}
+
+    def _engine(self, engine: str) -> Dict[str, Any]:
+        return self._counters.setdefault(engine, {
+            "requests": 0,
+            "successes": 0,
+            "failures": 0,
+            "fallbacks": 0,
+            "fallback_reasons": {}
+        })
+
+    def record_request(self, engine: str, success: bool):
+        counters = self._engine(engine)
+        counters["requests"] += 1
+        counters["successes" if success else "failures"] += 1
+
+    def record_fallback(self, engine: str, site: str, reason: str):
+        counters = self._engine(engine)
+        counters["fallbacks"] += 1
+        key = f"{site}:{reason}"
+        counters["fallback_reasons"][key] = counters["fallback_reasons"].get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = {}
+        for engine, counters in self._counters.items():
+            requests = counters["requests"]
+            snapshot[engine] = {
+                **counters,
+                "fallback_reasons": dict(counters["fallback_reasons"]),
+                "fallback_rate": counters["fallbacks"] / requests if requests else 0.0
+            }
+        return snapshot
+
+
+fetch_stats = FetchStats()
+
+
+class HttpFetchEngine:
+    """Static HTML fetcher backed by a pooled HTTP/2 keep-alive client"""
+
+    name = "http"
+
+    def __init__(self, max_connections: Optional[int] = None, timeout: Optional[float] = None):
+        self.max_connections = max_connections or int(
+            os.getenv("HTTP_ENGINE_MAX_CONNECTIONS", "20"))
+        self.timeout = timeout or float(os.getenv("HTTP_ENGINE_TIMEOUT", "15"))
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                follow_redirects=True,
+                timeout=self.timeout,
+                headers=DEFAULT_HEADERS,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                )
+            )
+        return self._client
+
+    async def fetch(self, url: str) -> FetchResult:
+        """Fetch a page without rendering it"""
+        try:
+            response = await self.client.get(
+                url, headers={"User-Agent": random.choice(USER_AGENTS)})
+            result = FetchResult(str(response.url), response.status_code,
+                                 response.text, self.name)
+            fetch_stats.record_request(self.name, not result.blocked)
+            return result
+        except httpx.HTTPError:
+            fetch_stats.record_request(self.name, False)
+            raise
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def parse_listing_html(html: Union[str, HTMLParser], product_selector: str,
+                       field_selectors: Dict[str, Tuple[str, Optional[str]]],
+                       limit: int, include_html: bool = False) -> List[Dict[str, Optional[str]]]:
+    """Apply a site selector map to static HTML or an already parsed tree.
+
+    Mirrors the in-browser batch extraction script so that both engines
+    return the same raw records for the same markup.
+    """
+    tree = html if isinstance(html, HTMLParser) else HTMLParser(html)
+    records = []
+    for item in tree.css(product_selector)[:limit]:
+        record = {}
+        for field, (selector, attribute) in field_selectors.items():
+            node = item.css_first(selector)
+            if node is None:
+                record[field] = None
+            elif attribute:
+                record[field] = node.attributes.get(attribute)
+            else:
+                record[field] = node.text(deep=True)
+        if include_html:
+            record["_html"] = item.html
+        records.append(record)
+    return records
+
+
+_http_engine: Optional[HttpFetchEngine] = None
+
+
+def get_http_engine() -> HttpFetchEngine:
+    """Return the process-wide HTTP fetch engine"""
+    global _http_engine
+    if _http_engine is None:
+        _http_engine = HttpFetchEngine()
+    return _http_engine
+
+
+async def close_http_engine():
+    """Close the pooled HTTP connections"""
+    global _http_engine
+    if _http_engine is not None:
+        await _http_engine.close()
+        _http_engine = None
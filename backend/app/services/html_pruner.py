@@ -0,0 +1,257 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from selectolax.parser import HTMLParser, Node
+
+from .llm_cache import normalize_html
+
+logger = logging.getLogger(__name__)
+
+# Elements that never carry product data
+NOISE_TAGS = [
+    "script", "style", "noscript", "svg", "iframe", "template", "canvas",
+    "link", "meta", "head", "object", "embed"
+]
+
+# Page chrome around the results, dropped on every site
+COMMON_DROP_SELECTORS = ["nav", "footer", "header", "[role='navigation']", "[role='dialog']"]
+
+# Attributes the model can use; everything else is markup overhead
+KEEP_ATTRIBUTES = {"href", "src", "alt", "aria-label", "title", "itemprop", "content", "datetime"}
+
+# class/id/test-id fragments that mark name, price, rating and stock nodes
+RELEVANT_ATTRIBUTE_RE = re.compile(
+    r"price|title|name|rating|review|stars?\b|availability|stock|offer", re.I)
+
+
+class SitePruningRules:
+    """Where the product data lives on one site's pages.
+
+    ``containers`` match whole product cards, ``keep`` the nodes holding
+    name, price, rating and stock when no card is found, and ``drop``
+    widgets that look relevant but are not (ads, carousels, popovers).
+    """
+
+    def __init__(self, containers: Optional[List[str]] = None, keep: Optional[List[str]] = None,
+                 drop: Optional[List[str]] = None):
+        self.containers = containers or []
+        self.keep = keep or []
+        self.drop = drop or []
+
+
+SITE_PRUNING_RULES: Dict[str, SitePruningRules] = {
+    "amazon": SitePruningRules(
+        containers=['[data-component-type="s-search-result"]'],
+        keep=["h2", "#productTitle", ".a-price", ".a-icon-alt", "#acrPopover",
+              'a[href*="customerReviews"]', "#acrCustomerReviewText", "#availability",
+              "img.s-image", "#landingImage"],
+        drop=[".a-popover-preload", ".s-widget", ".a-carousel-container",
+              ".puis-sponsored-label-info-icon", "#rhf", "#navFooter"]
+    ),
+    "bestbuy": SitePruningRules(
+        containers=[".shop-sku-list-item", ".sku-item"],
+        keep=["h4", ".sku-title", ".priceView-customer-price", ".pricing-price__regular-price",
+              ".c-ratings-reviews-v2", ".c-ratings-reviews", ".fulfillment-add-to-cart-button",
+              "img.product-image"],
+        drop=[".sku-list-item-compare", ".shop-sponsored-products", ".carousel", ".modal"]
+    ),
+    "walmart": SitePruningRules(
+        containers=["[data-item-id]"],
+        keep=['[data-testid="product-title"]', '[data-automation-id="product-title"]',
+              '[data-testid="price-wrap"]', '[data-automation-id="product-price"]',
+              '[data-testid="rating"]', '[data-testid="product-ratings"]',
+              '[data-automation-id="fulfillment-badge"]', "img"],
+        drop=['[data-testid="sponsored-products"]', '[data-testid="carousel-container"]',
+              '[data-testid="variant-swatch"]']
+    )
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of English text and markup (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+class PruneResult:
+    """Pruned HTML and the token estimates before and after"""
+
+    def __init__(self, html: str, original_tokens: int, subtrees: int):
+        self.html = html
+        self.original_tokens = original_tokens
+        self.pruned_tokens = estimate_tokens(html)
+        self.subtrees = subtrees
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.pruned_tokens)
+
+
+class PruningStats:
+    """Token savings of HTML pruning per site"""
+
+    def __init__(self):
+        self._sites: Dict[str, Dict[str, int]] = {}
+
+    def record(self, site: str, result: PruneResult):
+        counters = self._sites.setdefault(site, {
+            "calls": 0, "original_tokens": 0, "pruned_tokens": 0, "tokens_saved": 0
+        })
+        counters["calls"] += 1
+        counters["original_tokens"] += result.original_tokens
+        counters["pruned_tokens"] += result.pruned_tokens
+        counters["tokens_saved"] += result.tokens_saved
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {site: dict(counters) for site, counters in self._sites.items()}
+
+
+pruning_stats = PruningStats()
+
+
+def _is_relevant(node: Node) -> bool:
+    attrs = node.attributes
+    marker = " ".join(
+        attrs.get(name) or "" for name in ("class", "id", "itemprop", "data-testid", "data-automation-id"))
+    return bool(marker.strip()) and bool(RELEVANT_ATTRIBUTE_RE.search(marker))
+
+
+def _inside(node: Node, selected_ids: set) -> bool:
+    parent = node.parent
+    while parent is not None:
+        if parent.mem_id in selected_ids:
+            return True
+        parent = parent.parent
+    return False
+
+
+def _drop(root: Node, selectors: List[str]):
+    """Remove matching subtrees, outermost first so no freed node is touched"""
+    matched = {node.mem_id for selector in selectors for node in root.css(selector)}
+    if not matched:
+        return
+    outermost, outermost_ids = [], set()
+    for node in root.traverse():
+        if node.mem_id in matched and not _inside(node, outermost_ids):
+            outermost.append(node)
+            outermost_ids.add(node.mem_id)
+    for node in outermost:
+        node.decompose()
+
+
+def _select_subtrees(root: Node, rules: SitePruningRules) -> List[Node]:
+    """Product cards if the site's card selector matches, else the relevant nodes"""
+    for selector in rules.containers:
+        cards = root.css(selector)
+        if cards:
+            return cards
+
+    candidates = {}
+    for selector in rules.keep:
+        for node in root.css(selector):
+            candidates[node.mem_id] = node
+    for node in root.traverse():
+        if _is_relevant(node):
+            candidates[node.mem_id] = node
+
+    # Keep the outermost matches in document order
+    selected, selected_ids = [], set()
+    for node in root.traverse():
+        if node.mem_id in candidates and not _inside(node, selected_ids):
+            selected.append(node)
+            selected_ids.add(node.mem_id)
+    return selected
+
+
+def _clean_fragment(html: str) -> str:
+    """Strip attributes and empty elements from a fragment"""
+    fragment = HTMLParser(html)
+    body = fragment.body
+    if body is None:
+        return ""
+    for node in reversed(list(body.traverse())):
+        if node is body or node.tag == "-text":
+            continue
+        for name in [name for name in node.attributes if name not in KEEP_ATTRIBUTES]:
+            del node.attrs[name]
+        if not node.text(strip=True) and not node.attributes:
+            node.decompose()
+    inner = body.html or ""
+    return inner[len("<body>"):-len("</body>")] if inner.startswith("<body>") else inner
+
+
+def _fit(node: Node, budget: int) -> str:
+    """Markup of ``node`` within ``budget`` characters, dropping whole trailing children.
+
+    Never cuts inside a tag, an attribute or an entity: an element that
+    does not fit keeps its leading children that do, a text or void node
+    that does not fit is left out.
+    """
+    html = node.html or ""
+    if len(html) <= budget:
+        return html
+    if node.tag == "-text" or not html.endswith(f"</{node.tag}>"):
+        return ""
+    open_tag = html[:html.index(">") + 1]
+    close_tag = f"</{node.tag}>"
+    remaining = budget - len(open_tag) - len(close_tag)
+    if remaining <= 0:
+        return ""
+    return open_tag + _fit_children(node, remaining) + close_tag
+
+
+def _fit_children(node: Node, budget: int) -> str:
+    pieces = []
+    for child in node.iter(include_text=True):
+        child_html = child.html or ""
+        piece = child_html if len(child_html) <= budget else _fit(child, budget)
+        if piece:
+            pieces.append(piece)
+            budget -= len(piece)
+        if piece != child_html:
+            break
+    return "".join(pieces)
+
+
+def _truncate_fragment(html: str, max_chars: int) -> str:
+    """Leading elements of a fragment within ``max_chars``, cut at element boundaries"""
+    body = HTMLParser(html).body
+    return _fit_children(body, max_chars) if body is not None else ""
+
+
+def prune_html(html: str, site: str, max_chars: Optional[int] = None) -> PruneResult:
+    """Reduce a page or card to the markup an extraction prompt needs.
+
+    Scripts, styles, SVG and page chrome are removed, the subtrees most
+    likely to hold name, price and rating are kept, attributes other than
+    links, images and labels are stripped and whitespace is collapsed. The
+    result is cut at a subtree boundary to stay within ``max_chars``.
+    """
+    max_chars = max_chars or int(os.getenv("LLM_PROMPT_MAX_CHARS", "6000"))
+    rules = SITE_PRUNING_RULES.get(site, SitePruningRules())
+    original_tokens = estimate_tokens(html)
+
+    tree = HTMLParser(html)
+    tree.strip_tags(NOISE_TAGS)
+    root = tree.body or tree.root
+    if root is None:
+        return PruneResult("", original_tokens, 0)
+    _drop(root, COMMON_DROP_SELECTORS + rules.drop)
+
+    subtrees = _select_subtrees(root, rules) or [root]
+    parts, size = [], 0
+    for node in subtrees:
+        part = normalize_html(_clean_fragment(node.html or ""))
+        if not part:
+            continue
+        if size + len(part) > max_chars:
+            if not parts:
+                parts.append(_truncate_fragment(part, max_chars))
+            break
+        parts.append(part)
+        size += len(part) + 1
+
+    result = PruneResult("\n".join(parts), original_tokens, len(parts))
+    pruning_stats.record(site, result)
+    return result
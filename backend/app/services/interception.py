@@ -0,0 +1,166 @@
+import logging
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import Page, Request, Response, Route
+
+logger = logging.getLogger(__name__)
+
+# Resource types the scrapers never read from a listing page
+DEFAULT_DENY_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+
+# Resource types only fetched from the site's own domains
+DEFAULT_FIRST_PARTY_RESOURCE_TYPES = {"script", "xhr", "fetch"}
+
+# Ad, analytics and tag manager hosts seen on retail search pages
+DEFAULT_DENY_DOMAINS = {
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "googleadservices.com",
+    "amazon-adsystem.com",
+    "facebook.net",
+    "facebook.com",
+    "scorecardresearch.com",
+    "criteo.com",
+    "criteo.net",
+    "adsrvr.org",
+    "taboola.com",
+    "hotjar.com",
+    "quantserve.com",
+    "bing.com",
+    "pinterest.com",
+    "tiktok.com"
+}
+
+# Typical transfer sizes used to estimate bytes saved before a type has
+# been observed on an allowed response
+DEFAULT_RESOURCE_SIZES = {
+    "image": 40_000,
+    "media": 500_000,
+    "font": 30_000,
+    "stylesheet": 25_000,
+    "script": 60_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+    "other": 5_000
+}
+
+
+def _domain_matches(host: str, domains: Iterable[str]) -> bool:
+    return any(host == domain or host.endswith(f".{domain}") for domain in domains)
+
+
+class InterceptionProfile:
+    """Allow/deny rules applied to every request a scraper page makes.
+
+    The main document is always loaded. A request is blocked when its host
+    is on the deny list (and not explicitly allowed), when its resource type
+    is denied, or when a first-party-only type (scripts, XHR) comes from a
+    host outside ``allow_domains``.
+    """
+
+    def __init__(self, allow_domains: Optional[Iterable[str]] = None,
+                 deny_domains: Optional[Iterable[str]] = None,
+                 allow_resource_types: Optional[Iterable[str]] = None,
+                 deny_resource_types: Optional[Iterable[str]] = None,
+                 first_party_resource_types: Optional[Iterable[str]] = None):
+        self.allow_domains = set(allow_domains or [])
+        self.deny_domains = set(DEFAULT_DENY_DOMAINS if deny_domains is None else deny_domains)
+        self.allow_resource_types = set(allow_resource_types or [])
+        self.deny_resource_types = set(
+            DEFAULT_DENY_RESOURCE_TYPES if deny_resource_types is None else deny_resource_types
+        ) - self.allow_resource_types
+        self.first_party_resource_types = set(
+            DEFAULT_FIRST_PARTY_RESOURCE_TYPES if first_party_resource_types is None
+            else first_party_resource_types
+        ) - self.allow_resource_types
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        """Whether a request of this type to this URL should be aborted"""
+        if resource_type == "document":
+            return False
+        host = (urlsplit(url).hostname or "").lower()
+        first_party = _domain_matches(host, self.allow_domains)
+        if not first_party and _domain_matches(host, self.deny_domains):
+            return True
+        if resource_type in self.deny_resource_types:
+            return True
+        if resource_type in self.first_party_resource_types and self.allow_domains:
+            return not first_party
+        return False
+
+
+class InterceptionStats:
+    """Blocked/allowed request and byte counters per site"""
+
+    def __init__(self):
+        self._sites: Dict[str, Dict[str, Any]] = {}
+        # Observed (bytes, responses) per resource type, for estimates
+        self._observed_sizes: Dict[str, list] = {}
+
+    def _site(self, site: str) -> Dict[str, Any]:
+        return self._sites.setdefault(site, {
+            "allowed_requests": 0,
+            "blocked_requests": 0,
+            "allowed_bytes": 0,
+            "blocked_bytes_estimated": 0,
+            "blocked_by_type": {}
+        })
+
+    def _estimated_size(self, resource_type: str) -> int:
+        observed = self._observed_sizes.get(resource_type)
+        if observed and observed[1]:
+            return observed[0] // observed[1]
+        return DEFAULT_RESOURCE_SIZES.get(resource_type, DEFAULT_RESOURCE_SIZES["other"])
+
+    def record_blocked(self, site: str, resource_type: str):
+        counters = self._site(site)
+        counters["blocked_requests"] += 1
+        counters["blocked_bytes_estimated"] += self._estimated_size(resource_type)
+        by_type = counters["blocked_by_type"]
+        by_type[resource_type] = by_type.get(resource_type, 0) + 1
+
+    def record_allowed(self, site: str, resource_type: str, size: int):
+        counters = self._site(site)
+        counters["allowed_requests"] += 1
+        counters["allowed_bytes"] += size
+        if size:
+            observed = self._observed_sizes.setdefault(resource_type, [0, 0])
+            observed[0] += size
+            observed[1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            site: {**counters, "blocked_by_type": dict(counters["blocked_by_type"])}
+            for site, counters in self._sites.items()
+        }
+
+
+interception_stats = InterceptionStats()
+
+
+async def install_interception(page: Page, site: str, profile: InterceptionProfile):
+    """Route every request of ``page`` through ``profile``"""
+
+    async def handle_route(route: Route, request: Request):
+        try:
+            if profile.should_block(request.resource_type, request.url):
+                interception_stats.record_blocked(site, request.resource_type)
+                await route.abort("blockedbyclient")
+            else:
+                await route.continue_()
+        except Exception as e:
+            # The page may already be closing; nothing left to route
+            logger.debug(f"Route handling failed for {request.url}: {e}")
+
+    def handle_response(response: Response):
+        try:
+            size = int(response.headers.get("content-length") or 0)
+        except ValueError:
+            size = 0
+        interception_stats.record_allowed(site, response.request.resource_type, size)
+
+    await page.route("**/*", handle_route)
+    page.on("response", handle_response)
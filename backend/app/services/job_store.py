@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from .local_redis import LocalRedis
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY_PREFIX = "scrape:job:"
+# Hash field prefixes for units of work run by queue workers
+UNIT_FIELD_PREFIX = "unit:"
+UNIT_DONE_PREFIX = "done:"
+TERMINAL_STATUSES = {"completed", "failed"}
+
+# Records a unit's final state and, the first time only, counts it into the
+# job. KEYS[1] is the job hash; ARGV is the done field, the unit field, its
+# encoded state, the products scraped and the TTL. Returns 1 when this was
+# the job's last unit, 0 when units remain and -1 for a repeated completion.
+COMPLETE_UNIT_SCRIPT = """
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+if redis.call('HSETNX', KEYS[1], ARGV[1], 1) == 0 then
+    return -1
+end
+local done = redis.call('HINCRBY', KEYS[1], 'units_done', 1)
+redis.call('HINCRBY', KEYS[1], 'products_scraped', ARGV[4])
+local total = redis.call('HGET', KEYS[1], 'units_total')
+if total and done >= tonumber(total) then
+    return 1
+end
+return 0
+"""
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def create_redis_client():
+    """Redis client for REDIS_URL, or an in-process stand-in when unset"""
+    redis_url = os.getenv("REDIS_URL")
+    if not redis_url:
+        return LocalRedis()
+    import redis.asyncio as redis
+    return redis.from_url(redis_url, decode_responses=True)
+
+
+class JobStore:
+    """Job state kept in one Redis hash per job.
+
+    Jobs running in this process are served from memory and finished jobs
+    from a bounded in-process cache; anything else is a single HGETALL.
+    Jobs split into units for queue workers keep one field per unit and
+    atomic ``units_done``/``products_scraped`` counters, so any number of
+    workers can report into the same job. Progress updates are coalesced: ``update`` only records the latest
+    values and a background flusher writes them every ``flush_interval``
+    seconds, so a job reporting progress for hundreds of URLs costs a
+    handful of Redis writes. Terminal states are written immediately.
+    """
+
+    def __init__(self, client=None, flush_interval: Optional[float] = None,
+                 ttl: Optional[int] = None, finished_cache_size: int = 1000):
+        self.client = client or create_redis_client()
+        self.flush_interval = flush_interval if flush_interval is not None else float(
+            os.getenv("JOB_STORE_FLUSH_INTERVAL", "0.5"))
+        self.ttl = ttl or int(os.getenv("JOB_STORE_TTL", str(7 * 24 * 3600)))
+        self.finished_cache_size = finished_cache_size
+        # Jobs updated by this process and not finished yet
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._finished: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        # Orders flushes and final writes so a late flush never overwrites a final state
+        self._write_lock = asyncio.Lock()
+        if isinstance(self.client, LocalRedis):
+            # Runs in this process, where its steps cannot be interleaved or half-applied
+            self._complete_unit_script = self._complete_unit_locally
+        else:
+            self._complete_unit_script = self.client.register_script(COMPLETE_UNIT_SCRIPT)
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"{JOB_KEY_PREFIX}{job_id}"
+
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, str]:
+        return {field: json.dumps(value, default=_json_default) for field, value in fields.items()}
+
+    @staticmethod
+    def _decode(raw: Dict[str, str]) -> Dict[str, Any]:
+        return {field: json.loads(value) for field, value in raw.items()}
+
+    async def _write(self, job_id: str, fields: Dict[str, Any]):
+        key = self._key(job_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping=self._encode(fields))
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def create(self, job_id: str, **fields):
+        """Record a new job"""
+        await self._write(job_id, {"job_id": job_id, **fields})
+
+    def update(self, job_id: str, **fields):
+        """Record new job values; they reach Redis on the next flush"""
+        self._running.setdefault(job_id, {"job_id": job_id}).update(fields)
+        self._pending.setdefault(job_id, {}).update(fields)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def finish(self, job_id: str, **fields):
+        """Record a job's final state and write it through immediately"""
+        job = self._running.pop(job_id, {"job_id": job_id})
+        job.update(fields)
+        self._remember_finished(job_id, job)
+        pending = self._pending.pop(job_id, {})
+        async with self._write_lock:
+            await self._write(job_id, {**pending, **fields})
+
+    async def start_units(self, job_id: str, units: Dict[str, Dict[str, Any]],
+                          settled: int = 0, **fields):
+        """Record a job split into units, ``settled`` of which need no work"""
+        await self._write(job_id, {
+            **fields,
+            "units_total": len(units),
+            "units_done": settled,
+            "products_scraped": 0,
+            **{f"{UNIT_FIELD_PREFIX}{unit_id}": state for unit_id, state in units.items()}
+        })
+
+    async def update_unit(self, job_id: str, unit_id: str, state: Dict[str, Any]):
+        """Record the current state of one unit"""
+        await self._write(job_id, {f"{UNIT_FIELD_PREFIX}{unit_id}": state})
+
+    async def complete_unit(self, job_id: str, unit_id: str, state: Dict[str, Any],
+                            products: int = 0) -> bool:
+        """Record a unit's final state; True when it was the job's last unit.
+
+        A unit is only counted once, so a redelivered task cannot push the
+        counters past the job's total. The done marker and the counters are
+        written by one script, so a crash cannot leave a unit marked done
+        but not counted.
+        """
+        field = f"{UNIT_FIELD_PREFIX}{unit_id}"
+        result = await self._complete_unit_script(
+            keys=[self._key(job_id)],
+            args=[f"{UNIT_DONE_PREFIX}{unit_id}", field, self._encode({field: state})[field],
+                  products, self.ttl])
+        return int(result) == 1
+
+    async def _complete_unit_locally(self, keys, args):
+        """COMPLETE_UNIT_SCRIPT for LocalRedis"""
+        key, (done_field, field, value, products, ttl) = keys[0], args
+        await self.client.hset(key, field, value)
+        await self.client.expire(key, ttl)
+        if not await self.client.hsetnx(key, done_field, 1):
+            return -1
+        done = await self.client.hincrby(key, "units_done", 1)
+        await self.client.hincrby(key, "products_scraped", products)
+        total = await self.client.hget(key, "units_total")
+        return 1 if total is not None and done >= int(total) else 0
+
+    def _remember_finished(self, job_id: str, job: Dict[str, Any]):
+        self._finished[job_id] = job
+        self._finished.move_to_end(job_id)
+        while len(self._finished) > self.finished_cache_size:
+            self._finished.popitem(last=False)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        """Write all coalesced updates"""
+        async with self._write_lock:
+            pending, self._pending = self._pending, {}
+            for job_id, fields in pending.items():
+                await self._flush_job(job_id, fields)
+
+    async def _flush_job(self, job_id: str, fields: Dict[str, Any]):
+        try:
+            await self._write(job_id, fields)
+        except Exception as e:
+            logger.error(f"Failed to flush job {job_id}: {e}")
+            if job_id in self._running:
+                # Keep the values so the next flush retries them, without
+                # overriding anything recorded since
+                newer = self._pending.get(job_id, {})
+                self._pending[job_id] = {**fields, **newer}
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current job state, or None for an unknown job"""
+        cached = self._running.get(job_id) or self._finished.get(job_id)
+        if cached is not None:
+            return dict(cached)
+        raw = await self.client.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        job = self._fold_units(self._decode(raw))
+        if job.get("status") in TERMINAL_STATUSES:
+            # Finished jobs no longer change, so they are safe to cache
+            self._remember_finished(job_id, job)
+        return dict(job)
+
+    @staticmethod
+    def _fold_units(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Collect per-unit fields into ``urls`` and derive progress"""
+        if "units_total" not in job:
+            return job
+        urls = dict(job.get("urls") or {})
+        folded = {}
+        for field, value in job.items():
+            if field.startswith(UNIT_FIELD_PREFIX):
+                urls[field[len(UNIT_FIELD_PREFIX):]] = value
+            elif not field.startswith(UNIT_DONE_PREFIX):
+                folded[field] = value
+        folded["urls"] = urls
+        if folded.get("status") not in TERMINAL_STATUSES:
+            total = folded["units_total"]
+            folded["progress"] = folded["units_done"] / total if total else 1.0
+        return folded
+
+    async def close(self):
+        if self._flusher is not None and not self._flusher.done():
+            self._flusher.cancel()
+        await self.flush()
+        await self.client.close()
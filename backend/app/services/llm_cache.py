@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+_BETWEEN_TAGS_RE = re.compile(r">\s+<")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_html(html: str) -> str:
+    """Drop comments and insignificant whitespace so equivalent markup hashes alike"""
+    html = _COMMENT_RE.sub("", html)
+    html = _BETWEEN_TAGS_RE.sub("><", html)
+    return _WHITESPACE_RE.sub(" ", html).strip()
+
+
+def cache_key(model: str, template_version: str, site: str, html: str) -> str:
+    """Content address of one LLM extraction"""
+    payload = json.dumps([model, template_version, site, normalize_html(html)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteCacheTier:
+    """Persistent cache tier in a local SQLite file.
+
+    Entries expire after ``ttl`` seconds; once the stored values exceed
+    ``max_bytes`` the least recently used entries are evicted. The total
+    size is kept in a metadata row updated in the same transaction as the
+    entries, so a write never scans the table to enforce the cap.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl: int, max_bytes: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed_at)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_cache_expires ON llm_cache (expires_at)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Counted once for caches written before the total was kept
+            self._conn.execute(
+                "INSERT OR IGNORE INTO llm_cache_meta (name, value) "
+                "SELECT 'total_size', COALESCE(SUM(size), 0) FROM llm_cache")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _add_to_total(conn: sqlite3.Connection, delta: int):
+        if delta:
+            conn.execute("UPDATE llm_cache_meta SET value = value + ? WHERE name = 'total_size'", (delta,))
+
+    def _get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at, size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._add_to_total(conn, -row[2])
+            conn.commit()
+            return None
+        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return row[0]
+
+    def _set(self, key: str, value: str) -> int:
+        conn = self._connect()
+        now = time.time()
+        previous = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), now + self.ttl, now))
+        expired_size, expired = conn.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM llm_cache WHERE expires_at <= ?", (now,)).fetchone()
+        if expired:
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        self._add_to_total(conn, len(value) - (previous[0] if previous else 0) - expired_size)
+
+        evicted = 0
+        total = conn.execute("SELECT value FROM llm_cache_meta WHERE name = 'total_size'").fetchone()[0]
+        if total > self.max_bytes:
+            # Walks the accessed_at index from the oldest entry, only as far as needed
+            stale, freed = [], 0
+            for stale_key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at"):
+                if total - freed <= self.max_bytes:
+                    break
+                stale.append((stale_key,))
+                freed += size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
+            self._add_to_total(conn, -freed)
+            evicted = len(stale)
+        conn.commit()
+        return evicted
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str) -> int:
+        async with self._lock:
+            return await asyncio.to_thread(self._set, key, value)
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RedisCacheTier:
+    """Persistent cache tier in Redis.
+
+    Values are stored with a TTL; a sorted set of keys by last access caps
+    the tier at ``max_entries``.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, ttl: int, max_entries: int, prefix: str = "llm:cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.index_key = f"{prefix}index"
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(f"{self.prefix}{key}")
+        if value is not None:
+            await self.client.zadd(self.index_key, {key: time.time()})
+        return value
+
+    async def set(self, key: str, value: str) -> int:
+        await self.client.set(f"{self.prefix}{key}", value, ex=self.ttl)
+        await self.client.zadd(self.index_key, {key: time.time()})
+        excess = await self.client.zcard(self.index_key) - self.max_entries
+        if excess <= 0:
+            return 0
+        stale = await self.client.zpopmin(self.index_key, excess)
+        await self.client.delete(*(f"{self.prefix}{member}" for member, _ in stale))
+        return len(stale)
+
+    async def close(self):
+        await self.client.close()
+
+
+class LLMCache:
+    """Two-tier cache of LLM extraction results.
+
+    An in-memory LRU answers repeated cards within a process; the
+    persistent tier (Redis when REDIS_URL is set, SQLite otherwise) shares
+    results across processes and restarts. Hits found only in the
+    persistent tier are promoted to memory.
+    """
+
+    def __init__(self, persistent=None, max_entries: Optional[int] = None,
+                 ttl: Optional[int] = None):
+        self.ttl = ttl or int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_entries = max_entries or int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+        self.persistent = persistent
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.counters = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+            "errors": 0,
+            "tokens_saved": 0
+        }
+
+    def _memory_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = (time.monotonic() + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached entry for ``key``, or None on a miss"""
+        value = self._memory_get(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+        elif self.persistent is not None:
+            try:
+                raw = await self.persistent.get(key)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.warning(f"LLM cache read failed: {e}")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._memory_set(key, value)
+                self.counters["persistent_hits"] += 1
+
+        if value is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["tokens_saved"] += value.get("tokens", 0)
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        """Store an entry in both tiers"""
+        self._memory_set(key, value)
+        self.counters["writes"] += 1
+        if self.persistent is None:
+            return
+        try:
+            self.counters["evictions"] += await self.persistent.set(key, json.dumps(value))
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["persistent_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "memory_entries": len(self._memory),
+            "persistent_tier": getattr(self.persistent, "name", None),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+    async def close(self):
+        if self.persistent is not None:
+            await self.persistent.close()
+
+
+def create_persistent_tier(ttl: int):
+    """Redis tier when REDIS_URL is set, SQLite otherwise; LLM_CACHE_BACKEND=none disables it"""
+    backend = os.getenv("LLM_CACHE_BACKEND") or ("redis" if os.getenv("REDIS_URL") else "sqlite")
+    if backend == "redis":
+        import redis.asyncio as redis
+        client = redis.from_url(os.getenv("REDIS_URL"), decode_responses=True)
+        return RedisCacheTier(client, ttl, int(os.getenv("LLM_CACHE_PERSISTENT_MAX_ENTRIES", "100000")))
+    if backend == "sqlite":
+        return SQLiteCacheTier(
+            os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3"), ttl,
+            int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024))))
+    return None
+
+
+_llm_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    """Return the process-wide LLM response cache"""
+    global _llm_cache
+    if _llm_cache is None:
+        cache = LLMCache()
+        cache.persistent = create_persistent_tier(cache.ttl)
+        _llm_cache = cache
+    return _llm_cache
+
+
+async def close_llm_cache():
+    global _llm_cache
+    if _llm_cache is not None:
+        await _llm_cache.close()
+        _llm_cache = None
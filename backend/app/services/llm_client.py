@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import openai
+from dotenv import load_dotenv
+
+from .html_pruner import estimate_tokens
+from .rate_limiter import TokenBucket
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Stops calls after ``failure_threshold`` consecutive failures.
+
+    After ``reset_timeout`` seconds one trial call is let through
+    (half-open); its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def abandon_trial(self):
+        """A call ended without an answer (e.g. cancelled); the next call may be the trial"""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.times_opened += 1
+                logger.warning(f"LLM circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class LLMMetrics:
+    """Call, retry, latency and token counters of the LLM client"""
+
+    def __init__(self, window: int = 500):
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "circuit_rejections": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0
+        }
+        self.latencies = deque(maxlen=window)
+
+    def record_call(self, latency: float, usage: Any):
+        self.counters["successes"] += 1
+        self.latencies.append(latency)
+        self.counters["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        self.counters["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            **self.counters,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_max": round(latencies[-1], 3) if latencies else None
+        }
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class LLMClient:
+    """Chat completions with concurrency, rate budgets, retries and a circuit breaker.
+
+    At most ``max_concurrency`` requests are in flight and requests and
+    estimated tokens per minute stay within the RPM/TPM budgets. 429 and
+    5xx responses and connection errors are retried with jittered
+    exponential backoff (honouring Retry-After); repeated failures open the
+    circuit so callers skip AI parsing until the provider recovers.
+    """
+
+    def __init__(self, client=None, max_concurrency: Optional[int] = None,
+                 rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 max_retries: Optional[int] = None, base_delay: float = 1.0,
+                 max_delay: float = 30.0, breaker: Optional[CircuitBreaker] = None):
+        self.client = client or openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "30")),
+            # Retries are handled here, with the circuit breaker in the loop
+            max_retries=0
+        )
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        self.rpm = rpm or int(os.getenv("LLM_RPM", "500"))
+        self.tpm = tpm or int(os.getenv("LLM_TPM", "40000"))
+        self.max_retries = max_retries if max_retries is not None else int(
+            os.getenv("LLM_MAX_RETRIES", "3"))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_CIRCUIT_RESET", "30")))
+        self.metrics = LLMMetrics()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._requests = TokenBucket(self.rpm / 60.0, self.rpm)
+        self._tokens = TokenBucket(self.tpm / 60.0, self.tpm)
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit is open and calls would be rejected"""
+        return self.breaker.state != "open"
+
+    @staticmethod
+    def _estimate_tokens(kwargs: Dict[str, Any]) -> int:
+        prompt = sum(estimate_tokens(str(m.get("content") or "")) for m in kwargs.get("messages", []))
+        return prompt + int(kwargs.get("max_tokens") or 500)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def chat_completion(self, **kwargs) -> Any:
+        """``chat.completions.create`` under the client's budgets and retry policy"""
+        estimated = min(self._estimate_tokens(kwargs), self.tpm)
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self.metrics.counters["circuit_rejections"] += 1
+                raise CircuitOpenError("LLM provider circuit is open")
+
+            try:
+                async with self._slots:
+                    await self._requests.acquire()
+                    await self._tokens.acquire(estimated)
+                    self.metrics.counters["calls"] += 1
+                    started = time.monotonic()
+                    try:
+                        response = await self.client.chat.completions.create(**kwargs)
+                    except Exception as e:
+                        error = e
+                    else:
+                        self.metrics.record_call(time.monotonic() - started, response.usage)
+                        used = getattr(response.usage, "total_tokens", 0) or 0
+                        if used > estimated:
+                            self._tokens.debit(used - estimated)
+                        self.breaker.record_success()
+                        return response
+            except BaseException:
+                # Otherwise a cancelled half-open trial would keep every later call rejected
+                self.breaker.abandon_trial()
+                raise
+
+            if not _is_retryable(error):
+                # The provider answered; a malformed request says nothing about its health
+                self.breaker.record_success()
+                self.metrics.counters["failures"] += 1
+                raise error
+            if getattr(error, "status_code", None) == 429:
+                self.metrics.counters["rate_limited"] += 1
+            self.breaker.record_failure()
+            if attempt == self.max_retries:
+                self.metrics.counters["failures"] += 1
+                raise error
+
+            delay = self._backoff(attempt, error)
+            self.metrics.counters["retries"] += 1
+            logger.warning(f"LLM call failed ({error}); retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.metrics.snapshot(),
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "in_flight_limit": self.max_concurrency
+        }
+
+    async def close(self):
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+
+_llm_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide LLM client"""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
+
+
+async def close_llm_client():
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.close()
+        _llm_client = None
@@ -0,0 +1,148 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+
+class LocalRedis:
+    """In-process stand-in for the subset of the redis.asyncio API we use.
+
+    Used when REDIS_URL is not configured and in tests. Values are stored
+    as strings, matching a client created with ``decode_responses=True``.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    def _expire_if_needed(self, key: str):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    async def get(self, name: str) -> Optional[str]:
+        self._expire_if_needed(name)
+        value = self._data.get(name)
+        return value if isinstance(value, str) else None
+
+    async def set(self, name: str, value: Any, ex: Optional[int] = None) -> bool:
+        self._data[name] = str(value)
+        self._expires.pop(name, None)
+        if ex is not None:
+            self._expires[name] = time.monotonic() + ex
+        return True
+
+    async def incr(self, name: str, amount: int = 1) -> int:
+        self._expire_if_needed(name)
+        value = int(self._data.get(name, 0)) + amount
+        self._data[name] = str(value)
+        return value
+
+    async def hset(self, name: str, key: Optional[str] = None, value: Any = None,
+                   mapping: Optional[Dict[str, Any]] = None) -> int:
+        self._expire_if_needed(name)
+        values = dict(mapping or {})
+        if key is not None:
+            values[key] = value
+        hash_ = self._data.setdefault(name, {})
+        added = sum(1 for field in values if field not in hash_)
+        hash_.update({field: str(v) for field, v in values.items()})
+        return added
+
+    async def hsetnx(self, name: str, key: str, value: Any) -> int:
+        self._expire_if_needed(name)
+        hash_ = self._data.setdefault(name, {})
+        if key in hash_:
+            return 0
+        hash_[key] = str(value)
+        return 1
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        self._expire_if_needed(name)
+        return self._data.get(name, {}).get(key)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        self._expire_if_needed(name)
+        return dict(self._data.get(name, {}))
+
+    async def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        self._expire_if_needed(name)
+        hash_ = self._data.setdefault(name, {})
+        value = int(hash_.get(key, 0)) + amount
+        hash_[key] = str(value)
+        return value
+
+    async def zadd(self, name: str, mapping: Dict[str, float]) -> int:
+        self._expire_if_needed(name)
+        zset = self._data.setdefault(name, {})
+        added = sum(1 for member in mapping if member not in zset)
+        zset.update({member: float(score) for member, score in mapping.items()})
+        return added
+
+    async def zcard(self, name: str) -> int:
+        self._expire_if_needed(name)
+        return len(self._data.get(name, {}))
+
+    async def zpopmin(self, name: str, count: int = 1) -> List[tuple]:
+        self._expire_if_needed(name)
+        zset = self._data.get(name, {})
+        popped = sorted(zset.items(), key=lambda item: (item[1], item[0]))[:count]
+        for member, _ in popped:
+            del zset[member]
+        return popped
+
+    async def zrem(self, name: str, *members: str) -> int:
+        zset = self._data.get(name, {})
+        return sum(1 for member in members if zset.pop(member, None) is not None)
+
+    async def expire(self, name: str, seconds: int) -> bool:
+        if name not in self._data:
+            return False
+        self._expires[name] = time.monotonic() + seconds
+        return True
+
+    async def delete(self, *names: str) -> int:
+        removed = 0
+        for name in names:
+            if self._data.pop(name, None) is not None:
+                removed += 1
+            self._expires.pop(name, None)
+        return removed
+
+    def pipeline(self, transaction: bool = True) -> "LocalPipeline":
+        return LocalPipeline(self)
+
+    async def close(self):
+        pass
+
+
+class LocalPipeline:
+    """Buffers commands and runs them in order on ``execute``"""
+
+    def __init__(self, client: LocalRedis):
+        self._client = client
+        self._commands: List[Any] = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> List[Any]:
+        async with self._client._lock:
+            results = []
+            for method, args, kwargs in self._commands:
+                results.append(await method(*args, **kwargs))
+            self._commands = []
+            return results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._commands = []
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import Boolean, DateTime, Float, Integer, select, tuple_
+
+from ..database import AsyncSessionLocal
+from ..models import Product, PriceHistory
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class ExportTable:
+    """A table exported incrementally, ordered by (timestamp column, id)"""
+
+    def __init__(self, name: str, table, timestamp_column: str, competitor_column: str):
+        self.name = name
+        self.table = table
+        self.timestamp_column = timestamp_column
+        self.competitor_column = competitor_column
+
+    @property
+    def key(self) -> Tuple[Any, Any]:
+        return self.table.c[self.timestamp_column], self.table.c.id
+
+
+EXPORT_TABLES = {
+    "products": ExportTable("products", Product.__table__, "scraped_at", "competitor"),
+    "price_history": ExportTable("price_history", PriceHistory.__table__, "recorded_at", "source"),
+}
+
+
+class LocalSink:
+    """Export target in a local directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    async def write(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        # Readers never see a half-written file
+        os.replace(temporary, path)
+
+    async def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3Sink:
+    """Export target in an S3 (or S3-compatible) bucket"""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        if client is None:
+            import boto3
+            client = boto3.client(
+                "s3",
+                region_name=os.getenv("AWS_REGION"),
+                endpoint_url=os.getenv("S3_ENDPOINT_URL") or None)
+        self.client = client
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    async def write(self, key: str, data: bytes):
+        await asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    async def read(self, key: str) -> Optional[bytes]:
+        try:
+            response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return await asyncio.to_thread(response["Body"].read)
+
+
+def create_sink(target: Optional[str] = None):
+    """S3 sink for ``s3://bucket/prefix`` targets, local directory otherwise"""
+    target = target or os.getenv("EXPORT_TARGET", "exports")
+    if target.startswith("s3://"):
+        bucket, _, prefix = target[len("s3://"):].partition("/")
+        return S3Sink(bucket, prefix)
+    return LocalSink(target)
+
+
+def partition_frames(frame: pd.DataFrame, spec: ExportTable) -> Dict[Tuple[str, str], pd.DataFrame]:
+    """Split a chunk into (competitor, day) partitions.
+
+    The competitor column is dropped: readers take it from the
+    ``competitor=`` directory, and a column of the same name in the files
+    would conflict with it.
+    """
+    days = pd.to_datetime(frame[spec.timestamp_column], utc=True).dt.strftime("%Y-%m-%d")
+    return {
+        (str(competitor), day): group.drop(columns=[spec.competitor_column]).reset_index(drop=True)
+        for (competitor, day), group in frame.groupby([frame[spec.competitor_column], days], sort=True)
+    }
+
+
+def arrow_type(column_type):
+    import pyarrow as pa
+
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC" if column_type.timezone else None)
+    # Strings, and JSON serialized by to_frame
+    return pa.string()
+
+
+def arrow_schema(spec: ExportTable):
+    """Schema of every file of a table, whatever the values of a chunk.
+
+    Inferring it per chunk gives an all-null column Arrow's null type,
+    which no longer reads back together with the other files.
+    """
+    import pyarrow as pa
+
+    return pa.schema([
+        (column.name, arrow_type(column.type))
+        for column in spec.table.columns if column.name != spec.competitor_column
+    ])
+
+
+def partition_key(spec: ExportTable, competitor: str, day: str, run_id: str, sequence: int) -> str:
+    """Hive-style path readable by pandas, pyarrow, DuckDB and Spark"""
+    return f"{spec.name}/competitor={competitor}/date={day}/part-{run_id}-{sequence:05d}.parquet"
+
+
+def to_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(rows)
+    if "metadata" in frame:
+        # Free-form JSON is kept as text
+        frame["metadata"] = frame["metadata"].map(lambda value: json.dumps(value) if value is not None else None)
+    return frame
+
+
+def to_parquet_bytes(frame: pd.DataFrame, schema=None) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+    pq.write_table(table, buffer, compression=os.getenv("EXPORT_PARQUET_COMPRESSION", "snappy"))
+    return buffer.getvalue()
+
+
+class ParquetExporter:
+    """Incremental export of products and price history to partitioned Parquet.
+
+    Rows newer than the table's watermark are streamed from Postgres through
+    a server-side cursor in chunks of ``chunk_size`` and written as one
+    Parquet file per (competitor, day) and chunk. The watermark (last
+    exported timestamp and id) is stored next to the data after every chunk,
+    so an interrupted export resumes where it stopped. Rows younger than
+    ``safety_lag`` seconds are left for the next run, since transactions
+    still in flight may commit rows with earlier timestamps.
+    """
+
+    def __init__(self, sink=None, session_factory=None, chunk_size: Optional[int] = None,
+                 safety_lag: Optional[int] = None):
+        self.sink = sink or create_sink()
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.chunk_size = chunk_size or int(os.getenv("EXPORT_CHUNK_SIZE", "50000"))
+        self.safety_lag = safety_lag if safety_lag is not None else int(os.getenv("EXPORT_SAFETY_LAG", "60"))
+
+    @staticmethod
+    def _watermark_key(spec: ExportTable) -> str:
+        return f"_watermarks/{spec.name}.json"
+
+    async def read_watermark(self, spec: ExportTable) -> Optional[Tuple[datetime, int]]:
+        raw = await self.sink.read(self._watermark_key(spec))
+        if raw is None:
+            return None
+        state = json.loads(raw)
+        return datetime.fromisoformat(state["timestamp"]), int(state["id"])
+
+    async def write_watermark(self, spec: ExportTable, timestamp: datetime, row_id: int):
+        state = {"timestamp": timestamp.isoformat(), "id": row_id,
+                 "exported_at": datetime.now(timezone.utc).isoformat()}
+        await self.sink.write(self._watermark_key(spec), json.dumps(state).encode("utf-8"))
+
+    def build_query(self, spec: ExportTable, watermark: Optional[Tuple[datetime, int]],
+                    until: datetime):
+        timestamp, row_id = spec.key
+        statement = select(spec.table).where(timestamp < until)
+        if watermark is not None:
+            statement = statement.where(tuple_(timestamp, row_id) > tuple_(*watermark))
+        return statement.order_by(timestamp, row_id).execution_options(yield_per=self.chunk_size)
+
+    async def export_table(self, spec: ExportTable, full: bool = False) -> Dict[str, Any]:
+        """Export one table's new rows; ``full`` ignores the watermark"""
+        watermark = None if full else await self.read_watermark(spec)
+        until = datetime.now(timezone.utc) - timedelta(seconds=self.safety_lag)
+        run_id = uuid.uuid4().hex[:12]
+        summary = {"table": spec.name, "rows": 0, "files": 0, "since": watermark[0].isoformat() if watermark else None}
+        schema = arrow_schema(spec)
+
+        async with self.session_factory() as db:
+            result = await db.stream(self.build_query(spec, watermark, until))
+            async for chunk in result.mappings().partitions():
+                frame = to_frame([dict(row) for row in chunk])
+                for (competitor, day), partition in partition_frames(frame, spec).items():
+                    key = partition_key(spec, competitor, day, run_id, summary["files"])
+                    await self.sink.write(key, to_parquet_bytes(partition, schema))
+                    summary["files"] += 1
+                last = chunk[-1]
+                await self.write_watermark(spec, last[spec.timestamp_column], last["id"])
+                summary["rows"] += len(chunk)
+
+        logger.info(f"Exported {summary['rows']} {spec.name} rows to {summary['files']} Parquet files")
+        return summary
+
+    async def export(self, tables: Optional[List[str]] = None, full: bool = False) -> List[Dict[str, Any]]:
+        return [await self.export_table(EXPORT_TABLES[name], full) for name in tables or list(EXPORT_TABLES)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export products and price history to partitioned Parquet")
+    parser.add_argument("tables", nargs="*", help=f"tables to export: {', '.join(EXPORT_TABLES)} (default: all)")
+    parser.add_argument("--target", help="local directory or s3://bucket/prefix (default: EXPORT_TARGET)")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and export everything")
+    args = parser.parse_args()
+    unknown = set(args.tables) - set(EXPORT_TABLES)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO)
+    exporter = ParquetExporter(sink=create_sink(args.target))
+    for summary in asyncio.run(exporter.export(args.tables, args.full)):
+        print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
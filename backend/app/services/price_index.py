@@ -0,0 +1,91 @@
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+
+from ..database import AsyncSessionLocal
+from ..models import Product
+
+logger = logging.getLogger(__name__)
+
+products_table = Product.__table__
+
+
+class KnownPrice:
+    """Last stored state of one listing"""
+
+    __slots__ = ("product_id", "price", "availability", "hour", "seen_at")
+
+    def __init__(self, product_id: int, price: float, availability: Optional[str],
+                 hour: Optional[int] = None, seen_at: float = 0.0):
+        self.product_id = product_id
+        self.price = price
+        self.availability = availability
+        # Hour bucket (hours since the epoch) last folded into the rollups
+        self.hour = hour
+        self.seen_at = seen_at
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        return self.price == row["price"] and self.availability == row.get("availability")
+
+
+def current_hour(now: Optional[float] = None) -> int:
+    return int((now if now is not None else time.time()) // 3600)
+
+
+class PriceIndex:
+    """Last-known price and availability per (competitor, canonical URL).
+
+    Lets ingestion tell new listings and real changes from re-scrapes of
+    an unchanged listing without locking and upserting its row; each
+    process holds its own copy, so skips are still confirmed against the
+    stored row. Warmed from
+    Postgres at startup and updated as batches are saved; ``loaded`` is
+    False until then, and callers fall back to looking prices up.
+    """
+
+    def __init__(self, seen_interval: Optional[int] = None):
+        # Unchanged listings seen again within this many seconds skip the last_seen_at bump
+        self.seen_interval = seen_interval if seen_interval is not None else int(
+            os.getenv("PRICE_INDEX_SEEN_INTERVAL", "300"))
+        self._entries: Dict[Tuple[str, str], KnownPrice] = {}
+        self.loaded = False
+        self.counters = {"lookups": 0, "hits": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, competitor: str, url: str) -> Optional[KnownPrice]:
+        self.counters["lookups"] += 1
+        entry = self._entries.get((competitor, url))
+        if entry is not None:
+            self.counters["hits"] += 1
+        return entry
+
+    def remember(self, competitor: str, url: str, product_id: int, price: float,
+                 availability: Optional[str], hour: Optional[int] = None, seen_at: float = 0.0):
+        self._entries[(competitor, url)] = KnownPrice(product_id, price, availability, hour, seen_at)
+
+    def load(self, rows: Iterable[Any]):
+        """Index rows with competitor, url, id, price and availability"""
+        for row in rows:
+            self.remember(row.competitor, row.url, row.id, row.price, row.availability)
+
+    async def warm(self, session_factory=None):
+        """Load the stored state of every listing"""
+        session_factory = session_factory or AsyncSessionLocal
+        statement = select(
+            products_table.c.competitor, products_table.c.url, products_table.c.id,
+            products_table.c.price, products_table.c.availability
+        ).execution_options(yield_per=10000)
+        async with session_factory() as db:
+            result = await db.stream(statement)
+            async for partition in result.partitions():
+                self.load(partition)
+        self.loaded = True
+        logger.info(f"Price index warmed with {len(self._entries)} listings")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "listings": len(self._entries), "loaded": self.loaded}
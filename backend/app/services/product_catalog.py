@@ -0,0 +1,186 @@
+import base64
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.sql import func
+
+from ..database import AsyncSessionLocal
+from ..models import Product, PriceHistory, PriceRollup
+
+logger = logging.getLogger(__name__)
+
+products_table = Product.__table__
+price_history_table = PriceHistory.__table__
+rollups_table = PriceRollup.__table__
+
+# Columns of exported rows, in CSV column order
+EXPORT_COLUMNS = [
+    "id", "name", "price", "original_price", "currency", "competitor", "url", "image_url",
+    "rating", "review_count", "availability", "scraped_at", "confidence_score",
+    "canonical_id", "metadata"
+]
+
+
+class InvalidCursorError(ValueError):
+    """Raised for a pagination cursor this API did not issue"""
+
+
+class ProductFilters:
+    """Server-side filters of the product listing"""
+
+    def __init__(self, competitor: Optional[str] = None, min_price: Optional[float] = None,
+                 max_price: Optional[float] = None, name_prefix: Optional[str] = None):
+        self.competitor = competitor
+        self.min_price = min_price
+        self.max_price = max_price
+        self.name_prefix = name_prefix
+
+    def clauses(self) -> List[Any]:
+        clauses = []
+        if self.competitor:
+            clauses.append(products_table.c.competitor == self.competitor)
+        if self.min_price is not None:
+            clauses.append(products_table.c.price >= self.min_price)
+        if self.max_price is not None:
+            clauses.append(products_table.c.price <= self.max_price)
+        if self.name_prefix:
+            # Matches the lower(name) text_pattern_ops index
+            clauses.append(func.lower(products_table.c.name).startswith(
+                self.name_prefix.lower(), autoescape=True))
+        return clauses
+
+
+def encode_cursor(product_id: int) -> str:
+    """Opaque cursor pointing just past the given row"""
+    payload = json.dumps([product_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        (product_id,) = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return int(product_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+def build_products_query(filters: ProductFilters, cursor: Optional[str] = None,
+                         limit: Optional[int] = None):
+    """Most recently added products first, continuing after ``cursor`` on id.
+
+    The id never changes, unlike scraped_at, which every price change
+    rewrites, so a listing updated while a client pages through the results
+    is neither skipped nor returned twice. Postgres seeks straight to the
+    cursor in the primary key (or the (competitor, id) index), so deep
+    pages cost the same as the first.
+    """
+    statement = select(*(
+        products_table.c[column] for column in EXPORT_COLUMNS
+    )).where(*filters.clauses())
+    if cursor:
+        statement = statement.where(products_table.c.id < decode_cursor(cursor))
+    statement = statement.order_by(products_table.c.id.desc())
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def build_history_query(product_id: int, since: datetime, granularity: str = "raw"):
+    """Price changes (``raw``) or hourly/daily OHLC buckets of one product since ``since``.
+
+    Both read a contiguous range of a (product_id, time) index.
+    """
+    if granularity == "raw":
+        history = price_history_table.c
+        return select(
+            history.recorded_at.label("timestamp"), history.price
+        ).where(
+            history.product_id == product_id, history.recorded_at >= since
+        ).order_by(history.recorded_at)
+
+    rollups = rollups_table.c
+    return select(
+        rollups.bucket_start.label("timestamp"),
+        rollups.open, rollups.high, rollups.low, rollups.close, rollups.observations
+    ).where(
+        rollups.product_id == product_id,
+        rollups.granularity == granularity,
+        rollups.bucket_start >= since
+    ).order_by(rollups.bucket_start)
+
+
+def _export_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def to_ndjson(row: Dict[str, Any]) -> str:
+    return json.dumps({key: _export_value(value) for key, value in row.items()}) + "\n"
+
+
+def to_csv(rows: List[Dict[str, Any]], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([
+            json.dumps(row[column]) if column == "metadata" and row[column] is not None
+            else _export_value(row[column])
+            for column in EXPORT_COLUMNS
+        ])
+    return buffer.getvalue()
+
+
+class ProductCatalog:
+    """Reads of stored products: keyset-paginated pages and streaming exports"""
+
+    def __init__(self, session_factory=None, export_batch_size: Optional[int] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.export_batch_size = export_batch_size or int(os.getenv("PRODUCT_EXPORT_BATCH_SIZE", "1000"))
+
+    async def page(self, filters: ProductFilters, cursor: Optional[str] = None,
+                   limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of products and the cursor of the next page (None on the last)"""
+        statement = build_products_query(filters, cursor, limit + 1)
+        async with self.session_factory() as db:
+            rows = [dict(row) for row in (await db.execute(statement)).mappings().all()]
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1]["id"])
+
+    async def price_history(self, product_id: int, since: datetime,
+                            granularity: str = "raw") -> List[Dict[str, Any]]:
+        """Price points of one product since ``since``"""
+        async with self.session_factory() as db:
+            result = await db.execute(build_history_query(product_id, since, granularity))
+            return [dict(row) for row in result.mappings().all()]
+
+    async def stream(self, filters: ProductFilters) -> AsyncIterator[List[Dict[str, Any]]]:
+        """All matching products in batches, read through a server-side cursor"""
+        statement = build_products_query(filters).execution_options(yield_per=self.export_batch_size)
+        async with self.session_factory() as db:
+            result = await db.stream(statement)
+            async for partition in result.mappings().partitions():
+                yield [dict(row) for row in partition]
+
+    async def export(self, filters: ProductFilters, export_format: str) -> AsyncIterator[str]:
+        """Matching products as NDJSON lines or CSV, in constant memory"""
+        header = True
+        async for rows in self.stream(filters):
+            if export_format == "csv":
+                yield to_csv(rows, header=header)
+                header = False
+            else:
+                yield "".join(to_ndjson(row) for row in rows)
+        if export_format == "csv" and header:
+            yield to_csv([], header=True)
@@ -0,0 +1,297 @@
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.sql import func
+
+from ..database import AsyncSessionLocal
+from ..models import Product
+
+logger = logging.getLogger(__name__)
+
+products_table = Product.__table__
+
+# Namespace of canonical product ids, so every process derives the same id
+# for the same retailer-given identifier or normalized name
+CANONICAL_NAMESPACE = uuid.UUID("6f1c1f8e-5a43-4c38-9a0e-2f0b8e1d7c55")
+
+STOP_TOKENS = {
+    "a", "an", "and", "the", "with", "for", "by", "of", "new", "brand", "latest", "edition"
+}
+
+UNIT_ALIASES = {'"': "in", "inch": "in", "inches": "in", "in": "in", "gb": "gb", "tb": "tb",
+                "mb": "mb", "hz": "hz", "w": "w", "mah": "mah", "mp": "mp"}
+UNIT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*-?\s*(inches|inch|in\b|"|gb\b|tb\b|mb\b|hz\b|w\b|mah\b|mp\b)', re.I)
+# Units that tell otherwise identical listings apart (storage, screen size)
+DISTINGUISHING_UNIT_RE = re.compile(r"^\d+(?:\.\d+)?(gb|tb|in)$")
+MEASUREMENT_RE = re.compile(r"^\d+(?:\.\d+)?(gb|tb|mb|in|inch|inches|hz|w|mah|mp|k|p|g)$", re.I)
+MODEL_RE = re.compile(r"\b[A-Za-z0-9]+(?:[-/][A-Za-z0-9]+)*\b")
+# A model number right after these (and up to two words, e.g. the brand) names what an accessory fits
+FITS_RE = re.compile(r"\b(?:for|fits|compatible\s+with)\s+(?:[A-Za-z]+\s+){0,2}$", re.I)
+
+# Title words of accessories, which share the model number of the product they fit
+ACCESSORY_TOKENS = {
+    "replacement", "pads", "cushions", "earpads", "cover", "protector", "charger", "cable",
+    "adapter", "mount", "strap", "skin", "sleeve", "holder", "tips", "refill", "filter"
+}
+
+# Product fields and metadata keys holding manufacturer identifiers shared across retailers
+IDENTIFIER_KEYS = ("gtin", "upc", "ean", "model_number", "model", "mpn")
+
+_PRIME = np.uint64(4294967311)
+
+
+def normalize_tokens(name: str) -> List[str]:
+    """Lower-cased tokens with units attached to their numbers ("256 GB" -> "256gb")"""
+    text = UNIT_RE.sub(lambda m: f"{m.group(1)}{UNIT_ALIASES[m.group(2).lower()]} ", name or "")
+    # "WH-1000XM5" and "WH1000XM5" are the same token
+    text = re.sub(r"(?<=[0-9a-z])-(?=[0-9a-z])", "", text.lower())
+    text = re.sub(r"[^0-9a-z.]+", " ", text)
+    tokens = [token.strip(".") for token in text.split()]
+    return [token for token in tokens if token and token not in STOP_TOKENS]
+
+
+def extract_model_numbers(name: str) -> Set[str]:
+    """Manufacturer model numbers in a title, such as "SM-S918U" or "65UQ7570PUJ"
+
+    Candidates mix letters and digits, are at least five characters long
+    and are not measurements; hyphens and slashes are dropped. Models an
+    accessory is "for" are skipped.
+    """
+    models = set()
+    name = name or ""
+    for match in MODEL_RE.finditer(name):
+        if FITS_RE.search(name[:match.start()]):
+            continue
+        token = re.sub(r"[-/]", "", match.group(0)).upper()
+        if (len(token) >= 5 and re.search(r"\d", token) and re.search(r"[A-Z]", token)
+                and not MEASUREMENT_RE.match(token)):
+            models.add(token)
+    return models
+
+
+def explicit_identifiers(product: Dict[str, Any]) -> Set[str]:
+    """Identifiers given as product fields or metadata"""
+    identifiers = set()
+    metadata = product.get("metadata") or {}
+    for source in (product, metadata if isinstance(metadata, dict) else {}):
+        for key in IDENTIFIER_KEYS:
+            value = source.get(key)
+            if value:
+                identifiers.add(re.sub(r"[\s\-/]", "", str(value)).upper())
+    return identifiers
+
+
+def product_identifiers(product: Dict[str, Any]) -> Set[str]:
+    """Identifiers given as fields or metadata plus model numbers found in the name"""
+    return extract_model_numbers(product.get("name") or "") | explicit_identifiers(product)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures of token sets with ``num_perm`` hash permutations"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = generator.randint(1, 2 ** 31, num_perm).astype(np.uint64)
+        self.b = generator.randint(0, 2 ** 31, num_perm).astype(np.uint64)
+
+    def signature(self, tokens: FrozenSet[str]) -> np.ndarray:
+        hashes = np.array([
+            int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+            for token in tokens
+        ] or [0], dtype=np.uint64)
+        return ((np.outer(hashes, self.a) + self.b) % _PRIME).min(axis=0)
+
+
+def distinguishing_units(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    return frozenset(token for token in tokens if DISTINGUISHING_UNIT_RE.match(token))
+
+
+class CanonicalProduct:
+    """One cluster of listings that are the same product"""
+
+    def __init__(self, canonical_id: str, tokens: FrozenSet[str]):
+        self.canonical_id = canonical_id
+        self.tokens = tokens
+        self.units = distinguishing_units(tokens)
+        self.accessory = bool(tokens & ACCESSORY_TOKENS)
+
+    def compatible(self, tokens: FrozenSet[str]) -> bool:
+        """False when the listing disagrees on storage, screen size or being an accessory"""
+        units = distinguishing_units(tokens)
+        if units and self.units and units != self.units:
+            return False
+        return bool(tokens & ACCESSORY_TOKENS) == self.accessory
+
+
+class ProductMatcher:
+    """Clusters listings from different retailers into canonical products.
+
+    Canonical products sharing a manufacturer identifier (GTIN/UPC, model
+    number) with a listing are its first candidates; they are accepted at
+    a Jaccard similarity of ``min_similarity``, since a model number in a
+    title is only a hint (storage variants and accessories repeat it).
+    Otherwise the normalized title tokens are MinHashed and looked up in
+    ``bands`` LSH buckets, and candidates need ``threshold``. Either way a
+    match must not disagree on storage, screen size or being an accessory.
+    Each lookup touches a fixed number of buckets, so matching a new listing
+    does not scan the catalog.
+
+    Canonical products created by other processes (workers, the API) reach
+    this one through ``refresh_if_stale``, which indexes listings stored
+    since the last load at most every ``refresh_interval`` seconds.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, num_perm: int = 64, bands: int = 16,
+                 min_similarity: Optional[float] = None, refresh_interval: Optional[float] = None):
+        self.threshold = threshold or float(os.getenv("PRODUCT_MATCH_THRESHOLD", "0.7"))
+        self.min_similarity = min_similarity or float(os.getenv("PRODUCT_MATCH_MIN_SIMILARITY", "0.3"))
+        self.refresh_interval = refresh_interval if refresh_interval is not None else float(
+            os.getenv("PRODUCT_MATCH_REFRESH_INTERVAL", "5"))
+        # Listings stored this long before the last load are read again, for
+        # transactions that committed after it with an earlier scraped_at
+        self.refresh_overlap = timedelta(seconds=float(os.getenv("PRODUCT_MATCH_REFRESH_OVERLAP", "120")))
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+        self._identifiers: Dict[str, Set[str]] = {}
+        self._products: Dict[str, CanonicalProduct] = {}
+        self.loaded = False
+        # Database time of the last load, and when it ran here
+        self._since = None
+        self._loaded_at: Optional[float] = None
+        self.counters = {"matched_identifier": 0, "matched_similar": 0, "created": 0, "refreshed": 0}
+
+    def _band_keys(self, tokens: FrozenSet[str]) -> List[Tuple[int, bytes]]:
+        signature = self.hasher.signature(tokens)
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    def _register(self, canonical_id: str, tokens: FrozenSet[str], identifiers: Set[str]):
+        if canonical_id not in self._products:
+            self._products[canonical_id] = CanonicalProduct(canonical_id, tokens)
+            for key in self._band_keys(tokens):
+                self._buckets.setdefault(key, set()).add(canonical_id)
+        for identifier in identifiers:
+            self._identifiers.setdefault(identifier, set()).add(canonical_id)
+
+    def _best(self, candidates: Set[str], tokens: FrozenSet[str], threshold: float) -> Optional[str]:
+        best, best_score = None, threshold
+        for canonical_id in sorted(candidates):
+            product = self._products[canonical_id]
+            if not product.compatible(tokens):
+                continue
+            score = jaccard(tokens, product.tokens)
+            if score >= best_score:
+                best, best_score = canonical_id, score
+        return best
+
+    def _similar(self, tokens: FrozenSet[str]) -> Optional[str]:
+        candidates = set()
+        for key in self._band_keys(tokens):
+            candidates.update(self._buckets.get(key, ()))
+        return self._best(candidates, tokens, self.threshold)
+
+    def match(self, product: Dict[str, Any]) -> Optional[str]:
+        """Canonical id of a listing, creating a new canonical product if nothing matches"""
+        tokens = frozenset(normalize_tokens(product.get("name") or ""))
+        identifiers = product_identifiers(product)
+        if not tokens and not identifiers:
+            return None
+
+        candidates = set()
+        for identifier in identifiers:
+            candidates.update(self._identifiers.get(identifier, ()))
+        canonical_id = self._best(candidates, tokens, self.min_similarity) if candidates else None
+        if canonical_id is not None:
+            self.counters["matched_identifier"] += 1
+            self._register(canonical_id, tokens, identifiers)
+            return canonical_id
+
+        canonical_id = self._similar(tokens) if tokens else None
+        if canonical_id is not None:
+            self.counters["matched_similar"] += 1
+        else:
+            # Only identifiers given by the retailer name a single product; titles seed the rest
+            explicit = explicit_identifiers(product)
+            name_seed = " ".join(sorted(tokens))
+            canonical_id = str(uuid.uuid5(CANONICAL_NAMESPACE, min(explicit) if explicit else name_seed))
+            if canonical_id in self._products:
+                # The identifier's product was rejected above; keep the listings apart
+                canonical_id = str(uuid.uuid5(CANONICAL_NAMESPACE, name_seed))
+            self.counters["created"] += 1
+        self._register(canonical_id, tokens, identifiers)
+        return canonical_id
+
+    def assign(self, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Set ``canonical_id`` on each product dict"""
+        for product in products:
+            product["canonical_id"] = self.match(product)
+        return products
+
+    def add_known(self, canonical_id: str, name: str, metadata: Optional[Dict[str, Any]] = None):
+        """Index a stored listing under its existing canonical id"""
+        product = {"name": name, "metadata": metadata}
+        self._register(canonical_id, frozenset(normalize_tokens(name)), product_identifiers(product))
+
+    async def _load(self, session_factory=None, since=None) -> int:
+        """Index one listing per canonical product, of those stored since ``since`` if given"""
+        session_factory = session_factory or AsyncSessionLocal
+        statement = select(
+            products_table.c.canonical_id, products_table.c.name, products_table.c.metadata
+        ).where(
+            products_table.c.canonical_id.is_not(None)
+        )
+        if since is not None:
+            statement = statement.where(products_table.c.scraped_at >= since - self.refresh_overlap)
+        statement = statement.distinct(products_table.c.canonical_id).execution_options(yield_per=5000)
+
+        loaded = 0
+        async with session_factory() as db:
+            now = (await db.execute(select(func.now()))).scalar_one()
+            result = await db.stream(statement)
+            async for row in result:
+                self.add_known(row.canonical_id, row.name, row.metadata)
+                loaded += 1
+        self._since = now
+        self._loaded_at = time.monotonic()
+        return loaded
+
+    async def warm(self, session_factory=None):
+        """Index the canonical products already stored, one listing each"""
+        await self._load(session_factory)
+        self.loaded = True
+        logger.info(f"Product matcher warmed with {len(self._products)} canonical products")
+
+    async def refresh_if_stale(self, session_factory=None):
+        """Index canonical products other processes stored since the last load"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        try:
+            if self._since is None:
+                await self.warm(session_factory)
+            else:
+                self.counters["refreshed"] += await self._load(session_factory, self._since)
+        except Exception as e:
+            # Keep matching against the products we have
+            self._loaded_at = time.monotonic()
+            logger.warning(f"Could not refresh the product matcher: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "canonical_products": len(self._products),
+                "identifiers": len(self._identifiers)}
@@ -0,0 +1,370 @@
+import logging
+import os
+import time
+from collections import namedtuple
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Float, Integer, String, column, literal_column, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+
+from ..database import AsyncSessionLocal
+from ..models import CompetitorPriceStats, Product, PriceHistory, PriceRollup, ProductPriceStats
+from .price_index import KnownPrice, PriceIndex, current_hour
+
+logger = logging.getLogger(__name__)
+
+products_table = Product.__table__
+price_history_table = PriceHistory.__table__
+product_stats_table = ProductPriceStats.__table__
+competitor_stats_table = CompetitorPriceStats.__table__
+rollups_table = PriceRollup.__table__
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+# A price observation folded into the rollups and running statistics
+Observation = namedtuple("Observation", ["id", "price"])
+
+# Product columns refreshed from the latest scrape when a listing already exists
+UPDATABLE_COLUMNS = [
+    "name", "price", "original_price", "currency", "image_url", "rating",
+    "review_count", "availability", "confidence_score", "canonical_id", "metadata"
+]
+
+
+def product_row(product: Dict[str, Any], competitor: str) -> Dict[str, Any]:
+    """Map a scraped product dict onto ``products`` column names"""
+    return {
+        "name": (product.get("name") or "Unknown Product")[:255],
+        "price": float(product.get("price") or 0.0),
+        "original_price": product.get("original_price"),
+        "currency": product.get("currency") or "USD",
+        "competitor": competitor,
+        "url": product["url"],
+        "image_url": product.get("image_url"),
+        "rating": product.get("rating"),
+        "review_count": product.get("review_count"),
+        "availability": product.get("availability"),
+        "confidence_score": product.get("confidence_score", 1.0),
+        "canonical_id": product.get("canonical_id"),
+        "metadata": product.get("metadata")
+    }
+
+
+def prepare_rows(products: List[Dict[str, Any]], competitor: str) -> List[Dict[str, Any]]:
+    """Build upsert rows, one per (competitor, url), keeping the last occurrence.
+
+    Postgres rejects an ON CONFLICT statement that touches the same row
+    twice, and listings without a URL have no identity to upsert on.
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    for product in products:
+        if not product.get("url"):
+            continue
+        row = product_row(product, competitor)
+        rows[row["url"]] = row
+    return list(rows.values())
+
+
+def build_upsert(rows: List[Dict[str, Any]]):
+    """Multi-row INSERT ... ON CONFLICT (competitor, url) DO UPDATE.
+
+    Existing rows are only updated when their price or availability
+    differs, so a listing another process just wrote with the same state
+    is not returned. Returns the product id, URL, the stored price and
+    whether the row was newly inserted (``xmax = 0`` only holds for rows
+    created by this statement).
+    """
+    statement = insert(products_table).values(rows)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[products_table.c.competitor, products_table.c.url],
+        set_={
+            **{name: excluded[name] for name in UPDATABLE_COLUMNS},
+            "scraped_at": func.now(),
+            "last_seen_at": func.now()
+        },
+        where=or_(
+            products_table.c.price.is_distinct_from(excluded.price),
+            products_table.c.availability.is_distinct_from(excluded.availability)
+        )
+    ).returning(
+        products_table.c.id,
+        products_table.c.url,
+        products_table.c.price,
+        literal_column("(xmax = 0)").label("inserted")
+    )
+
+
+def build_previous_prices_query(rows: List[Dict[str, Any]], competitor: str, lock: bool = False):
+    """Stored state of a chunk's listings, looked up by the (competitor, url) key.
+
+    With ``lock`` the rows are locked (in id order, so concurrent savers
+    cannot deadlock) until the transaction ends, and the state returned is
+    the latest committed one.
+    """
+    statement = select(
+        products_table.c.competitor, products_table.c.url, products_table.c.id,
+        products_table.c.price, products_table.c.availability
+    ).where(
+        products_table.c.competitor == competitor,
+        products_table.c.url.in_([row["url"] for row in rows])
+    )
+    if lock:
+        statement = statement.order_by(products_table.c.id).with_for_update()
+    return statement
+
+
+def _still_stored(entries: List[KnownPrice]):
+    """Criteria matching the listings stored with the price and availability the index expects"""
+    expected = values(
+        column("id", Integer), column("price", Float), column("availability", String),
+        name="expected"
+    ).data([(entry.product_id, entry.price, entry.availability) for entry in entries])
+    return (
+        products_table.c.id == expected.c.id,
+        products_table.c.price == expected.c.price,
+        products_table.c.availability.is_not_distinct_from(expected.c.availability)
+    )
+
+
+def build_touch(entries: List[KnownPrice]):
+    """Bump last_seen_at of listings still stored with the expected price and availability.
+
+    Returns the ids of the rows bumped; a listing whose stored state moved
+    on (changed by another process) is not returned and must be upserted.
+    """
+    return update(products_table).where(*_still_stored(entries)).values(
+        last_seen_at=func.now()).returning(products_table.c.id)
+
+
+def build_confirm(entries: List[KnownPrice]):
+    """Ids of listings still stored with the expected price and availability, without a write"""
+    return select(products_table.c.id).where(*_still_stored(entries))
+
+
+def build_rollup_upsert(stored: List[Any], competitor: str):
+    """Fold one observed price per product into its hourly and daily OHLC buckets"""
+    statement = insert(rollups_table).values([
+        {
+            "product_id": row.id, "granularity": granularity, "source": competitor,
+            "bucket_start": func.date_trunc(granularity, func.now()),
+            "open": row.price, "high": row.price, "low": row.price, "close": row.price,
+            "observations": 1
+        }
+        for row in stored
+        for granularity in ROLLUP_GRANULARITIES
+    ])
+    excluded, current = statement.excluded, rollups_table.c
+    return statement.on_conflict_do_update(
+        index_elements=[current.product_id, current.granularity, current.bucket_start],
+        set_={
+            "high": func.greatest(current.high, excluded.high),
+            "low": func.least(current.low, excluded.low),
+            "close": excluded.close,
+            "observations": current.observations + 1
+        }
+    )
+
+
+def build_product_stats_upsert(stored: List[Any], competitor: str, alpha: float):
+    """Fold one observed price per product into its running statistics"""
+    statement = insert(product_stats_table).values([
+        {
+            "product_id": row.id, "competitor": competitor, "observations": 1,
+            "price_sum": row.price, "min_price": row.price, "max_price": row.price,
+            "ewma_price": row.price, "last_price": row.price
+        }
+        for row in stored
+    ])
+    excluded, current = statement.excluded, product_stats_table.c
+    return statement.on_conflict_do_update(
+        index_elements=[current.product_id],
+        set_={
+            "observations": current.observations + 1,
+            "price_sum": current.price_sum + excluded.price_sum,
+            "min_price": func.least(current.min_price, excluded.min_price),
+            "max_price": func.greatest(current.max_price, excluded.max_price),
+            "ewma_price": alpha * excluded.last_price + (1 - alpha) * current.ewma_price,
+            "last_price": excluded.last_price,
+            "updated_at": func.now()
+        }
+    )
+
+
+def build_competitor_stats_upsert(prices: List[float], new_products: int, competitor: str,
+                                  alpha: float):
+    """Fold a batch's hourly observations into the competitor's running statistics"""
+    statement = insert(competitor_stats_table).values(
+        competitor=competitor,
+        products=new_products,
+        observations=len(prices),
+        price_sum=sum(prices),
+        min_price=min(prices),
+        max_price=max(prices),
+        ewma_price=sum(prices) / len(prices)
+    )
+    excluded, current = statement.excluded, competitor_stats_table.c
+    return statement.on_conflict_do_update(
+        index_elements=[current.competitor],
+        set_={
+            "products": current.products + excluded.products,
+            "observations": current.observations + excluded.observations,
+            "price_sum": current.price_sum + excluded.price_sum,
+            "min_price": func.least(current.min_price, excluded.min_price),
+            "max_price": func.greatest(current.max_price, excluded.max_price),
+            "ewma_price": alpha * excluded.ewma_price + (1 - alpha) * current.ewma_price,
+            "updated_at": func.now()
+        }
+    )
+
+
+class ProductStore:
+    """Batched persistence of scraped products and their price history"""
+
+    def __init__(self, session_factory=None, batch_size: Optional[int] = None,
+                 price_index: Optional[PriceIndex] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.batch_size = batch_size or int(os.getenv("PRODUCT_UPSERT_BATCH_SIZE", "500"))
+        # Weight of the newest observation in the moving average prices
+        self.ewma_alpha = float(os.getenv("PRICE_EWMA_ALPHA", "0.3"))
+        self.price_index = price_index or PriceIndex()
+
+    async def warm(self):
+        """Load the last-known state of every stored listing"""
+        await self.price_index.warm(self.session_factory)
+
+    async def save_batch(self, products: List[Dict[str, Any]], competitor: str,
+                         changes: Optional[List[Dict[str, Any]]] = None) -> Dict[str, int]:
+        """Store a scrape batch, writing only what changed.
+
+        Each listing is compared with its last-known price and availability
+        in the price index (looked up in the database while the index is
+        not warmed). New and changed listings are upserted, and price
+        changes appended to price_history. Unchanged listings are confirmed
+        against their stored rows in batched statements: a read while they
+        were seen within ``seen_interval``, otherwise a last_seen_at bump.
+        They are folded into the rollups and per-product statistics once per
+        hour, and so are the competitor statistics.
+
+        Listings the index reports as changed are re-read from their locked
+        rows before writing, so when several processes save the same change
+        only the first records it. New listings and price changes are
+        appended to ``changes``, if given, as dicts with product_id, name,
+        url, price and previous_price.
+        """
+        rows = prepare_rows(products, competitor)
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": len(products) - len(rows)}
+        if not rows:
+            return counts
+
+        remembered = []
+        async with self.session_factory() as db:
+            async with db.begin():
+                for start in range(0, len(rows), self.batch_size):
+                    await self._save_chunk(db, rows[start:start + self.batch_size], competitor, counts,
+                                           remembered, changes)
+        # Only state that was committed reaches the index
+        for entry in remembered:
+            self.price_index.remember(competitor, *entry)
+
+        logger.info(
+            f"Saved {competitor} batch: {counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['skipped']} skipped")
+        return counts
+
+    async def _save_chunk(self, db, chunk: List[Dict[str, Any]], competitor: str, counts: Dict[str, int],
+                          remembered: List[tuple], changes: Optional[List[Dict[str, Any]]] = None):
+        index = self.price_index
+        now = time.time()
+        hour = current_hour(now)
+        if not index.loaded:
+            unknown = [row for row in chunk if index.get(competitor, row["url"]) is None]
+            if unknown:
+                index.load((await db.execute(build_previous_prices_query(unknown, competitor))).all())
+
+        changed, unchanged = [], []
+        for row in chunk:
+            known = index.get(competitor, row["url"])
+            if known is not None and known.matches(row):
+                unchanged.append((row, known))
+            else:
+                changed.append(row)
+
+        # Every skip is checked against the stored row, as other processes write
+        # through their own index; only listings due a last_seen_at bump are written
+        observed = []
+        recent = {known.product_id for _, known in unchanged
+                  if known.hour == hour and now - known.seen_at < index.seen_interval}
+        confirmed = set()
+        if recent:
+            confirmed.update(row.id for row in (await db.execute(build_confirm(
+                [known for _, known in unchanged if known.product_id in recent]))).all())
+        due = [known for _, known in unchanged if known.product_id not in recent]
+        if due:
+            confirmed.update(row.id for row in (await db.execute(build_touch(due))).all())
+        for row, known in unchanged:
+            if known.product_id not in confirmed:
+                # Stored state moved on in another process; the index entry was stale
+                changed.append(row)
+                continue
+            counts["unchanged"] += 1
+            if known.product_id in recent:
+                continue
+            if known.hour != hour and known.price > 0:
+                observed.append(Observation(known.product_id, known.price))
+            remembered.append((row["url"], known.product_id, known.price, known.availability, hour, now))
+
+        stored = []
+        if changed:
+            # The index may be stale; the locked rows are the state this write replaces
+            locked = {row.url: row for row in (await db.execute(
+                build_previous_prices_query(changed, competitor, lock=True))).all()}
+            written = []
+            for row in changed:
+                current = locked.get(row["url"])
+                if current is not None and KnownPrice(current.id, current.price, current.availability).matches(row):
+                    # Another process already stored this state
+                    counts["unchanged"] += 1
+                    remembered.append((row["url"], current.id, current.price, current.availability, hour, now))
+                else:
+                    written.append(row)
+
+            previous = {url: row.price for url, row in locked.items()}
+            availability = {row["url"]: row.get("availability") for row in written}
+            if written:
+                stored = (await db.execute(build_upsert(written))).all()
+
+            inserted = sum(1 for row in stored if row.inserted)
+            counts["inserted"] += inserted
+            counts["updated"] += len(stored) - inserted
+            # Rows inserted concurrently by another process with the same state
+            counts["unchanged"] += len(written) - len(stored)
+
+            moved = [row for row in stored if row.inserted or previous.get(row.url) != row.price]
+            if moved:
+                await db.execute(insert(price_history_table), [
+                    {"product_id": row.id, "price": row.price, "source": competitor}
+                    for row in moved
+                ])
+            if changes is not None:
+                names = {row["url"]: row["name"] for row in written}
+                changes.extend(
+                    {"product_id": row.id, "name": names[row.url], "url": row.url,
+                     "price": row.price, "previous_price": None if row.inserted else previous.get(row.url)}
+                    for row in moved
+                )
+            for row in stored:
+                remembered.append((row.url, row.id, row.price, availability[row.url], hour, now))
+                if row.price > 0:
+                    observed.append(Observation(row.id, row.price))
+
+        if observed:
+            await db.execute(build_rollup_upsert(observed, competitor))
+            await db.execute(build_product_stats_upsert(observed, competitor, self.ewma_alpha))
+        # The competitor statistics count the same hourly observations as the per-product ones
+        prices = [row.price for row in observed]
+        if prices:
+            await db.execute(build_competitor_stats_upsert(
+                prices, sum(1 for row in stored if row.inserted and row.price > 0),
+                competitor, self.ewma_alpha))
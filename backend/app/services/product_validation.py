@@ -0,0 +1,241 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_NAMES = {"", "unknown product", "product name unavailable"}
+
+# Weight of each rule in a record's confidence score
+SCORE_WEIGHTS = {
+    "price": 0.4,
+    "name": 0.3,
+    "url": 0.2,
+    "rating": 0.1
+}
+
+
+def score_record(product: Dict[str, Any]) -> Tuple[float, List[str]]:
+    """Rule-based confidence of a selector-extracted record, with the failed rules"""
+    failed = []
+    price = product.get("price")
+    if not isinstance(price, (int, float)) or price <= 0:
+        failed.append("price")
+    if str(product.get("name") or "").strip().lower() in PLACEHOLDER_NAMES:
+        failed.append("name")
+    if not str(product.get("url") or "").startswith(("http://", "https://")):
+        failed.append("url")
+    rating = product.get("rating")
+    if rating is not None and not 0 <= rating <= 5:
+        failed.append("rating")
+    score = 1.0 - sum(SCORE_WEIGHTS[rule] for rule in failed)
+    return round(max(0.0, score), 4), failed
+
+
+class ExtractionStats:
+    """How many records each site needed the LLM for"""
+
+    def __init__(self):
+        self._sites: Dict[str, Dict[str, int]] = {}
+
+    def record(self, site: str, records: int, low_confidence: int, sent_to_llm: int,
+               recovered: int):
+        counters = self._sites.setdefault(site, {
+            "records": 0, "low_confidence": 0, "sent_to_llm": 0, "recovered": 0
+        })
+        counters["records"] += records
+        counters["low_confidence"] += low_confidence
+        counters["sent_to_llm"] += sent_to_llm
+        counters["recovered"] += recovered
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            site: {
+                **counters,
+                "llm_call_rate": round(counters["sent_to_llm"] / counters["records"], 4)
+                if counters["records"] else 0.0
+            }
+            for site, counters in self._sites.items()
+        }
+
+
+extraction_stats = ExtractionStats()
+
+
+# Query parameters that only track how a listing was reached
+TRACKING_PARAMS = {
+    "ref", "ref_", "qid", "sr", "crid", "sprefix", "keywords", "dib", "dib_tag", "th", "psc",
+    "content-id", "_encoding", "spla", "sp_csd", "adsid", "clickid", "gclid", "fbclid",
+    "irclickid", "intsrc", "from", "classtype", "wl13", "wmlspartner", "selectedsellerid"
+}
+TRACKING_PARAM_PREFIXES = ("utm_", "pf_rd_", "pd_rd_", "ath", "sp_")
+
+AMAZON_ASIN_RE = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?]|$)")
+
+CURRENCY_SYMBOLS = {"US$": "USD", "CA$": "CAD", "C$": "CAD", "$": "USD", "£": "GBP", "€": "EUR"}
+KNOWN_CURRENCIES = {"USD", "CAD", "GBP", "EUR"}
+CURRENCY_SYMBOL_RE = r"(US\$|CA\$|C\$|\$|£|€)"
+SPONSORED_PREFIX_RE = r"^(?:sponsored(?: ad)?\s*[-–:|]?\s*)+"
+
+MAX_PRICE = 100_000.0
+
+# Problems that make a record unusable
+REJECT_REASONS = ["name_missing", "price_missing", "price_out_of_range", "url_invalid"]
+# Problems that are fixed locally but may deserve a second opinion
+REVIEW_REASONS = ["rating_out_of_range", "currency_unknown", "original_price_not_above_price"]
+
+
+def canonical_url(url: Optional[str], base_url: str = "") -> Optional[str]:
+    """Absolute https product URL without fragment or tracking parameters.
+
+    Amazon product links collapse to ``/dp/<ASIN>`` so the same listing
+    reached from different searches has one identity.
+    """
+    if not isinstance(url, str) or not url.strip():
+        return None
+    url = urljoin(base_url, url.strip()) if base_url else url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    asin = AMAZON_ASIN_RE.search(parts.path) if "amazon." in host else None
+    if asin:
+        return f"https://{host}/dp/{asin.group(1)}"
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+    ]
+    path = re.sub(r"/{2,}", "/", parts.path) or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+class ValidationReport:
+    """Outcome of validating one batch of product dicts"""
+
+    def __init__(self, valid: List[Dict[str, Any]], rejected: List[Dict[str, Any]],
+                 review: List[int]):
+        # Normalized records fit to store
+        self.valid = valid
+        # {"product": original record, "reasons": [...]} per rejected record
+        self.rejected = rejected
+        # Positions in ``valid`` of records that were repaired and may merit a second look
+        self.review = review
+
+    def reason_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for rejection in self.rejected:
+            for reason in rejection["reasons"]:
+                counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+
+class ValidationStats:
+    """Accepted, rejected and per-reason counters per site"""
+
+    def __init__(self):
+        self._sites: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, site: str, report: ValidationReport):
+        counters = self._sites.setdefault(site, {"accepted": 0, "rejected": 0, "review": 0, "reasons": {}})
+        counters["accepted"] += len(report.valid)
+        counters["rejected"] += len(report.rejected)
+        counters["review"] += len(report.review)
+        for reason, count in report.reason_counts().items():
+            counters["reasons"][reason] = counters["reasons"].get(reason, 0) + count
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {site: {**c, "reasons": dict(c["reasons"])} for site, c in self._sites.items()}
+
+
+validation_stats = ValidationStats()
+
+
+def _numeric(values: pd.Series) -> pd.Series:
+    """Numbers as floats; strings such as '$1,199.99' parsed, anything else NaN"""
+    numbers = pd.to_numeric(values, errors="coerce")
+    text = values.where(numbers.isna()).astype("string")
+    parsed = pd.to_numeric(text.str.replace(r"[^\d.]", "", regex=True), errors="coerce")
+    return numbers.fillna(parsed).astype(float)
+
+
+def validate_products(products: List[Dict[str, Any]], base_url: str = "") -> ValidationReport:
+    """Validate and normalize a batch of product dicts with column-wise operations.
+
+    Prices are parsed and rounded, currencies derived from price symbols
+    when missing, URLs canonicalized, names cleaned and ratings and review
+    counts range checked. Records without a usable name, price or URL are
+    rejected with their reasons; repairable problems are fixed in place and
+    the records flagged for review.
+    """
+    if not products:
+        return ValidationReport([], [], [])
+
+    frame = pd.DataFrame.from_records(products)
+    for column in ("name", "price", "original_price", "currency", "url", "rating", "review_count"):
+        if column not in frame:
+            frame[column] = None
+    raw_price = frame["price"]
+
+    price = _numeric(raw_price).round(2)
+    original_price = _numeric(frame["original_price"]).round(2)
+    symbol = raw_price.astype("string").str.extract(CURRENCY_SYMBOL_RE, expand=False).map(CURRENCY_SYMBOLS)
+    currency = (frame["currency"].astype("string").str.strip().str.upper()
+                .replace("", pd.NA).fillna(symbol).fillna("USD"))
+    unknown_currency = ~currency.isin(KNOWN_CURRENCIES)
+
+    name = (frame["name"].astype("string").fillna("")
+            .str.replace(r"\s+", " ", regex=True).str.strip()
+            .str.replace(SPONSORED_PREFIX_RE, "", regex=True, flags=re.I)
+            .str.slice(0, 255))
+    url = frame["url"].map(lambda value: canonical_url(value, base_url))
+
+    rating = pd.to_numeric(frame["rating"], errors="coerce").astype(float)
+    review_count = _numeric(frame["review_count"]).round().clip(lower=0)
+
+    masks = {
+        "name_missing": name.str.lower().isin(PLACEHOLDER_NAMES).to_numpy(dtype=bool),
+        "price_missing": (price.isna() | (price <= 0)).to_numpy(),
+        "price_out_of_range": (price > MAX_PRICE).to_numpy(),
+        "url_invalid": url.isna().to_numpy(),
+        "rating_out_of_range": (rating.notna() & ((rating < 0) | (rating > 5))).to_numpy(),
+        "currency_unknown": unknown_currency.to_numpy(dtype=bool),
+        "original_price_not_above_price": (original_price.notna() & (original_price <= price)).to_numpy()
+    }
+    rejected_mask = np.logical_or.reduce([masks[reason] for reason in REJECT_REASONS])
+    review_mask = np.logical_or.reduce([masks[reason] for reason in REVIEW_REASONS])
+
+    normalized = frame.assign(
+        name=name,
+        price=price,
+        original_price=original_price.where(~masks["original_price_not_above_price"]),
+        currency=currency.where(~unknown_currency, symbol.fillna("USD")),
+        url=url,
+        rating=rating.where(~masks["rating_out_of_range"]),
+        review_count=review_count
+    )
+    normalized = normalized.astype(object).where(normalized.notna(), None)
+    records = normalized.to_dict("records")
+
+    valid, rejected, review = [], [], []
+    for position, record in enumerate(records):
+        if rejected_mask[position]:
+            reasons = [reason for reason in REJECT_REASONS + REVIEW_REASONS if masks[reason][position]]
+            rejected.append({"product": products[position], "reasons": reasons})
+            continue
+        # Columns added for the batch stay off records that never had them
+        record = {key: value for key, value in record.items()
+                  if key in products[position] or value is not None}
+        if record.get("review_count") is not None:
+            record["review_count"] = int(record["review_count"])
+        if review_mask[position]:
+            review.append(len(valid))
+        valid.append(record)
+    return ValidationReport(valid, rejected, review)
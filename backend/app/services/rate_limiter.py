@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+def domain_of(url_or_domain: str) -> str:
+    """Normalize a URL or host to the domain used for rate limiting"""
+    host = urlsplit(url_or_domain).hostname if "://" in url_or_domain else url_or_domain
+    host = (host or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _parse_overrides(spec: str) -> Dict[str, float]:
+    """Parse 'amazon.com=0.5,walmart.com=1' into a rate per domain"""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        domain, _, rate = item.partition("=")
+        try:
+            overrides[domain_of(domain.strip())] = float(rate)
+        except ValueError:
+            logger.warning(f"Ignoring invalid rate limit override: {item}")
+    return overrides
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate`` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate: float):
+        """Change the refill rate, crediting tokens earned at the old rate"""
+        self._refill()
+        self.rate = rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens if they are available right now"""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def debit(self, tokens: float):
+        """Take tokens without waiting, going into debt for usage known only afterwards"""
+        self._refill()
+        self.tokens -= tokens
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until tokens are available and take them"""
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(max(0.001, (tokens - self.tokens) / self.rate))
+
+
+# Responses that mean the site wants us to slow down
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+class DomainState:
+    """Token bucket, in-flight cap and AIMD backoff state for one domain"""
+
+    def __init__(self, domain: str, rate: float, burst: float, min_rate: float,
+                 max_rate: float, max_in_flight: int):
+        self.domain = domain
+        self.bucket = TokenBucket(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.backoff_until = 0.0
+        self.consecutive_throttles = 0
+        self.counters = {"requests": 0, "successes": 0, "throttled": 0, "errors": 0}
+
+
+class RequestPermit:
+    """Permission to send one request; report the response before exiting"""
+
+    def __init__(self, state: DomainState):
+        self.state = state
+        self.status: Optional[int] = None
+        self.blocked = False
+
+    def report(self, status: Optional[int], blocked: bool = False):
+        """Record the response status and whether a CAPTCHA/block page was served"""
+        self.status = status
+        self.blocked = blocked
+
+    @property
+    def throttled(self) -> bool:
+        return self.blocked or self.status in THROTTLE_STATUS_CODES
+
+
+class DomainRateLimiter:
+    """Adaptive per-domain request scheduler shared by every scraper in the process.
+
+    Each domain has a token bucket for its request rate and a cap on
+    requests in flight. The rate follows AIMD: every successful response
+    adds ``increase`` requests/second up to ``max_rate``; a 429, 503 or
+    CAPTCHA multiplies it by ``decrease`` down to ``min_rate`` and pauses
+    the domain for an exponentially growing backoff.
+    """
+
+    def __init__(self, default_rate: Optional[float] = None, burst: Optional[float] = None,
+                 overrides: Optional[Dict[str, float]] = None,
+                 max_in_flight: Optional[int] = None, min_rate: Optional[float] = None,
+                 max_rate: Optional[float] = None, increase: float = 0.05,
+                 decrease: float = 0.5, base_backoff: Optional[float] = None,
+                 max_backoff: float = 300.0):
+        self.default_rate = default_rate or float(os.getenv("SCRAPER_DOMAIN_RATE", "0.5"))
+        self.burst = burst or float(os.getenv("SCRAPER_DOMAIN_BURST", "2"))
+        self.overrides = overrides if overrides is not None else _parse_overrides(
+            os.getenv("SCRAPER_DOMAIN_RATE_OVERRIDES", ""))
+        self.max_in_flight = max_in_flight or int(os.getenv("SCRAPER_DOMAIN_MAX_IN_FLIGHT", "2"))
+        self.min_rate = min_rate or float(os.getenv("SCRAPER_DOMAIN_MIN_RATE", "0.05"))
+        self.max_rate = max_rate or float(os.getenv("SCRAPER_DOMAIN_MAX_RATE", "2.0"))
+        self.increase = increase
+        self.decrease = decrease
+        self.base_backoff = base_backoff if base_backoff is not None else float(
+            os.getenv("SCRAPER_DOMAIN_BACKOFF", "5"))
+        self.max_backoff = max_backoff
+        self._domains: Dict[str, DomainState] = {}
+
+    def state(self, url_or_domain: str) -> DomainState:
+        domain = domain_of(url_or_domain)
+        if domain not in self._domains:
+            rate = self.overrides.get(domain, self.default_rate)
+            self._domains[domain] = DomainState(
+                domain, rate, self.burst, min(self.min_rate, rate),
+                self.max_rate, self.max_in_flight)
+        return self._domains[domain]
+
+    def bucket(self, url_or_domain: str) -> TokenBucket:
+        return self.state(url_or_domain).bucket
+
+    @asynccontextmanager
+    async def request(self, url: str) -> AsyncIterator[RequestPermit]:
+        """Hold an in-flight slot and a rate token for one request to ``url``"""
+        state = self.state(url)
+        async with state.slots:
+            delay = state.backoff_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await state.bucket.acquire()
+
+            permit = RequestPermit(state)
+            state.in_flight += 1
+            state.counters["requests"] += 1
+            try:
+                yield permit
+            except Exception:
+                state.counters["errors"] += 1
+                raise
+            else:
+                if permit.throttled:
+                    self._on_throttle(state)
+                elif permit.status is not None:
+                    self._on_success(state)
+            finally:
+                state.in_flight -= 1
+
+    def _on_success(self, state: DomainState):
+        state.counters["successes"] += 1
+        state.consecutive_throttles = 0
+        state.bucket.set_rate(min(state.max_rate, state.bucket.rate + self.increase))
+
+    def _on_throttle(self, state: DomainState):
+        state.counters["throttled"] += 1
+        state.consecutive_throttles += 1
+        state.bucket.set_rate(max(state.min_rate, state.bucket.rate * self.decrease))
+        backoff = min(self.max_backoff,
+                      self.base_backoff * 2 ** (state.consecutive_throttles - 1))
+        state.backoff_until = max(state.backoff_until, time.monotonic() + backoff)
+        logger.warning(
+            f"Throttled by {state.domain}: rate {state.bucket.rate:.3f}/s, backing off {backoff:.0f}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current rate, concurrency and backoff state per domain"""
+        now = time.monotonic()
+        return {
+            domain: {
+                "rate": round(state.bucket.rate, 4),
+                "tokens": round(state.bucket.tokens, 2),
+                "in_flight": state.in_flight,
+                "max_in_flight": state.max_in_flight,
+                "backoff_remaining": round(max(0.0, state.backoff_until - now), 2),
+                "consecutive_throttles": state.consecutive_throttles,
+                **state.counters
+            }
+            for domain, state in self._domains.items()
+        }
+
+
+_rate_limiter: Optional[DomainRateLimiter] = None
+
+
+def get_rate_limiter() -> DomainRateLimiter:
+    """Return the process-wide domain rate limiter"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = DomainRateLimiter()
+    return _rate_limiter
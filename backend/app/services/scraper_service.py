@@ -1,15 +1,33 @@
 import asyncio
 import logging
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+import os
+import uuid
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 
 from ..models import Product, ScrapingJob, ScrapingSession, PriceHistory
-from ..schemas import ScrapingRequest, JobStatus
+from ..schemas import AlertConfig, ScrapingRequest, JobStatus
 from .ai_service import AIService
-from .site_scrapers import AmazonScraper, BestBuyScraper, WalmartScraper
+from .alerts import AlertEngine
+from .analysis import CompetitiveAnalysis
+from .browser_pool import close_browser_pool, get_browser_pool
+from .fetch_engines import close_http_engine, fetch_stats
+from .html_pruner import pruning_stats
+from .interception import interception_stats
+from .job_store import JobStore
+from .llm_cache import close_llm_cache, get_llm_cache
+from .llm_client import close_llm_client, get_llm_client
+from .product_catalog import ProductCatalog, ProductFilters
+from .product_matching import ProductMatcher
+from .product_store import ProductStore
+from .product_validation import (
+    extraction_stats, score_record, validate_products, validation_stats
+)
+from .rate_limiter import domain_of, get_rate_limiter
+from .site_scrapers import AmazonScraper, BestBuyScraper, WalmartScraper, absolute_url
 
 logger = logging.getLogger(__name__)
 
@@ -22,56 +40,160 @@ class ScraperService:
             "bestbuy": BestBuyScraper(),
             "walmart": WalmartScraper()
         }
+        self.product_store = ProductStore()
+        self.catalog = ProductCatalog()
+        self.job_store = JobStore()
+        self.analysis = CompetitiveAnalysis()
+        self.matcher = ProductMatcher()
+        self.alerts = AlertEngine()
         self.active_jobs: Dict[str, asyncio.Task] = {}
+        # URLs of one job scraped at the same time
+        self.job_concurrency = int(os.getenv("SCRAPER_JOB_CONCURRENCY", "8"))
+        # Selector-extracted records scoring below this are re-extracted by the LLM
+        self.ai_confidence_threshold = float(os.getenv("SCRAPER_AI_CONFIDENCE_THRESHOLD", "0.8"))
+        # Ask the LLM about records the local validator had to repair (opt-in)
+        self.llm_validation = os.getenv("SCRAPER_LLM_VALIDATION", "0") == "1"
+        # "celery" sends each URL to the worker tier, "local" scrapes in this process
+        self.queue_mode = os.getenv("SCRAPER_QUEUE_MODE") or (
+            "celery" if os.getenv("REDIS_URL") else "local")
+
+    def scraper_for_url(self, url: str) -> Optional[str]:
+        """Route a URL to the site whose scraper handles its hostname"""
+        domain = domain_of(url)
+        for site, scraper in self.scrapers.items():
+            site_domain = domain_of(scraper.base_url)
+            if domain == site_domain or domain.endswith(f".{site_domain}"):
+                return site
+        return None
+
+    @staticmethod
+    def _job_fields(job: ScrapingJob) -> Dict[str, Any]:
+        """Job columns published to the job store"""
+        return {
+            "status": job.status,
+            "progress": job.progress,
+            "products_scraped": job.products_scraped,
+            "started_at": job.started_at,
+            "completed_at": job.completed_at,
+            "error_message": job.error_message,
+            "urls": (job.extra_metadata or {}).get("urls", {})
+        }
+
+    async def create_job(self, request: ScrapingRequest) -> ScrapingJob:
+        """Create a pending job with its own id and record it in the job store"""
+        job = ScrapingJob(
+            job_id=str(uuid.uuid4()),
+            status="pending",
+            target_urls=[str(url) for url in request.urls],
+            target_sites=[str(getattr(site, "value", site)) for site in request.target_sites],
+            max_products=request.max_products,
+            products_scraped=0,
+            progress=0.0,
+            started_at=datetime.utcnow()
+        )
+        await self.job_store.create(
+            job.job_id,
+            target_urls=job.target_urls,
+            target_sites=job.target_sites,
+            max_products=job.max_products,
+            **self._job_fields(job)
+        )
+        return job
+
+    def _plan_sessions(self, job: ScrapingJob, request: ScrapingRequest) -> List[ScrapingSession]:
+        """Build one session per requested URL, routed to its site's scraper"""
+        target_sites = {str(getattr(site, "value", site)) for site in request.target_sites}
+        sessions = []
+        for url in dict.fromkeys(str(url) for url in request.urls):
+            site = self.scraper_for_url(url)
+            session = ScrapingSession(
+                job_id=job.job_id,
+                site=site or "unknown",
+                url=url,
+                status="pending"
+            )
+            if site is None:
+                session.status = "failed"
+                session.error_message = "No scraper available for this host"
+            elif site not in target_sites:
+                session.status = "skipped"
+                session.error_message = f"Site {site} is not in target_sites"
+            sessions.append(session)
+        return sessions
+
+    @staticmethod
+    def _unit_state(session: ScrapingSession) -> Dict[str, Any]:
+        """Per-URL status published on the job"""
+        return {
+            "site": session.site,
+            "status": session.status,
+            "products_found": session.products_found or 0,
+            "error_message": session.error_message
+        }
+
+    def _record_url_progress(self, job: ScrapingJob, sessions: List[ScrapingSession]):
+        """Publish per-URL status and overall progress on the job"""
+        finished = sum(1 for s in sessions if s.status in ("completed", "failed", "skipped"))
+        job.progress = finished / len(sessions) if sessions else 1.0
+        job.products_scraped = sum(s.products_found or 0 for s in sessions)
+        job.extra_metadata = {
+            **(job.extra_metadata or {}),
+            "urls": {s.url: self._unit_state(s) for s in sessions}
+        }
+        self.job_store.update(job.job_id, **self._job_fields(job))
 
     async def run_scraping_job(self, job: ScrapingJob, request: ScrapingRequest):
-        """Run a scraping job asynchronously"""
+        """Run a scraping job asynchronously.
+
+        Every URL in the request is routed to the scraper for its hostname
+        and scraped concurrently, at most ``job_concurrency`` at a time.
+        """
         try:
             logger.info(f"Starting scraping job {job.job_id}")
 
             # Update job status
             job.status = "running"
-            job.started_at = datetime.utcnow()
-
-            # Create scraping sessions for each site
-            sessions = []
-            for site in request.target_sites:
-                session = ScrapingSession(
-                    job_id=job.job_id,
-                    site=site,
-                    url=str(request.urls[0]),  # Simplified for demo
-                    status="pending"
-                )
-                sessions.append(session)
-
-            # Run scraping for each site concurrently
-            tasks = []
-            for session in sessions:
-                task = asyncio.create_task(
-                    self._scrape_site(session, request)
-                )
-                tasks.append(task)
-
-            # Wait for all scraping tasks to complete
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            job.started_at = job.started_at or datetime.utcnow()
+
+            sessions = self._plan_sessions(job, request)
+            self._record_url_progress(job, sessions)
+            semaphore = asyncio.Semaphore(self.job_concurrency)
+
+            async def run_session(session: ScrapingSession) -> int:
+                async with semaphore:
+                    try:
+                        return await self._scrape_site(
+                            session, request.max_products, request.use_ai_parsing)
+                    finally:
+                        self._record_url_progress(job, sessions)
+
+            # Scrape every routable URL concurrently
+            unroutable = [s for s in sessions if s.status == "failed"]
+            runnable = [s for s in sessions if s.status == "pending"]
+            results = await asyncio.gather(
+                *(run_session(session) for session in runnable),
+                return_exceptions=True
+            )
 
             # Process results
-            total_products = 0
-            for result in results:
+            errors = []
+            for session, result in zip(runnable, results):
                 if isinstance(result, Exception):
-                    logger.error(f"Scraping error: {result}")
-                    job.error_message = str(result)
-                else:
-                    total_products += result
+                    logger.error(f"Scraping error for {session.url}: {result}")
+                    errors.append(f"{session.url}: {result}")
+            errors.extend(f"{s.url}: {s.error_message}" for s in unroutable)
+            if errors:
+                job.error_message = "; ".join(errors)
 
             # Update job completion
-            job.products_scraped = total_products
+            self._record_url_progress(job, sessions)
             job.status = "completed"
             job.completed_at = datetime.utcnow()
             job.progress = 1.0
 
             logger.info(
-                f"Scraping job {job.job_id} completed with {total_products} products")
+                f"Scraping job {job.job_id} completed with {job.products_scraped} products "
+                f"from {len(runnable)} URLs")
 
         except Exception as e:
             logger.error(f"Scraping job {job.job_id} failed: {e}")
@@ -79,8 +201,123 @@ class ScraperService:
             job.error_message = str(e)
             job.completed_at = datetime.utcnow()
 
-    async def _scrape_site(self, session: ScrapingSession, request: ScrapingRequest) -> int:
-        """Scrape a specific site"""
+        try:
+            await self.job_store.finish(job.job_id, **self._job_fields(job))
+        except Exception as e:
+            logger.error(f"Failed to record final state of job {job.job_id}: {e}")
+
+    async def submit_job(self, job: ScrapingJob, request: ScrapingRequest):
+        """Hand a created job to the worker tier, or scrape it in this process"""
+        if self.queue_mode == "celery":
+            await self.dispatch_job(job, request)
+            return
+        task = asyncio.create_task(self.run_scraping_job(job, request))
+        self.active_jobs[job.job_id] = task
+        task.add_done_callback(lambda _: self.active_jobs.pop(job.job_id, None))
+
+    async def dispatch_job(self, job: ScrapingJob, request: ScrapingRequest):
+        """Enqueue one unit of work per routable URL on the request's priority queue.
+
+        URLs that are skipped or cannot be routed are settled up front; the
+        worker completing the last unit marks the job completed. If the
+        broker rejects a unit, it and the units not sent yet are settled as
+        failed so the job still completes.
+        """
+        sessions = self._plan_sessions(job, request)
+        runnable = [s for s in sessions if s.status == "pending"]
+        job.status = "running"
+        await self.job_store.start_units(
+            job.job_id,
+            {s.url: self._unit_state(s) for s in sessions},
+            settled=len(sessions) - len(runnable),
+            status=job.status
+        )
+        if not runnable:
+            await self._finish_units(job.job_id)
+            return
+
+        for position, session in enumerate(runnable):
+            try:
+                # Publishing blocks on the broker connection
+                await asyncio.to_thread(self._enqueue_unit, session, request)
+            except Exception as e:
+                logger.error(
+                    f"Dispatching job {job.job_id} failed after {position} of {len(runnable)} URLs: {e}")
+                await self._fail_units(job.job_id, runnable[position:], f"Could not be queued: {e}")
+                return
+        logger.info(
+            f"Dispatched {len(runnable)} URLs of job {job.job_id} "
+            f"to the {request.priority.value} queue")
+
+    async def _fail_units(self, job_id: str, sessions: List[ScrapingSession], error: str):
+        """Settle units that never reached a worker as failed"""
+        for session in sessions:
+            session.status = "failed"
+            session.error_message = error
+            if await self.job_store.complete_unit(job_id, session.url, self._unit_state(session)):
+                await self._finish_units(job_id)
+
+    def _enqueue_unit(self, session: ScrapingSession, request: ScrapingRequest):
+        from ..celery_app import scrape_unit
+        scrape_unit.apply_async(
+            kwargs={
+                "job_id": session.job_id,
+                "site": session.site,
+                "url": session.url,
+                "max_products": request.max_products,
+                "use_ai_parsing": request.use_ai_parsing
+            },
+            queue=request.priority.value
+        )
+
+    async def run_unit(self, job_id: str, site: str, url: str, max_products: int = 100,
+                       use_ai_parsing: bool = True, attempt: int = 1,
+                       final_attempt: bool = True) -> int:
+        """Scrape one queued URL of a job and report it to the job store.
+
+        A failure that will be retried is recorded as ``retrying`` and
+        re-raised for the queue to redeliver; only the final outcome counts
+        towards the job's progress.
+        """
+        session = ScrapingSession(job_id=job_id, site=site, url=url, status="pending")
+        await self.job_store.update_unit(
+            job_id, url, {**self._unit_state(session), "status": "running", "attempt": attempt})
+        try:
+            saved_count = await self._scrape_site(session, max_products, use_ai_parsing)
+        except Exception:
+            if not final_attempt:
+                await self.job_store.update_unit(
+                    job_id, url, {**self._unit_state(session), "status": "retrying",
+                                  "attempt": attempt})
+                raise
+            saved_count = 0
+
+        last = await self.job_store.complete_unit(
+            job_id, url, {**self._unit_state(session), "attempt": attempt}, saved_count)
+        if last:
+            await self._finish_units(job_id)
+        return saved_count
+
+    async def _finish_units(self, job_id: str):
+        """Mark a job completed once all of its units are settled"""
+        job = await self.job_store.get(job_id) or {}
+        errors = [
+            f"{url}: {state.get('error_message')}"
+            for url, state in job.get("urls", {}).items()
+            if state.get("status") == "failed"
+        ]
+        await self.job_store.finish(
+            job_id,
+            status="completed",
+            progress=1.0,
+            completed_at=datetime.utcnow(),
+            error_message="; ".join(errors) or None
+        )
+        logger.info(f"Scraping job {job_id} completed with {job.get('products_scraped', 0)} products")
+
+    async def _scrape_site(self, session: ScrapingSession, max_products: int,
+                           use_ai_parsing: bool) -> int:
+        """Scrape one URL with its site's scraper"""
         try:
             session.status = "running"
             session.started_at = datetime.utcnow()
@@ -94,10 +331,14 @@ class ScraperService:
             # Scrape products
             products = await scraper.scrape_products(
                 url=session.url,
-                max_products=request.max_products,
-                use_ai_parsing=request.use_ai_parsing
+                max_products=max_products,
+                use_ai_parsing=use_ai_parsing
             )
 
+            # Only records the selectors could not read go to the LLM
+            products = await self._refine_products(products, session.site, use_ai_parsing)
+            products = await self._validate_products(products, session.site)
+
             # Save products to database
             saved_count = await self._save_products(products, session.site)
 
@@ -106,99 +347,190 @@ class ScraperService:
             session.completed_at = datetime.utcnow()
             session.products_found = saved_count
 
-            logger.info(f"Scraped {saved_count} products from {session.site}")
+            logger.info(f"Scraped {saved_count} products from {session.url}")
             return saved_count
 
         except Exception as e:
-            logger.error(f"Error scraping {session.site}: {e}")
+            logger.error(f"Error scraping {session.url}: {e}")
             session.status = "failed"
             session.error_message = str(e)
             session.completed_at = datetime.utcnow()
             raise
 
+    async def _refine_products(self, products: List[Dict[str, Any]], site: str,
+                               use_ai_parsing: bool) -> List[Dict[str, Any]]:
+        """Score selector-extracted records and re-extract the weak ones with the LLM.
+
+        Every record gets a rule-based confidence score. Records below
+        ``ai_confidence_threshold`` are sent, with their card markup, to the
+        batched LLM extraction, which only fills in the fields the selectors
+        missed. AI parsing is skipped while the LLM client's circuit is open.
+        """
+        low = []
+        for product in products:
+            product["confidence_score"], failed = score_record(product)
+            if product["confidence_score"] < self.ai_confidence_threshold:
+                low.append((product, failed))
+
+        sent = [(product, failed) for product, failed in low if product.get("_html")]
+        if not (use_ai_parsing and sent and self.ai_service.available):
+            sent = []
+
+        recovered = 0
+        if sent:
+            results = await self.ai_service.extract_products_batch(
+                [product["_html"] for product, _ in sent], site)
+            base_url = getattr(self.scrapers.get(site), "base_url", "")
+            for (product, failed), result in zip(sent, results):
+                if not result:
+                    continue
+                for field in failed:
+                    if field == "url" and result.get("url"):
+                        product["url"] = absolute_url(result["url"], base_url)
+                    elif result.get(field) is not None:
+                        product[field] = result[field]
+                for field in ("rating", "review_count", "original_price", "image_url"):
+                    if product.get(field) in (None, 0) and result.get(field) is not None:
+                        product[field] = result[field]
+                score, _ = score_record(product)
+                if score > product["confidence_score"]:
+                    recovered += 1
+                product["confidence_score"] = score
+
+        extraction_stats.record(site, len(products), len(low), len(sent), recovered)
+        for product in products:
+            product.pop("_html", None)
+        return products
+
+    async def _validate_products(self, products: List[Dict[str, Any]], site: str) -> List[Dict[str, Any]]:
+        """Normalize a scrape batch locally and drop records that cannot be stored.
+
+        With ``llm_validation`` enabled, records the validator had to
+        repair are also run past the LLM validator, and its answer is kept
+        only if it passes local validation too.
+        """
+        base_url = getattr(self.scrapers.get(site), "base_url", "")
+        report = validate_products(products, base_url)
+        validation_stats.record(site, report)
+        if report.rejected:
+            logger.info(f"Rejected {len(report.rejected)} {site} products: {report.reason_counts()}")
+
+        valid = report.valid
+        if self.llm_validation and report.review and self.ai_service.available:
+            answers = await asyncio.gather(
+                *(self.ai_service.validate_product_data(valid[i]) for i in report.review),
+                return_exceptions=True
+            )
+            for position, answer in zip(report.review, answers):
+                if not isinstance(answer, dict) or not answer:
+                    continue
+                checked = validate_products([{**valid[position], **answer}], base_url)
+                if checked.valid and not checked.review:
+                    valid[position] = checked.valid[0]
+        return valid
+
     async def _save_products(self, products: List[Dict], competitor: str) -> int:
         """Save scraped products to database"""
-        # This would be implemented with actual database session
-        # For now, return mock count
-        return len(products)
-
-    async def get_job_status(self, job_id: str) -> Optional[ScrapingJob]:
-        """Get status of a scraping job"""
-        # This would query the database
-        # For now, return mock data
-        return ScrapingJob(
-            job_id=job_id,
-            status="running",
-            progress=0.65,
-            products_scraped=32
-        )
+        if not products:
+            return 0
+        await self.matcher.refresh_if_stale()
+        self.matcher.assign(products)
+        changes = []
+        counts = await self.product_store.save_batch(products, competitor, changes)
+        await self.analysis.invalidate()
+        try:
+            await self.alerts.on_price_changes(competitor, changes)
+        except Exception as e:
+            logger.warning(f"Could not evaluate price alerts: {e}")
+        return counts["inserted"] + counts["updated"] + counts["unchanged"]
 
-    async def get_products(self, db: AsyncSession, limit: int = 100, offset: int = 0) -> List[Product]:
-        """Get scraped products with pagination"""
-        # This would query the database
-        # For now, return mock data
-        return [
-            Product(
-                id=1,
-                name="iPhone 15 Pro Max",
-                price=1199.99,
-                competitor="amazon",
-                url="https://example.com",
-                scraped_at=datetime.utcnow(),
-                confidence_score=0.95
-            ),
-            Product(
-                id=2,
-                name="iPhone 15 Pro Max",
-                price=1199.99,
-                competitor="bestbuy",
-                url="https://example.com",
-                scraped_at=datetime.utcnow(),
-                confidence_score=0.92
-            )
-        ]
+    async def warm_up(self):
+        """Load stored canonical products and last-known prices into memory"""
+        try:
+            await self.matcher.warm()
+        except Exception as e:
+            logger.warning(f"Could not warm the product matcher: {e}")
+        try:
+            await self.product_store.warm()
+        except Exception as e:
+            logger.warning(f"Could not warm the price index: {e}")
+        try:
+            await self.alerts.load()
+        except Exception as e:
+            logger.warning(f"Could not load price alerts: {e}")
+
+    async def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get status of a scraping job, or None if it is unknown"""
+        return await self.job_store.get(job_id)
+
+    async def get_products(self, filters: ProductFilters, cursor: Optional[str] = None,
+                           limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get one page of scraped products and the cursor of the next page"""
+        return await self.catalog.page(filters, cursor, limit)
+
+    async def get_price_history(self, product_id: int, days: int = 90,
+                                granularity: str = "raw") -> List[Dict[str, Any]]:
+        """Price changes or OHLC buckets of one product over the last ``days`` days"""
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        return await self.catalog.price_history(product_id, since, granularity)
+
+    def export_products(self, filters: ProductFilters, export_format: str) -> AsyncIterator[str]:
+        """Stream all matching products as NDJSON or CSV"""
+        return self.catalog.export(filters, export_format)
+
+    async def configure_alert(self, config: AlertConfig) -> int:
+        """Store a price alert; it is evaluated against every price change from now on"""
+        return await self.alerts.create(
+            config.email, config.price_threshold, config.product_name,
+            config.competitor.value if config.competitor else None, config.is_active)
+
+    async def flush_alerts(self):
+        """Deliver queued alert notifications now"""
+        await self.alerts.outbox.flush()
 
     async def generate_competitive_analysis(self) -> Dict[str, Any]:
         """Generate competitive analysis of scraped data"""
-        # This would analyze the database
-        # For now, return mock analysis
-        return {
-            "total_products": 150,
-            "average_price": 899.99,
-            "price_range": {"min": 699.99, "max": 1299.99},
-            "price_comparison": {
-                "amazon": {"avg_price": 899.99, "count": 50},
-                "bestbuy": {"avg_price": 899.99, "count": 50},
-                "walmart": {"avg_price": 899.99, "count": 50}
-            },
-            "market_insights": [
-                "Amazon has the most competitive pricing",
-                "Best Buy offers the best customer service ratings",
-                "Walmart has the fastest shipping options"
-            ]
-        }
+        return await self.analysis.get()
 
     async def start_demo_scraping(self, request: ScrapingRequest) -> ScrapingJob:
         """Start a demo scraping session"""
-        # Create demo job
-        job = ScrapingJob(
-            status="running",
-            target_urls=[str(url) for url in request.urls],
-            target_sites=request.target_sites,
-            max_products=request.max_products
-        )
-
-        # Start scraping in background
-        asyncio.create_task(self.run_scraping_job(job, request))
+        # Create demo job and start scraping it
+        job = await self.create_job(request)
+        await self.submit_job(job, request)
 
         return job
 
+    def get_metrics(self) -> Dict[str, Any]:
+        """Collect runtime counters from the scraping stack"""
+        return {
+            "fetch_engines": fetch_stats.snapshot(),
+            "browser_pool": get_browser_pool().stats(),
+            "interception": interception_stats.snapshot(),
+            "rate_limits": get_rate_limiter().snapshot(),
+            "extraction": extraction_stats.snapshot(),
+            "validation": validation_stats.snapshot(),
+            "llm_client": get_llm_client().snapshot(),
+            "llm_cache": get_llm_cache().stats(),
+            "html_pruning": pruning_stats.snapshot(),
+            "analysis_cache": self.analysis.stats(),
+            "product_matching": self.matcher.stats(),
+            "price_index": self.product_store.price_index.stats(),
+            "alerts": self.alerts.stats()
+        }
+
     async def cleanup(self):
         """Cleanup resources"""
         # Cancel active jobs
         for task in self.active_jobs.values():
             task.cancel()
 
-        # Cleanup scrapers
+        # Cleanup scrapers and the shared browser pool they borrow from
         for scraper in self.scrapers.values():
             await scraper.cleanup()
+        await close_browser_pool()
+        await close_http_engine()
+        await close_llm_cache()
+        await close_llm_client()
+        await self.job_store.close()
+        await self.analysis.close()
+        await self.alerts.close()
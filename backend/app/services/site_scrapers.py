@@ -1,325 +1,525 @@
 import asyncio
 import logging
-import random
-import time
-from typing import List, Dict, Any, Optional
-from playwright.async_api import async_playwright, Browser, Page
+import os
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from urllib.parse import urljoin
+from playwright.async_api import Page
+from selectolax.parser import HTMLParser
 import re
 
+from .browser_pool import BrowserPool, get_browser_pool
+from .fetch_engines import (
+    HttpFetchEngine, fetch_stats, get_http_engine, looks_blocked, parse_listing_html
+)
+from .interception import InterceptionProfile, install_interception
+from .rate_limiter import DomainRateLimiter, get_rate_limiter
+
 logger = logging.getLogger(__name__)
 
+# Runs every field selector for every product card in a single round trip.
+# Each field maps to [selector, attribute]; a null attribute reads textContent.
+# With includeHtml the card markup is returned too, for the LLM fallback.
+BATCH_EXTRACT_SCRIPT = """
+    ({itemSelector, fields, limit, includeHtml}) => {
+        const items = Array.from(document.querySelectorAll(itemSelector)).slice(0, limit);
+        return items.map((item) => {
+            const record = {};
+            for (const [field, [selector, attribute]] of Object.entries(fields)) {
+                const node = item.querySelector(selector);
+                if (!node) {
+                    record[field] = null;
+                } else if (attribute) {
+                    record[field] = node.getAttribute(attribute);
+                } else {
+                    record[field] = node.textContent;
+                }
+            }
+            if (includeHtml) {
+                record._html = item.outerHTML;
+            }
+            return record;
+        });
+    }
+"""
 
-class BaseScraper:
-    """Base scraper class with common functionality"""
 
-    def __init__(self):
-        self.browser: Optional[Browser] = None
-        self.page: Optional[Page] = None
-        self.user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        ]
-
-    async def setup_browser(self):
-        """Setup Playwright browser with anti-detection measures"""
-        if not self.browser:
-            playwright = await async_playwright().start()
-            self.browser = await playwright.chromium.launch(
-                headless=True,
-                args=[
-                    "--no-sandbox",
-                    "--disable-blink-features=AutomationControlled",
-                    "--disable-dev-shm-usage"
-                ]
-            )
+def parse_price(text: Optional[str]) -> float:
+    """Parse a displayed price such as '$1,199.99' into a float"""
+    return float(re.sub(r'[^\d.]', '', text or "0") or "0")
 
-    async def create_page(self) -> Page:
-        """Create a new page with anti-bot measures"""
-        await self.setup_browser()
 
-        self.page = await self.browser.new_page()
+def parse_rating(text: Optional[str]) -> Optional[float]:
+    """Parse the first number of a rating label such as '4.5 out of 5 stars'"""
+    match = re.search(r'(\d+\.?\d*)', text or "0")
+    return float(match.group(1)) if match else None
 
-        # Set random user agent
-        user_agent = random.choice(self.user_agents)
-        await self.page.set_extra_http_headers({"User-Agent": user_agent})
 
-        # Hide automation indicators
-        await self.page.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined,
-            });
-        """)
+def parse_review_count(text: Optional[str]) -> int:
+    """Parse a review count label such as '1,250'"""
+    match = re.search(r'(\d+)', (text or "0").replace(',', ''))
+    return int(match.group(1)) if match else 0
+
+
+def absolute_url(href: Optional[str], base_url: str) -> str:
+    """Resolve a site-relative product link against the site root"""
+    if href and not href.startswith('http'):
+        return f"{base_url}{href}"
+    return href or ""
+
+
+class ListingPage:
+    """One fetched page of search results and the products extracted from it.
+
+    Statically fetched pages also keep their parsed HTML tree.
+    """
+
+    def __init__(self, url: str, engine: str, tree: Optional[HTMLParser] = None,
+                 products: Optional[List[Dict[str, Any]]] = None,
+                 next_url: Optional[str] = None):
+        self.url = url
+        self.engine = engine
+        self.tree = tree
+        self.products = products or []
+        self.next_url = next_url
+
+
+class CrawlState:
+    """State shared by the fetch and extract stages of one pagination crawl"""
+
+    def __init__(self):
+        # Set once the static engine failed; later pages go straight to the browser
+        self.render_only = False
+        # Keep each card's markup on its record for the LLM fallback
+        self.include_html = False
+
 
-        return self.page
+class BaseScraper:
+    """Base scraper class with common functionality"""
 
-    async def random_delay(self, min_delay: float = 1.0, max_delay: float = 3.0):
-        """Add random delay to mimic human behavior"""
-        delay = random.uniform(min_delay, max_delay)
-        await asyncio.sleep(delay)
+    site = "generic"
+    base_url = ""
+    # CSS selector matching one product card on a listing page
+    product_selector = ""
+    # Selector whose presence marks the product grid as loaded; defaults to
+    # the product card selector
+    ready_selector: Optional[str] = None
+    # Link to the next page of results
+    next_page_selector: Optional[str] = None
+    # Upper bound on cards read from one rendered page
+    page_size_limit = 100
+    # Product field -> (selector inside the card, attribute or None for text)
+    field_selectors: Dict[str, Tuple[str, Optional[str]]] = {}
+    # Fields the listing page does not expose, with the value to report
+    static_fields: Dict[str, Any] = {"availability": "In Stock"}
+    # Site rule: listing cards are only present after client-side rendering
+    requires_js = False
+    # Requests the browser is allowed to make while rendering a listing page
+    interception_profile = InterceptionProfile()
+
+    def __init__(self, pool: Optional[BrowserPool] = None, extraction_mode: Optional[str] = None,
+                 http_engine: Optional[HttpFetchEngine] = None,
+                 rate_limiter: Optional[DomainRateLimiter] = None):
+        self._pool = pool
+        self._http_engine = http_engine
+        self._rate_limiter = rate_limiter
+        # "batch" extracts a whole page in one evaluate call, "element" walks
+        # each card with individual element handle queries
+        self.extraction_mode = extraction_mode or os.getenv(
+            "SCRAPER_EXTRACTION_MODE", "batch")
+        self.use_http_engine = os.getenv("SCRAPER_HTTP_ENGINE", "1") != "0"
+        self.block_resources = os.getenv("SCRAPER_BLOCK_RESOURCES", "1") != "0"
+        # Milliseconds to wait for the product grid after navigation
+        self.ready_timeout = int(os.getenv("SCRAPER_READY_TIMEOUT_MS", "15000"))
+        self.max_pages = int(os.getenv("SCRAPER_MAX_PAGES", "20"))
+        # Listing pages fetched ahead of the one being extracted
+        self.prefetch_pages = int(os.getenv("SCRAPER_PREFETCH_PAGES", "1"))
+        # Milliseconds to wait for more cards after scrolling a rendered page; 0 skips the scroll
+        self.lazy_load_timeout = int(os.getenv("SCRAPER_LAZY_LOAD_TIMEOUT_MS", "2000"))
+
+    @property
+    def pool(self) -> BrowserPool:
+        """Browser pool shared by every scraper in the process"""
+        if self._pool is None:
+            self._pool = get_browser_pool()
+        return self._pool
+
+    @property
+    def http_engine(self) -> HttpFetchEngine:
+        """HTTP fetch engine shared by every scraper in the process"""
+        if self._http_engine is None:
+            self._http_engine = get_http_engine()
+        return self._http_engine
+
+    @property
+    def rate_limiter(self) -> DomainRateLimiter:
+        """Per-domain politeness limiter shared by every scraper in the process"""
+        if self._rate_limiter is None:
+            self._rate_limiter = get_rate_limiter()
+        return self._rate_limiter
+
+    @asynccontextmanager
+    async def create_page(self) -> AsyncIterator[Page]:
+        """Borrow a page from the pooled browser context for this site"""
+        async with self.pool.page(self.site) as page:
+            if self.block_resources:
+                await install_interception(page, self.site, self.interception_profile)
+            yield page
+
+    async def wait_until_ready(self, page: Page) -> bool:
+        """Wait for the site's product grid instead of network idle"""
+        try:
+            await page.wait_for_selector(
+                self.ready_selector or self.product_selector,
+                state="attached",
+                timeout=self.ready_timeout
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"{self.site} product grid not ready: {e}")
+            return False
 
     async def human_like_scroll(self, page: Page):
-        """Scroll like a human user"""
+        """Scroll to the bottom and wait for lazily loaded cards, if any"""
+        count = await page.evaluate(
+            "(selector) => document.querySelectorAll(selector).length",
+            self.product_selector
+        )
         await page.evaluate("""
             window.scrollTo({
                 top: document.body.scrollHeight,
                 behavior: 'smooth'
             });
         """)
-        await self.random_delay(2.0, 4.0)
-
-    async def cleanup(self):
-        """Cleanup browser resources"""
-        if self.page:
-            await self.page.close()
-        if self.browser:
-            await self.browser.close()
-
-
-class AmazonScraper(BaseScraper):
-    """Amazon-specific scraper"""
-
-    async def scrape_products(self, url: str, max_products: int = 100, use_ai_parsing: bool = True) -> List[Dict[str, Any]]:
-        """Scrape products from Amazon"""
         try:
-            page = await self.create_page()
-
-            # Navigate to URL
-            await page.goto(url, wait_until="networkidle")
-            await self.random_delay()
-
-            # Handle cookie consent if present
-            try:
-                await page.click('[data-cel-widget="sp-cc-accept"]', timeout=5000)
-            except:
-                pass
+            await page.wait_for_function(
+                "([selector, count]) => document.querySelectorAll(selector).length > count",
+                arg=[self.product_selector, count],
+                timeout=self.lazy_load_timeout
+            )
+        except Exception:
+            pass
 
-            products = []
-            product_elements = await page.query_selector_all('[data-component-type="s-search-result"]')
+    async def prepare_page(self, page: Page):
+        """Site-specific page preparation run after navigation"""
 
-            for i, element in enumerate(product_elements[:max_products]):
-                try:
-                    product_data = await self._extract_product_data(element, page)
-                    if product_data:
-                        products.append(product_data)
+    async def scrape_products(self, url: str, max_products: int = 100, use_ai_parsing: bool = True) -> List[Dict[str, Any]]:
+        """Scrape products from a listing page and the pages after it.
+
+        A producer task fetches and extracts listing pages and follows the
+        next-page link while this coroutine collects the previous page, so
+        page N+1 is already in flight while page N is processed. Crawling stops as
+        soon as ``max_products`` unique products have been collected.
+        """
+        products: List[Dict[str, Any]] = []
+        seen_urls = set()
+        crawl = CrawlState()
+        crawl.include_html = use_ai_parsing
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.prefetch_pages)
+        producer = asyncio.create_task(self._produce_listings(url, queue, crawl))
 
+        try:
+            while len(products) < max_products:
+                listing = await queue.get()
+                if listing is None:
+                    break
+
+                page_products = await self.extract_listing(
+                    listing, max_products - len(products), crawl)
+                new_products = 0
+                for product in page_products:
+                    key = product["url"] or product["name"]
+                    if key in seen_urls:
+                        continue
+                    seen_urls.add(key)
+                    products.append(product)
+                    new_products += 1
                     if len(products) >= max_products:
                         break
 
-                except Exception as e:
-                    logger.error(f"Error extracting product {i}: {e}")
-                    continue
-
-            logger.info(f"Scraped {len(products)} products from Amazon")
-            return products
+                if new_products == 0:
+                    # An empty or fully repeated page means the results ran out
+                    break
 
         except Exception as e:
-            logger.error(f"Amazon scraping failed: {e}")
-            return []
+            logger.error(f"{self.site} scraping failed: {e}")
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
 
-    async def _extract_product_data(self, element, page) -> Optional[Dict[str, Any]]:
-        """Extract product data from Amazon product element"""
-        try:
-            # Extract basic information
-            name_elem = await element.query_selector('h2 a span')
-            name = await name_elem.text_content() if name_elem else "Unknown Product"
-
-            # Extract price
-            price_elem = await element.query_selector('.a-price-whole')
-            price_text = await price_elem.text_content() if price_elem else "0"
-            price = float(re.sub(r'[^\d.]', '', price_text) or "0")
-
-            # Extract rating
-            rating_elem = await element.query_selector('.a-icon-alt')
-            rating_text = await rating_elem.text_content() if rating_elem else "0"
-            rating_match = re.search(r'(\d+\.?\d*)', rating_text)
-            rating = float(rating_match.group(1)) if rating_match else None
-
-            # Extract review count
-            reviews_elem = await element.query_selector('a[href*="customerReviews"] span')
-            reviews_text = await reviews_elem.text_content() if reviews_elem else "0"
-            reviews_match = re.search(r'(\d+)', reviews_text.replace(',', ''))
-            review_count = int(reviews_match.group(1)) if reviews_match else 0
-
-            # Extract image URL
-            img_elem = await element.query_selector('img.s-image')
-            image_url = await img_elem.get_attribute('src') if img_elem else None
-
-            # Extract product URL
-            link_elem = await element.query_selector('h2 a')
-            product_url = await link_elem.get_attribute('href') if link_elem else ""
-            if product_url and not product_url.startswith('http'):
-                product_url = f"https://www.amazon.com{product_url}"
-
-            return {
-                "name": name.strip(),
-                "price": price,
-                "rating": rating,
-                "review_count": review_count,
-                "image_url": image_url,
-                "url": product_url,
-                "competitor": "amazon",
-                "availability": "In Stock"  # Default assumption
-            }
+        logger.info(f"Scraped {len(products)} products from {self.site}")
+        return products
 
+    async def _produce_listings(self, url: str, queue: asyncio.Queue, crawl: CrawlState):
+        """Fetch listing pages in order until there is no next page"""
+        try:
+            page_url: Optional[str] = url
+            page_number = 1
+            while page_url and page_number <= self.max_pages:
+                listing = await self.fetch_listing(page_url, crawl)
+                await queue.put(listing)
+                page_url = listing.next_url
+                page_number += 1
         except Exception as e:
-            logger.error(f"Error extracting Amazon product data: {e}")
+            logger.error(f"Fetching {self.site} listing pages failed: {e}")
+        # Not sent when cancelled: the consumer is gone and a full queue would block forever
+        await queue.put(None)
+
+    async def fetch_listing(self, url: str, crawl: Optional[CrawlState] = None) -> ListingPage:
+        """Fetch and extract one listing page, statically when the site rule allows it.
+
+        Static pages whose cards cannot be parsed are re-fetched in the
+        browser, so the next-page link followed is the rendered one, and
+        later pages of the same crawl skip the static attempt.
+        """
+        crawl = crawl or CrawlState()
+        if self.use_http_engine and not self.requires_js and not crawl.render_only:
+            listing = await self._fetch_static(url)
+            if listing is not None and self._parse_static(listing, crawl.include_html):
+                return listing
+            crawl.render_only = True
+        return await self._fetch_rendered(url, include_html=crawl.include_html)
+
+    def _parse_static(self, listing: ListingPage, include_html: bool = False) -> bool:
+        """Extract the cards of a static page; False when none could be parsed"""
+        raw_records = parse_listing_html(
+            listing.tree, self.product_selector, self.field_selectors, self.page_size_limit,
+            include_html=include_html)
+        if any(raw.get("name") and raw.get("price") for raw in raw_records):
+            listing.products = self.normalize_records(raw_records)
+            return True
+        fetch_stats.record_fallback(listing.engine, self.site, "parse")
+        return False
+
+    async def extract_listing(self, listing: ListingPage, limit: int,
+                              crawl: Optional[CrawlState] = None) -> List[Dict[str, Any]]:
+        """Product dicts of a fetched listing page, at most ``limit``"""
+        return listing.products[:limit]
+
+    def next_page_url(self, current_url: str, href: Optional[str]) -> Optional[str]:
+        """Resolve the discovered next-page link, if there is one"""
+        if not href:
             return None
+        next_url = urljoin(current_url, href)
+        return None if next_url == current_url else next_url
 
+    async def _fetch_static(self, url: str) -> Optional[ListingPage]:
+        """Fetch a listing page without a browser.
 
-class BestBuyScraper(BaseScraper):
-    """Best Buy-specific scraper"""
-
-    async def scrape_products(self, url: str, max_products: int = 100, use_ai_parsing: bool = True) -> List[Dict[str, Any]]:
-        """Scrape products from Best Buy"""
+        Returns None when the browser has to take over.
+        """
+        engine = self.http_engine.name
         try:
-            page = await self.create_page()
-
-            # Navigate to URL
-            await page.goto(url, wait_until="networkidle")
-            await self.random_delay()
+            async with self.rate_limiter.request(url) as permit:
+                result = await self.http_engine.fetch(url)
+                permit.report(result.status, blocked=result.blocked)
+        except Exception as e:
+            logger.warning(f"Static fetch of {url} failed: {e}")
+            fetch_stats.record_fallback(engine, self.site, "error")
+            return None
 
-            products = []
-            product_elements = await page.query_selector_all('.shop-sku-list-item')
+        if result.blocked:
+            fetch_stats.record_fallback(engine, self.site, "blocked")
+            return None
 
-            for i, element in enumerate(product_elements[:max_products]):
-                try:
-                    product_data = await self._extract_product_data(element, page)
-                    if product_data:
-                        products.append(product_data)
+        tree = HTMLParser(result.html)
+        next_link = tree.css_first(self.next_page_selector) if self.next_page_selector else None
+        next_href = next_link.attributes.get("href") if next_link is not None else None
+        return ListingPage(url, engine, tree=tree,
+                           next_url=self.next_page_url(result.url, next_href))
 
-                    if len(products) >= max_products:
-                        break
+    async def _fetch_rendered(self, url: str, include_html: bool = False) -> ListingPage:
+        """Render a listing page in a pooled browser page and extract it"""
+        try:
+            async with self.rate_limiter.request(url) as permit, self.create_page() as page:
+                # Navigate to URL and wait only for the product grid
+                response = await page.goto(url, wait_until="domcontentloaded")
+                ready = await self.wait_until_ready(page)
+                status = response.status if response else None
+                # Only inspect the markup for a challenge page when the grid never showed up
+                blocked = not ready and looks_blocked(status, await page.content())
+                permit.report(status, blocked=blocked)
+                await self.prepare_page(page)
+                if ready and self.lazy_load_timeout > 0:
+                    await self.human_like_scroll(page)
+
+                if self.extraction_mode == "batch":
+                    products = await self.extract_products(page, self.page_size_limit, include_html)
+                else:
+                    products = await self._extract_products_by_element(
+                        page, self.page_size_limit, include_html)
+
+                next_href = None
+                if self.next_page_selector:
+                    next_href = await page.evaluate(
+                        "(selector) => { const link = document.querySelector(selector);"
+                        " return link ? link.getAttribute('href') : null; }",
+                        self.next_page_selector
+                    )
+                next_url = self.next_page_url(page.url, next_href)
+        except Exception:
+            fetch_stats.record_request("browser", False)
+            raise
+
+        fetch_stats.record_request("browser", True)
+        return ListingPage(url, "browser", products=products, next_url=next_url)
+
+    async def extract_products(self, page: Page, max_products: int,
+                               include_html: bool = False) -> List[Dict[str, Any]]:
+        """Extract every product card on the page with a single evaluate call"""
+        raw_records = await page.evaluate(BATCH_EXTRACT_SCRIPT, {
+            "itemSelector": self.product_selector,
+            "fields": {field: list(spec) for field, spec in self.field_selectors.items()},
+            "limit": max_products,
+            "includeHtml": include_html
+        })
+        return self.normalize_records(raw_records)
+
+    def normalize_records(self, raw_records: List[Dict[str, Optional[str]]]) -> List[Dict[str, Any]]:
+        """Turn raw field strings into product dicts in one pass.
+
+        A card's markup captured for the LLM fallback is carried as ``_html``.
+        """
+        has_reviews = "review_count" in self.field_selectors
+        products = []
+        for i, raw in enumerate(raw_records):
+            try:
+                product = {
+                    "name": (raw.get("name") or "Unknown Product").strip(),
+                    "price": parse_price(raw.get("price")),
+                    "rating": parse_rating(raw.get("rating")),
+                    "review_count": parse_review_count(raw.get("review_count")) if has_reviews else 0,
+                    "image_url": raw.get("image_url"),
+                    "url": absolute_url(raw.get("url"), self.base_url),
+                    "competitor": self.site,
+                    **self.static_fields
+                }
+                if raw.get("_html"):
+                    product["_html"] = raw["_html"]
+                products.append(product)
+            except Exception as e:
+                logger.error(f"Error parsing {self.site} product {i}: {e}")
+        return products
+
+    async def _extract_products_by_element(self, page: Page, max_products: int,
+                                           include_html: bool = False) -> List[Dict[str, Any]]:
+        """Extract products card by card through element handles"""
+        products = []
+        product_elements = await page.query_selector_all(self.product_selector)
+
+        for i, element in enumerate(product_elements[:max_products]):
+            try:
+                product_data = await self._extract_product_data(element, page, include_html)
+                if product_data:
+                    products.append(product_data)
 
-                except Exception as e:
-                    logger.error(f"Error extracting Best Buy product {i}: {e}")
-                    continue
+                if len(products) >= max_products:
+                    break
 
-            logger.info(f"Scraped {len(products)} products from Best Buy")
-            return products
+            except Exception as e:
+                logger.error(f"Error extracting {self.site} product {i}: {e}")
+                continue
 
-        except Exception as e:
-            logger.error(f"Best Buy scraping failed: {e}")
-            return []
+        return products
 
-    async def _extract_product_data(self, element, page) -> Optional[Dict[str, Any]]:
-        """Extract product data from Best Buy product element"""
+    async def _extract_product_data(self, element, page,
+                                    include_html: bool = False) -> Optional[Dict[str, Any]]:
+        """Extract product data from a single product element"""
         try:
-            # Extract name
-            name_elem = await element.query_selector('h4 a')
-            name = await name_elem.text_content() if name_elem else "Unknown Product"
-
-            # Extract price
-            price_elem = await element.query_selector('.priceView-customer-price span')
-            price_text = await price_elem.text_content() if price_elem else "0"
-            price = float(re.sub(r'[^\d.]', '', price_text) or "0")
-
-            # Extract rating
-            rating_elem = await element.query_selector('.c-ratings-reviews-v2 .c-ratings-reviews-v2__reviews')
-            rating_text = await rating_elem.text_content() if rating_elem else "0"
-            rating_match = re.search(r'(\d+\.?\d*)', rating_text)
-            rating = float(rating_match.group(1)) if rating_match else None
-
-            # Extract image URL
-            img_elem = await element.query_selector('img')
-            image_url = await img_elem.get_attribute('src') if img_elem else None
-
-            # Extract product URL
-            link_elem = await element.query_selector('h4 a')
-            product_url = await link_elem.get_attribute('href') if link_elem else ""
-            if product_url and not product_url.startswith('http'):
-                product_url = f"https://www.bestbuy.com{product_url}"
-
-            return {
-                "name": name.strip(),
-                "price": price,
-                "rating": rating,
-                "review_count": 0,  # Best Buy doesn't show review count in list
-                "image_url": image_url,
-                "url": product_url,
-                "competitor": "bestbuy",
-                "availability": "In Stock"
-            }
+            raw = {}
+            for field, (selector, attribute) in self.field_selectors.items():
+                node = await element.query_selector(selector)
+                if not node:
+                    raw[field] = None
+                elif attribute:
+                    raw[field] = await node.get_attribute(attribute)
+                else:
+                    raw[field] = await node.text_content()
+            if include_html:
+                raw["_html"] = await element.evaluate("(card) => card.outerHTML")
+            products = self.normalize_records([raw])
+            return products[0] if products else None
 
         except Exception as e:
-            logger.error(f"Error extracting Best Buy product data: {e}")
+            logger.error(f"Error extracting {self.site} product data: {e}")
             return None
 
+    async def cleanup(self):
+        """Release scraper resources (browsers are owned by the shared pool)"""
+        self._pool = None
 
-class WalmartScraper(BaseScraper):
-    """Walmart-specific scraper"""
-
-    async def scrape_products(self, url: str, max_products: int = 100, use_ai_parsing: bool = True) -> List[Dict[str, Any]]:
-        """Scrape products from Walmart"""
-        try:
-            page = await self.create_page()
-
-            # Navigate to URL
-            await page.goto(url, wait_until="networkidle")
-            await self.random_delay()
 
-            products = []
-            product_elements = await page.query_selector_all('[data-item-id]')
+class AmazonScraper(BaseScraper):
+    """Amazon-specific scraper"""
 
-            for i, element in enumerate(product_elements[:max_products]):
-                try:
-                    product_data = await self._extract_product_data(element, page)
-                    if product_data:
-                        products.append(product_data)
+    site = "amazon"
+    base_url = "https://www.amazon.com"
+    product_selector = '[data-component-type="s-search-result"]'
+    ready_selector = '[data-component-type="s-search-result"]'
+    next_page_selector = 'a.s-pagination-next'
+    field_selectors = {
+        "name": ('h2 a span', None),
+        "price": ('.a-price-whole', None),
+        "rating": ('.a-icon-alt', None),
+        "review_count": ('a[href*="customerReviews"] span', None),
+        "image_url": ('img.s-image', 'src'),
+        "url": ('h2 a', 'href')
+    }
+    static_fields = {"availability": "In Stock"}  # Default assumption
+    interception_profile = InterceptionProfile(
+        allow_domains=["amazon.com", "media-amazon.com", "ssl-images-amazon.com"]
+    )
+
+    async def prepare_page(self, page: Page):
+        """Handle cookie consent if present"""
+        try:
+            consent = await page.query_selector('[data-cel-widget="sp-cc-accept"]')
+            if consent:
+                await consent.click(timeout=2000)
+        except Exception:
+            pass
 
-                    if len(products) >= max_products:
-                        break
 
-                except Exception as e:
-                    logger.error(f"Error extracting Walmart product {i}: {e}")
-                    continue
+class BestBuyScraper(BaseScraper):
+    """Best Buy-specific scraper"""
 
-            logger.info(f"Scraped {len(products)} products from Walmart")
-            return products
+    site = "bestbuy"
+    base_url = "https://www.bestbuy.com"
+    product_selector = '.shop-sku-list-item'
+    # Prices are hydrated after the cards themselves
+    ready_selector = '.shop-sku-list-item .priceView-customer-price'
+    next_page_selector = 'a.sku-list-page-next'
+    # Best Buy doesn't show review count in list
+    field_selectors = {
+        "name": ('h4 a', None),
+        "price": ('.priceView-customer-price span', None),
+        "rating": ('.c-ratings-reviews-v2 .c-ratings-reviews-v2__reviews', None),
+        "image_url": ('img', 'src'),
+        "url": ('h4 a', 'href')
+    }
+    # Search results are rendered client-side
+    requires_js = True
+    interception_profile = InterceptionProfile(
+        allow_domains=["bestbuy.com", "bbystatic.com"]
+    )
 
-        except Exception as e:
-            logger.error(f"Walmart scraping failed: {e}")
-            return []
 
-    async def _extract_product_data(self, element, page) -> Optional[Dict[str, Any]]:
-        """Extract product data from Walmart product element"""
-        try:
-            # Extract name
-            name_elem = await element.query_selector('[data-testid="product-title"]')
-            name = await name_elem.text_content() if name_elem else "Unknown Product"
-
-            # Extract price
-            price_elem = await element.query_selector('[data-testid="price-wrap"] span')
-            price_text = await price_elem.text_content() if price_elem else "0"
-            price = float(re.sub(r'[^\d.]', '', price_text) or "0")
-
-            # Extract rating
-            rating_elem = await element.query_selector('[data-testid="rating"]')
-            rating_text = await rating_elem.text_content() if rating_elem else "0"
-            rating_match = re.search(r'(\d+\.?\d*)', rating_text)
-            rating = float(rating_match.group(1)) if rating_match else None
-
-            # Extract image URL
-            img_elem = await element.query_selector('img')
-            image_url = await img_elem.get_attribute('src') if img_elem else None
-
-            # Extract product URL
-            link_elem = await element.query_selector('a')
-            product_url = await link_elem.get_attribute('href') if link_elem else ""
-            if product_url and not product_url.startswith('http'):
-                product_url = f"https://www.walmart.com{product_url}"
-
-            return {
-                "name": name.strip(),
-                "price": price,
-                "rating": rating,
-                "review_count": 0,  # Walmart doesn't show review count in list
-                "image_url": image_url,
-                "url": product_url,
-                "competitor": "walmart",
-                "availability": "In Stock"
-            }
+class WalmartScraper(BaseScraper):
+    """Walmart-specific scraper"""
 
-        except Exception as e:
-            logger.error(f"Error extracting Walmart product data: {e}")
-            return None
+    site = "walmart"
+    base_url = "https://www.walmart.com"
+    product_selector = '[data-item-id]'
+    ready_selector = '[data-item-id] [data-testid="price-wrap"]'
+    next_page_selector = 'a[data-testid="NextPage"], a[aria-label="Next Page"]'
+    # Walmart doesn't show review count in list
+    field_selectors = {
+        "name": ('[data-testid="product-title"]', None),
+        "price": ('[data-testid="price-wrap"] span', None),
+        "rating": ('[data-testid="rating"]', None),
+        "image_url": ('img', 'src'),
+        "url": ('a', 'href')
+    }
+    interception_profile = InterceptionProfile(
+        allow_domains=["walmart.com", "walmartimages.com"]
+    )
@@ -1,14 +1,19 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
 from contextlib import asynccontextmanager
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
 from app.database import init_db, get_db
 from app.models import Product, ScrapingJob
-from app.schemas import ScrapingRequest, ProductResponse, JobStatus
+from app.schemas import (
+    ScrapingRequest, ProductResponse, ProductPage, ExportFormat, JobStatus,
+    HistoryGranularity, PriceHistoryResponse, AlertConfig
+)
+from app.services.product_catalog import InvalidCursorError, ProductFilters
 from app.services.scraper_service import ScraperService
 from app.services.ai_service import AIService
 
@@ -30,6 +35,7 @@ async def lifespan(app: FastAPI):
 
     # Initialize services
     scraper_service = ScraperService()
+    await scraper_service.warm_up()
     ai_service = AIService()
 
     print("🚀 AI Scraper API started successfully!")
@@ -80,25 +86,35 @@ async def health_check():
     }
 
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Runtime metrics of the scraping stack"""
+    return scraper_service.get_metrics()
+
+
+@app.get("/api/metrics/rate-limits")
+async def get_rate_limit_metrics():
+    """Current request rate, concurrency and backoff state per retailer domain"""
+    return scraper_service.get_metrics()["rate_limits"]
+
+
 @app.post("/api/scrape/start", response_model=JobStatus)
-async def start_scraping(request: ScrapingRequest, background_tasks: BackgroundTasks):
+async def start_scraping(request: ScrapingRequest):
     """Start a new scraping job"""
     try:
         # Create scraping job
-        job = ScrapingJob(
-            status="running",
-            target_urls=request.urls,
-            target_sites=request.target_sites
-        )
+        job = await scraper_service.create_job(request)
 
-        # Add to background tasks
-        background_tasks.add_task(
-            scraper_service.run_scraping_job, job, request)
+        # Queue the job's URLs for the workers
+        await scraper_service.submit_job(job, request)
 
         return JobStatus(
-            job_id=str(job.id),
-            status="started",
-            message="Scraping job started successfully"
+            job_id=job.job_id,
+            status=job.status,
+            message="Scraping job started successfully",
+            progress=job.progress,
+            products_scraped=job.products_scraped,
+            started_at=job.started_at
         )
     except Exception as e:
         raise HTTPException(
@@ -115,27 +131,70 @@ async def get_scraping_status(job_id: str):
 
         return JobStatus(
             job_id=job_id,
-            status=job.status,
-            message=f"Job {job.status}",
-            progress=job.progress if hasattr(job, 'progress') else None
+            status=job["status"],
+            message=f"Job {job['status']}",
+            progress=job.get("progress"),
+            products_scraped=job.get("products_scraped"),
+            started_at=job.get("started_at"),
+            completed_at=job.get("completed_at"),
+            error_message=job.get("error_message")
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to get job status: {str(e)}")
 
 
-@app.get("/api/products", response_model=list[ProductResponse])
-async def get_products(limit: int = 100, offset: int = 0):
-    """Get scraped products with pagination"""
+@app.get("/api/products", response_model=ProductPage)
+async def get_products(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    competitor: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    name_prefix: Optional[str] = None,
+    format: ExportFormat = ExportFormat.JSON
+):
+    """Get scraped products, most recently added first, with cursor pagination.
+
+    ``format=ndjson`` or ``format=csv`` streams every matching product
+    instead of one page.
+    """
+    filters = ProductFilters(competitor, min_price, max_price, name_prefix)
+    if format != ExportFormat.JSON:
+        media_type = "text/csv" if format == ExportFormat.CSV else "application/x-ndjson"
+        return StreamingResponse(
+            scraper_service.export_products(filters, format.value),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename=products.{format.value}"})
     try:
-        async with get_db() as db:
-            products = await scraper_service.get_products(db, limit, offset)
-            return [ProductResponse.from_orm(product) for product in products]
+        products, next_cursor = await scraper_service.get_products(filters, cursor, limit)
+        return ProductPage(
+            items=[ProductResponse.model_validate(product) for product in products],
+            next_cursor=next_cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to fetch products: {str(e)}")
 
 
+@app.get("/api/products/{product_id}/history", response_model=PriceHistoryResponse)
+async def get_price_history(
+    product_id: int,
+    days: int = Query(90, ge=1, le=3650),
+    granularity: HistoryGranularity = HistoryGranularity.DAY
+):
+    """Get the price history of a product as raw changes or hourly/daily OHLC"""
+    try:
+        points = await scraper_service.get_price_history(product_id, days, granularity.value)
+        return PriceHistoryResponse(product_id=product_id, granularity=granularity, points=points)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to fetch price history: {str(e)}")
+
+
 @app.get("/api/analysis/competitive")
 async def get_competitive_analysis():
     """Get competitive analysis of scraped data"""
@@ -143,7 +202,7 @@ async def get_competitive_analysis():
         analysis = await scraper_service.generate_competitive_analysis()
         return {
             "analysis": analysis,
-            "generated_at": "2024-01-01T00:00:00Z"  # TODO: Add actual timestamp
+            "generated_at": analysis["generated_at"]
         }
     except Exception as e:
         raise HTTPException(
@@ -151,14 +210,20 @@ async def get_competitive_analysis():
 
 
 @app.post("/api/alerts/configure")
-async def configure_alerts(price_threshold: float, email: str = None):
-    """Configure price drop alerts"""
+async def configure_alerts(config: AlertConfig):
+    """Configure a price drop alert, emailed when a matching listing falls to the threshold"""
+    if not config.email:
+        raise HTTPException(status_code=400, detail="An email is required for price alerts")
     try:
-        # TODO: Implement alert configuration
+        alert_id = await scraper_service.configure_alert(config)
         return {
             "message": "Alerts configured successfully",
-            "price_threshold": price_threshold,
-            "email": email
+            "alert_id": alert_id,
+            "price_threshold": config.price_threshold,
+            "email": config.email,
+            "product_name": config.product_name,
+            "competitor": config.competitor,
+            "is_active": config.is_active
         }
     except Exception as e:
         raise HTTPException(
@@ -187,7 +252,7 @@ async def start_demo():
 
         return {
             "message": "Demo scraping started",
-            "job_id": str(job.id),
+            "job_id": job.job_id,
             "demo_urls": demo_urls
         }
     except Exception as e:
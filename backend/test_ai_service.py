@@ -0,0 +1,83 @@
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+from app.services.ai_service import AIService
+from app.services.llm_cache import LLMCache
+from app.services.llm_client import LLMClient
+
+
+class ToolCallingCompletions:
+    """Answers batched requests from a per-card table, via a tool call"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.requests = []
+
+    async def create(self, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        indices = [int(i) for i in re.findall(r"Card (\d+):", prompt)]
+        self.requests.append(indices)
+        products = [self.answers[i].pop(0) if isinstance(self.answers[i], list) else self.answers[i]
+                    for i in indices]
+        call = SimpleNamespace(function=SimpleNamespace(
+            name="record_products", arguments=json.dumps({"products": products})))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=None, tool_calls=[call]))],
+            usage=SimpleNamespace(total_tokens=100 * len(indices))
+        )
+
+
+def card(i):
+    return f"<div class='s-result-item'><h2>Phone {i}</h2><span class='a-price'>${i}99.00</span></div>"
+
+
+def test_batch_extraction_maps_cards_and_retries_only_failures(monkeypatch):
+    """One request covers many cards; only the card failing validation is re-sent"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    answers = {i: {"index": i, "name": f"Phone {i + 1}", "price": float(f"{i + 1}99")} for i in range(5)}
+    answers[2] = [{"index": 2, "name": "Phone 3", "price": None},
+                  {"index": 2, "name": "Phone 3", "price": 399.0}]
+    completions = ToolCallingCompletions(answers)
+    service = AIService(cache=LLMCache(), llm=LLMClient(
+        client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+
+    cards = [card(i) for i in range(1, 6)]
+    results = asyncio.run(service.extract_products_batch(cards, "amazon"))
+
+    assert completions.requests == [[0, 1, 2, 3, 4], [2]]
+    assert [r["price"] for r in results] == [199.0, 299.0, 399.0, 499.0, 599.0]
+    assert results[0]["name"] == "Phone 1"
+    assert all(r["confidence_score"] > 0 for r in results)
+
+    # A second scrape of the same page is served from the cache
+    again = asyncio.run(service.extract_products_batch(cards, "amazon"))
+    assert again == results
+    assert len(completions.requests) == 2
+
+
+def test_batches_respect_token_budget(monkeypatch):
+    """Cards are split across requests once the prompt budget is reached"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    completions = ToolCallingCompletions(
+        {i: {"index": i, "name": f"Phone {i + 1}", "price": 1.0} for i in range(6)})
+    service = AIService(cache=LLMCache(), llm=LLMClient(
+        client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+    service.batch_token_budget = 40
+
+    results = asyncio.run(service.extract_products_batch([card(i) for i in range(1, 7)], "amazon"))
+
+    assert all(results)
+    assert len(completions.requests) > 1
+    assert sorted(i for request in completions.requests for i in request) == list(range(6))
+
+
+def test_parse_ai_response_handles_prose_and_fences(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    service = AIService(cache=LLMCache(), llm=LLMClient(client=SimpleNamespace()))
+
+    assert service._parse_ai_response('```json\n{"name": "TV", "price": 5}\n```') == {"name": "TV", "price": 5}
+    assert service._parse_ai_response('Result: {"name": "TV {55in}"} - note {unused}') == {"name": "TV {55in}"}
+    assert service._parse_ai_response('Insights: ["a", "b"]') == ["a", "b"]
+    assert service._parse_ai_response("no json here") == {}
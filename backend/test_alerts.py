@@ -0,0 +1,143 @@
+import asyncio
+import socketserver
+import threading
+from email import message_from_string
+
+from app.services.alerts import AlertEngine, AlertIndex, AlertOutbox, IndexedAlert, SMTPSender
+
+
+class StubSMTP:
+    """Local SMTP server keeping the messages it receives"""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self):
+                stub.connections += 1
+                self.reply("220 stub")
+                while True:
+                    line = self.rfile.readline().decode().rstrip("\r\n")
+                    command = line[:4].upper()
+                    if not line or command == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    if command == "DATA":
+                        self.reply("354 go ahead")
+                        lines = []
+                        for raw in iter(self.rfile.readline, b""):
+                            data = raw.decode().rstrip("\r\n")
+                            if data == ".":
+                                break
+                            lines.append(data[1:] if data.startswith("..") else data)
+                        stub.messages.append(message_from_string("\n".join(lines)))
+                    self.reply("250 ok")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def sender(self):
+        return SMTPSender("127.0.0.1", self.server.server_address[1])
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FlakySender:
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("smtp down")
+        self.sent.extend(messages)
+
+
+def change(name, price, previous_price=None, product_id=1):
+    return {"product_id": product_id, "name": name, "url": f"https://example.com/{product_id}",
+            "price": price, "previous_price": previous_price}
+
+
+def test_index_matches_only_crossed_thresholds():
+    index = AlertIndex()
+    index.add(IndexedAlert(1, "a@example.com", 500.0, "Samsung Crystal TV"))
+    index.add(IndexedAlert(2, "b@example.com", 400.0, "samsung tv", competitor="amazon"))
+    index.add(IndexedAlert(3, "c@example.com", 450.0))
+    index.add(IndexedAlert(4, "d@example.com", 900.0, "iphone 15"))
+
+    name = "Samsung 65\" Crystal UHD TV"
+    assert {alert.id for alert in index.matches("amazon", name, 420.0, 520.0)} == {1, 3}
+    assert {alert.id for alert in index.matches("amazon", name, 380.0, 420.0)} == {2}
+    assert {alert.id for alert in index.matches("walmart", name, 380.0, 420.0)} == set()
+    # A new listing crosses every threshold at or above its price
+    assert {alert.id for alert in index.matches("walmart", name, 450.0)} == {1, 3}
+
+
+def test_index_remove_and_replace():
+    index = AlertIndex()
+    index.add(IndexedAlert(1, "a@example.com", 500.0, "tv"))
+    index.add(IndexedAlert(1, "a@example.com", 300.0, "tv"))
+    assert [alert.id for alert in index.matches("amazon", "tv", 400.0)] == []
+
+    index.remove(1)
+    assert len(index) == 0
+    assert index.matches("amazon", "tv", 100.0) == []
+
+
+def test_outbox_batches_one_email_per_recipient_over_smtp():
+    stub = StubSMTP()
+    outbox = AlertOutbox(sender=stub.sender(), flush_interval=0.01)
+    engine = AlertEngine(session_factory=None, outbox=outbox, refresh_interval=3600)
+    engine._loaded_at = float("inf")
+    engine.index.add(IndexedAlert(1, "a@example.com", 500.0, "tv"))
+    engine.index.add(IndexedAlert(2, "a@example.com", 1000.0, "laptop"))
+    engine.index.add(IndexedAlert(3, "b@example.com", 500.0, "tv"))
+
+    async def run():
+        triggered = await engine.on_price_changes("amazon", [
+            change("4K TV", 450.0, 550.0, 1), change("Gaming Laptop", 950.0, None, 2),
+            change("Phone", 100.0, 200.0, 3)])
+        await outbox._worker
+        return triggered
+
+    try:
+        assert asyncio.run(run()) == 3
+    finally:
+        stub.close()
+
+    assert stub.connections == 1
+    by_recipient = {message["To"]: message for message in stub.messages}
+    assert sorted(by_recipient) == ["a@example.com", "b@example.com"]
+    assert by_recipient["a@example.com"]["Subject"] == "Price alerts: 2 products below your thresholds"
+    assert "Gaming Laptop at amazon is now 950.00" in by_recipient["a@example.com"].get_payload()
+    assert engine.stats()["outbox"] == {"queued": 3, "sent": 3, "emails": 2, "failed": 0}
+
+
+def test_outbox_retries_failed_delivery(monkeypatch):
+    async def no_sleep(delay):
+        pass
+
+    sender = FlakySender(failures=1)
+    outbox = AlertOutbox(sender=sender, flush_interval=0)
+    engine = AlertEngine(session_factory=None, outbox=outbox)
+    engine._loaded_at = float("inf")
+    engine.index.add(IndexedAlert(1, "a@example.com", 500.0, "tv"))
+
+    async def run():
+        await engine.on_price_changes("amazon", [change("TV", 450.0, 550.0)])
+        monkeypatch.setattr("app.services.alerts.asyncio.sleep", no_sleep)
+        await outbox.close()
+
+    asyncio.run(run())
+
+    assert len(sender.sent) == 1
+    assert outbox.counters["sent"] == 1
@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.analysis import (
+    CompetitiveAnalysis, best_deals_query, build_analysis, competitor_stats_query, price_trends_query
+)
+from app.services.local_redis import LocalRedis
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_aggregates_run_in_the_database():
+    """Competitor stats are read from the summary table; deals and trends are grouped queries"""
+    stats = compile_sql(competitor_stats_query())
+    assert "FROM competitor_price_stats" in stats
+    assert "GROUP BY" not in stats
+
+    deals = compile_sql(best_deals_query(10))
+    assert "WITH matched AS" in deals
+    assert "GROUP BY products.canonical_id" in deals
+    assert "HAVING count(DISTINCT products.competitor) >=" in deals
+    assert "LIMIT" in deals
+
+    trends = compile_sql(price_trends_query(datetime(2024, 1, 1, tzinfo=timezone.utc)))
+    assert "FROM price_rollups" in trends
+    assert "GROUP BY price_rollups.source, price_rollups.bucket_start" in trends
+
+
+def test_build_analysis_combines_rows():
+    analysis = build_analysis(
+        [
+            {"competitor": "amazon", "count": 3, "observations": 6, "price_sum": 600.0,
+             "min_price": 50.0, "max_price": 150.0, "ewma_price": 95.0},
+            {"competitor": "walmart", "count": 1, "observations": 4, "price_sum": 240.0,
+             "min_price": 60.0, "max_price": 60.0, "ewma_price": 60.0}
+        ],
+        [{"id": 7, "canonical_id": "c-1", "name": "TV", "competitor": "walmart", "price": 60.0, "url": "https://w/1",
+          "median_price": 80.0, "competitors": 2, "discount": 0.25}],
+        [
+            {"source": "amazon", "day": datetime(2024, 1, 1), "avg_price": 100.0, "observations": 3},
+            {"source": "amazon", "day": datetime(2024, 1, 2), "avg_price": 90.0, "observations": 3}
+        ],
+        window_days=30
+    )
+
+    assert analysis["total_products"] == 4
+    assert analysis["average_price"] == 84.0
+    assert analysis["price_comparison"]["amazon"]["avg_price"] == 100.0
+    assert analysis["price_range"] == {"min": 50.0, "max": 150.0}
+    assert analysis["best_deals"][0]["discount_pct"] == 25.0
+    assert analysis["trends"]["competitors"]["amazon"]["change_pct"] == -10.0
+    assert any(insight.startswith("walmart has the lowest recent average price") for insight in analysis["market_insights"])
+
+
+class CountingAnalysis(CompetitiveAnalysis):
+    def __init__(self, **kwargs):
+        super().__init__(client=LocalRedis(), **kwargs)
+        self.computed = 0
+
+    async def compute(self):
+        self.computed += 1
+        await asyncio.sleep(0.01)
+        return {"run": self.computed, "generated_at": "now"}
+
+
+def test_analysis_is_cached_until_new_products_land():
+    """Concurrent readers share one compute; a saved batch invalidates it"""
+    analysis = CountingAnalysis(cache_ttl=60)
+
+    async def run():
+        first = await asyncio.gather(*(analysis.get() for _ in range(5)))
+        cached = await analysis.get()
+        await analysis.invalidate()
+        return first, cached, await analysis.get()
+
+    first, cached, refreshed = asyncio.run(run())
+
+    assert {result["run"] for result in first} == {1}
+    assert cached["run"] == 1
+    assert refreshed["run"] == 2
+    assert analysis.stats()["hits"] == 5
+
+
+def test_version_bump_from_another_process_invalidates():
+    """A worker saving products through the shared Redis makes the API recompute"""
+    client = LocalRedis()
+    api = CountingAnalysis(cache_ttl=60)
+    api.client = client
+    worker = CountingAnalysis(cache_ttl=60)
+    worker.client = client
+
+    async def run():
+        await api.get()
+        await worker.invalidate()
+        return await api.get()
+
+    assert asyncio.run(run())["run"] == 2
@@ -0,0 +1,92 @@
+import asyncio
+
+from app.services.browser_pool import BrowserPool
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+        self.pages = []
+
+    async def add_init_script(self, script):
+        pass
+
+    async def new_page(self):
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    async def new_context(self, **kwargs):
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+
+def make_pool(**kwargs):
+    pool = BrowserPool(size=2, **kwargs)
+    pool._browsers = [FakeBrowser(), FakeBrowser()]
+    return pool
+
+
+def test_context_reused_per_site_and_recycled():
+    """Pages of one site share a context until it is recycled"""
+    async def run():
+        pool = make_pool(max_pages=4, max_navigations=2)
+        contexts = []
+        for _ in range(3):
+            async with pool.page("amazon") as page:
+                contexts.append(pool._contexts["amazon"].context)
+            assert page.closed
+
+        assert contexts[0] is contexts[1]
+        assert contexts[2] is not contexts[0]
+        assert contexts[0].closed
+        assert pool.stats()["contexts_recycled"] == 1
+
+    asyncio.run(run())
+
+
+def test_sites_spread_across_browsers():
+    """Each site gets its own context on the least loaded browser"""
+    async def run():
+        pool = make_pool(max_pages=4)
+        async with pool.page("amazon"), pool.page("bestbuy"):
+            indexes = {lease.browser_index for lease in pool._contexts.values()}
+            assert indexes == {0, 1}
+            assert pool.stats()["pages_in_use"] == 2
+
+    asyncio.run(run())
+
+
+def test_page_slots_are_bounded():
+    """No more than max_pages pages are open at once"""
+    async def run():
+        pool = make_pool(max_pages=2)
+        peak = 0
+
+        async def borrow():
+            nonlocal peak
+            async with pool.page("walmart"):
+                peak = max(peak, pool.stats()["pages_in_use"])
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(borrow() for _ in range(6)))
+        assert peak == 2
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+from app.services.html_pruner import prune_html
+
+HEAD = "<head><title>Search</title>" + "<script>window.data = {};</script>" * 200 + "<style>.a{color:red}</style></head>"
+
+AMAZON_PAGE = f"""<html>{HEAD}<body>
+<nav><a href="/">Amazon</a></nav>
+<div data-component-type="s-search-result" data-asin="B0CHX1W1XY" class="sg-col-4-of-24 s-result-item">
+  <div class="a-section a-spacing-base"><svg viewBox="0 0 10 10"><path d="M0 0"/></svg>
+    <h2 class="a-size-mini"><a class="a-link-normal s-link-style" href="/dp/B0CHX1W1XY"><span>Apple iPhone 15 (128 GB)</span></a></h2>
+    <span class="a-price" data-a-size="xl"><span class="a-offscreen">$799.00</span></span>
+    <span class="a-icon-alt">4.5 out of 5 stars</span>
+    <div class="a-row"><span class="a-declarative"></span></div>
+    <img class="s-image" src="https://m.media-amazon.com/images/I/iphone.jpg" srcset="a 1x, b 2x">
+  </div>
+</div>
+<div class="s-widget"><span class="a-price">$1.00</span></div>
+<footer>Conditions of Use</footer>
+</body></html>"""
+
+
+def test_prune_keeps_product_cards_and_drops_markup():
+    """The price survives even when the page head is far longer than the budget"""
+    result = prune_html(AMAZON_PAGE, "amazon", max_chars=2000)
+
+    assert "$799.00" in result.html
+    assert "Apple iPhone 15 (128 GB)" in result.html
+    assert "4.5 out of 5 stars" in result.html
+    assert 'href="/dp/B0CHX1W1XY"' in result.html
+    assert 'src="https://m.media-amazon.com/images/I/iphone.jpg"' in result.html
+    for noise in ("<script", "<style", "<svg", "class=", "srcset", "Conditions of Use", "$1.00"):
+        assert noise not in result.html
+    assert result.subtrees == 1
+    assert result.tokens_saved > 0.9 * result.original_tokens
+
+
+def test_prune_falls_back_to_relevant_nodes_and_respects_budget():
+    """Without a card selector, nodes named like price/title fields are kept"""
+    cards = "".join(
+        f"<div class='tile'><p class='promo'>Free shipping</p>"
+        f"<div id='title-{i}'>Phone {i}</div><div class='product-price'>${i}.99</div></div>"
+        for i in range(50))
+    result = prune_html(f"<html><body>{cards}</body></html>", "unknown", max_chars=300)
+
+    assert "Phone 0" in result.html
+    assert "$0.99" in result.html
+    assert "Free shipping" not in result.html
+    assert len(result.html) <= 300
+    assert "Phone 49" not in result.html
+
+
+def test_oversized_card_is_cut_at_element_boundaries():
+    """A single card over the budget loses whole trailing elements, never half a tag"""
+    specs = "".join(f"<li title='Spec {i} &amp; more'>Spec value {i}</li>" for i in range(40))
+    card = (f"<div data-component-type='s-search-result'><h2>Phone X</h2>"
+            f"<span class='a-price'>$99.99</span><ul>{specs}</ul></div>")
+    result = prune_html(f"<html><body>{card}</body></html>", "amazon", max_chars=400)
+
+    assert len(result.html) <= 400
+    assert result.html.startswith("<div><h2>Phone X</h2>")
+    assert result.html.endswith("</li></ul></div>")
+    assert result.html.count("<li") == result.html.count("</li>") > 0
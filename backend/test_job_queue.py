@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+import app.celery_app as celery_module
+from app.celery_app import celery_app, scrape_unit
+from app.schemas import ScrapingRequest
+from app.services.job_store import JobStore
+from app.services.local_redis import LocalRedis
+from app.services.scraper_service import ScraperService
+from test_scraper_service import FakeProductStore, FakeScraper
+
+
+class FlakyScraper(FakeScraper):
+    """Fails the first ``failures`` calls"""
+
+    def __init__(self, base_url, failures):
+        super().__init__(base_url)
+        self.failures = failures
+
+    async def scrape_products(self, url, max_products=100, use_ai_parsing=True):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("blocked")
+        return await super().scrape_products(url, max_products, use_ai_parsing)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    service = ScraperService()
+    service.queue_mode = "celery"
+    service.product_store = FakeProductStore()
+    service.scrapers = {
+        "amazon": FakeScraper("https://www.amazon.com"),
+        "bestbuy": FlakyScraper("https://www.bestbuy.com", failures=5),
+        "walmart": FakeScraper("https://www.walmart.com")
+    }
+    service.queued = []
+    service._enqueue_unit = lambda session, request: service.queued.append(
+        (request.priority.value, session.site, session.url))
+    return service
+
+
+def test_units_are_queued_and_settled_by_workers(service):
+    """Every URL is a queued unit; the last worker to settle one completes the job"""
+    request = ScrapingRequest(
+        urls=[
+            "https://www.amazon.com/s?k=tv",
+            "https://www.bestbuy.com/site/searchpage.jsp?st=tv",
+            "https://www.walmart.com/search?q=tv"
+        ],
+        target_sites=["amazon", "bestbuy"],
+        priority="high"
+    )
+
+    async def run():
+        client = LocalRedis()
+        service.job_store = JobStore(client=client, flush_interval=0)
+        # A second process (the API) reading the same Redis
+        api_store = JobStore(client=client, flush_interval=0)
+
+        job = await service.create_job(request)
+        await service.submit_job(job, request)
+        queued = await api_store.get(job.job_id)
+
+        amazon_url, bestbuy_url = (url for _, _, url in service.queued)
+        await service.run_unit(job.job_id, "amazon", amazon_url)
+        # A redelivered unit is not counted twice
+        await service.run_unit(job.job_id, "amazon", amazon_url)
+        with pytest.raises(RuntimeError):
+            await service.run_unit(job.job_id, "bestbuy", bestbuy_url, final_attempt=False)
+        retrying = await api_store.get(job.job_id)
+        await service.run_unit(job.job_id, "bestbuy", bestbuy_url, attempt=2, final_attempt=True)
+        return queued, retrying, await api_store.get(job.job_id)
+
+    queued, retrying, done = asyncio.run(run())
+
+    assert [(queue, site) for queue, site, _ in service.queued] == [
+        ("high", "amazon"), ("high", "bestbuy")]
+    assert queued["status"] == "running"
+    assert queued["progress"] == pytest.approx(1 / 3)
+    assert queued["urls"]["https://www.walmart.com/search?q=tv"]["status"] == "skipped"
+
+    assert retrying["progress"] == pytest.approx(2 / 3)
+    assert retrying["products_scraped"] == 1
+    assert retrying["urls"]["https://www.bestbuy.com/site/searchpage.jsp?st=tv"]["status"] == "retrying"
+
+    assert done["status"] == "completed"
+    assert done["progress"] == 1.0
+    assert done["products_scraped"] == 1
+    assert done["urls"]["https://www.bestbuy.com/site/searchpage.jsp?st=tv"]["status"] == "failed"
+    assert "blocked" in done["error_message"]
+
+
+def test_units_not_sent_to_the_broker_are_failed(service):
+    """A dispatch that breaks partway still lets the job complete"""
+    request = ScrapingRequest(
+        urls=["https://www.amazon.com/s?k=tv", "https://www.walmart.com/search?q=tv"],
+        target_sites=["amazon", "walmart"]
+    )
+
+    def enqueue(session, request):
+        if session.site == "walmart":
+            raise ConnectionError("broker unreachable")
+        service.queued.append((request.priority.value, session.site, session.url))
+
+    service._enqueue_unit = enqueue
+
+    async def run():
+        service.job_store = JobStore(client=LocalRedis(), flush_interval=0)
+        job = await service.create_job(request)
+        await service.submit_job(job, request)
+        dispatched = await service.job_store.get(job.job_id)
+        await service.run_unit(job.job_id, "amazon", "https://www.amazon.com/s?k=tv")
+        return dispatched, await service.job_store.get(job.job_id)
+
+    dispatched, done = asyncio.run(run())
+
+    assert dispatched["status"] == "running"
+    assert dispatched["urls"]["https://www.walmart.com/search?q=tv"]["status"] == "failed"
+    assert done["status"] == "completed"
+    assert "broker unreachable" in done["error_message"]
+
+
+def test_scrape_unit_task_retries_until_final_attempt(monkeypatch):
+    """The worker task retries failures and tells the last attempt it is final"""
+    calls = []
+
+    class StubService:
+        async def run_unit(self, job_id, site, url, **kwargs):
+            calls.append(kwargs)
+            if not kwargs["final_attempt"]:
+                raise RuntimeError("timeout")
+            return 3
+
+        async def flush_alerts(self):
+            pass
+
+    monkeypatch.setattr(celery_module, "_worker_service", StubService())
+    result = scrape_unit.apply(kwargs={"job_id": "job-1", "site": "amazon", "url": "https://www.amazon.com/s?k=tv"})
+
+    assert result.get() == 3
+    assert [call["attempt"] for call in calls] == list(range(1, scrape_unit.max_retries + 2))
+    assert celery_app.conf.task_acks_late
+    assert celery_app.conf.broker_transport_options["visibility_timeout"] > celery_app.conf.task_time_limit
+    assert celery_app.conf.broker_transport_options["queue_order_strategy"] == "priority"
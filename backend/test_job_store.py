@@ -0,0 +1,95 @@
+import asyncio
+
+from app.services.job_store import JobStore
+from app.services.local_redis import LocalRedis
+
+
+def test_progress_updates_are_coalesced():
+    """Many updates between flushes cost a single write"""
+    async def run():
+        client = LocalRedis()
+        writes = []
+        store = JobStore(client=client, flush_interval=0.05)
+        original = store._write
+
+        async def counting_write(job_id, fields):
+            writes.append(dict(fields))
+            await original(job_id, fields)
+
+        store._write = counting_write
+        await store.create("job-1", status="pending", progress=0.0)
+        for i in range(1, 101):
+            store.update("job-1", status="running", progress=i / 100)
+
+        # Served from memory before anything is flushed
+        assert (await store.get("job-1"))["progress"] == 1.0
+        await asyncio.sleep(0.1)
+        return writes, await client.hgetall("scrape:job:job-1")
+
+    writes, raw = asyncio.run(run())
+    assert len(writes) == 2
+    assert raw["progress"] == "1.0"
+    assert raw["status"] == '"running"'
+
+
+def test_finished_job_is_visible_to_other_processes():
+    """A final state is written through and readable from another store"""
+    async def run():
+        client = LocalRedis()
+        worker = JobStore(client=client, flush_interval=60)
+        api = JobStore(client=client, flush_interval=60)
+
+        await worker.create("job-2", status="pending", progress=0.0)
+        worker.update("job-2", status="running", progress=0.5, products_scraped=3)
+        # The coalesced update has not been flushed yet
+        assert (await api.get("job-2"))["status"] == "pending"
+
+        await worker.finish("job-2", status="completed", progress=1.0)
+        await worker.close()
+        return await api.get("job-2"), await api.get("missing")
+
+    job, missing = asyncio.run(run())
+    assert job["status"] == "completed"
+    assert job["products_scraped"] == 3
+    assert missing is None
+
+
+class ScriptingRedis:
+    """Redis client recording the scripts it runs; they are answered by the LocalRedis twin"""
+
+    def __init__(self):
+        self.local = LocalRedis()
+        self.scripts = []
+        self.calls = []
+
+    def __getattr__(self, name):
+        return getattr(self.local, name)
+
+    def register_script(self, script):
+        self.scripts.append(script)
+        twin = JobStore(client=self.local)
+
+        async def run(keys, args):
+            self.calls.append((keys, args))
+            return await twin._complete_unit_locally(keys, args)
+        return run
+
+
+def test_unit_completion_is_counted_once_in_one_script():
+    """Marker and counters go through a single script call; a repeat only updates the state"""
+    async def run():
+        client = ScriptingRedis()
+        store = JobStore(client=client, flush_interval=60)
+        await store.start_units("job-3", {"a": {"status": "queued"}, "b": {"status": "queued"}})
+
+        first = await store.complete_unit("job-3", "a", {"status": "completed"}, products=4)
+        repeat = await store.complete_unit("job-3", "a", {"status": "completed", "attempt": 2}, products=4)
+        last = await store.complete_unit("job-3", "b", {"status": "failed"})
+        return client, (first, repeat, last), await client.hgetall("scrape:job:job-3")
+
+    client, results, raw = asyncio.run(run())
+    assert results == (False, False, True)
+    assert "HSETNX" in client.scripts[0] and len(client.calls) == 3
+    assert raw["units_done"] == "2"
+    assert raw["products_scraped"] == "4"
+    assert '"attempt": 2' in raw["unit:a"]
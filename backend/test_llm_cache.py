@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.ai_service import AIService
+from app.services.llm_cache import LLMCache, RedisCacheTier, SQLiteCacheTier, cache_key
+from app.services.llm_client import LLMClient
+from app.services.local_redis import LocalRedis
+
+
+class FakeCompletions:
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))],
+            usage=SimpleNamespace(total_tokens=420)
+        )
+
+
+def fake_ai_service(monkeypatch, cache):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    completions = FakeCompletions('{"name": "iPhone 15", "price": 799.0}')
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    service = AIService(cache=cache, llm=LLMClient(client=client))
+    return service, completions
+
+
+def test_repeated_cards_are_served_from_cache(monkeypatch, tmp_path):
+    """Equivalent markup costs one API call, even from a fresh process"""
+    path = str(tmp_path / "cache.sqlite3")
+    html = "<div class='card'>\n  <h2>iPhone 15</h2>  <!-- ad slot -->\n<span>$799</span></div>"
+    reformatted = "<div class='card'><h2>iPhone 15</h2> <span>$799</span></div>"
+
+    async def run():
+        cache = LLMCache(persistent=SQLiteCacheTier(path, ttl=60, max_bytes=10_000))
+        service, completions = fake_ai_service(monkeypatch, cache)
+        first = await service.extract_product_data(html, "amazon")
+        second = await service.extract_product_data(reformatted, "amazon")
+        await service.extract_product_data(html, "walmart")
+        await cache.close()
+
+        # A new process only has the persistent tier
+        restarted = LLMCache(persistent=SQLiteCacheTier(path, ttl=60, max_bytes=10_000))
+        service2, completions2 = fake_ai_service(monkeypatch, restarted)
+        third = await service2.extract_product_data(html, "amazon")
+        await restarted.close()
+        return first, second, third, completions.calls, completions2.calls, cache.stats(), restarted.stats()
+
+    first, second, third, calls, calls_after_restart, stats, restarted_stats = asyncio.run(run())
+    assert first == second == third
+    assert first["name"] == "iPhone 15"
+    assert calls == 2  # one per site
+    assert calls_after_restart == 0
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["tokens_saved"] == 420
+    assert restarted_stats["persistent_hits"] == 1
+
+
+def test_persistent_tiers_evict_by_size():
+    """Both persistent tiers drop the least recently used entries when full"""
+    async def run(tier):
+        cache = LLMCache(persistent=tier, max_entries=1, ttl=60)
+        for i in range(4):
+            await cache.set(cache_key("gpt-4", "1", "amazon", f"<b>{i}</b>"), {"data": {"i": i}})
+        # Memory keeps only the newest entry, so older ones come from the tier
+        results = [await cache.get(cache_key("gpt-4", "1", "amazon", f"<b>{i}</b>")) for i in range(4)]
+        return results, cache.stats()
+
+    value_size = len('{"data": {"i": 0}}')
+    for tier in (SQLiteCacheTier(":memory:", ttl=60, max_bytes=value_size * 2),
+                 RedisCacheTier(LocalRedis(), ttl=60, max_entries=2)):
+        results, stats = asyncio.run(run(tier))
+        assert [r and r["data"]["i"] for r in results] == [None, None, 2, 3]
+        assert stats["evictions"] >= 2
+
+
+def test_sqlite_writes_keep_a_running_total_instead_of_scanning():
+    """The size cap is enforced from the stored total, which stays equal to the real one"""
+    tier = SQLiteCacheTier(":memory:", ttl=60, max_bytes=250)
+
+    async def run():
+        for i in range(20):
+            await tier.set(f"key-{i % 12}", "x" * (10 + i))
+        statements = []
+        tier._conn.set_trace_callback(statements.append)
+        await tier.set("key-last", "y" * 40)
+        tier._conn.set_trace_callback(None)
+        stored = tier._conn.execute("SELECT value FROM llm_cache_meta").fetchone()[0]
+        actual = tier._conn.execute("SELECT SUM(size) FROM llm_cache").fetchone()[0]
+        return statements, stored, actual
+
+    statements, stored, actual = asyncio.run(run())
+    assert stored == actual <= 250
+    assert not any("SUM(size)" in statement and "WHERE" not in statement for statement in statements)
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+from app.services.llm_client import CircuitBreaker, CircuitOpenError, LLMClient
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": '{"name": "TV", "price": 5}'}}],
+    "usage": {"prompt_tokens": 30, "completion_tokens": 12, "total_tokens": 42}
+}
+
+
+class StubOpenAI:
+    """Local HTTP server answering chat completions with a scripted status sequence"""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                stub.requests += 1
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                body = json.dumps(COMPLETION if status == 200 else {"error": {"message": "busy"}}).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def client(self, **kwargs):
+        openai_client = openai.AsyncOpenAI(api_key="test-key", base_url=self.base_url, max_retries=0)
+        return LLMClient(client=openai_client, base_delay=0.01, **kwargs)
+
+    def close(self):
+        self.server.shutdown()
+
+
+def chat(client):
+    return client.chat_completion(
+        model="gpt-4", messages=[{"role": "user", "content": "extract"}], max_tokens=50)
+
+
+def test_retries_rate_limits_and_server_errors():
+    """429 and 5xx responses are retried; usage and latency are recorded"""
+    stub = StubOpenAI([429, 503])
+    try:
+        client = stub.client(max_retries=3)
+        response = asyncio.run(chat(client))
+    finally:
+        stub.close()
+
+    assert response.choices[0].message.content == '{"name": "TV", "price": 5}'
+    assert stub.requests == 3
+    metrics = client.snapshot()
+    assert metrics["retries"] == 2
+    assert metrics["rate_limited"] == 1
+    assert metrics["successes"] == 1
+    assert metrics["prompt_tokens"] == 30
+    assert metrics["completion_tokens"] == 12
+    assert metrics["latency_p50"] is not None
+    assert metrics["circuit_state"] == "closed"
+
+
+def test_client_errors_are_not_retried():
+    stub = StubOpenAI([400])
+    try:
+        client = stub.client(max_retries=3)
+        with pytest.raises(openai.BadRequestError):
+            asyncio.run(chat(client))
+    finally:
+        stub.close()
+    assert stub.requests == 1
+
+
+def test_circuit_opens_and_recovers():
+    """Repeated failures open the circuit, which rejects calls until a trial succeeds"""
+    stub = StubOpenAI([500] * 4)
+    breaker = CircuitBreaker(failure_threshold=4, reset_timeout=0.2)
+    try:
+        client = stub.client(max_retries=1, breaker=breaker)
+
+        async def run():
+            for _ in range(2):
+                with pytest.raises(openai.InternalServerError):
+                    await chat(client)
+            assert not client.available
+            with pytest.raises(CircuitOpenError):
+                await chat(client)
+            requests_while_open = stub.requests
+            await asyncio.sleep(0.25)
+            await chat(client)
+            return requests_while_open
+
+        requests_while_open = asyncio.run(run())
+    finally:
+        stub.close()
+
+    assert requests_while_open == 4
+    assert stub.requests == 5
+    assert client.snapshot()["circuit_rejections"] == 1
+    assert client.snapshot()["circuit_opened"] == 1
+    assert client.available
+
+
+def test_cancelled_trial_call_frees_the_half_open_slot():
+    """A trial cancelled mid-request (e.g. by a task timeout) lets the next call through"""
+    class HangingCompletions:
+        def __init__(self):
+            self.calls = 0
+
+        async def create(self, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                await asyncio.Event().wait()
+            return type("Response", (), {"usage": None})()
+
+    completions = HangingCompletions()
+    fake = type("Client", (), {"chat": type("Chat", (), {"completions": completions})()})()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    client = LLMClient(client=fake, breaker=breaker)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(chat(client), timeout=0.05)
+        assert not breaker.trial_in_flight
+        await chat(client)
+
+    asyncio.run(run())
+    assert completions.calls == 2
+    assert breaker.state == "closed"
+
+
+def test_concurrency_is_capped():
+    """No more than max_concurrency requests are in flight at once"""
+    class SlowCompletions:
+        def __init__(self):
+            self.running = 0
+            self.peak = 0
+
+        async def create(self, **kwargs):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            await asyncio.sleep(0.01)
+            self.running -= 1
+            return type("Response", (), {"usage": None})()
+
+    completions = SlowCompletions()
+    fake = type("Client", (), {"chat": type("Chat", (), {"completions": completions})()})()
+    client = LLMClient(client=fake, max_concurrency=2)
+
+    async def run():
+        await asyncio.gather(*(chat(client) for _ in range(6)))
+
+    asyncio.run(run())
+    assert completions.peak == 2
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.product_catalog import (
+    InvalidCursorError, ProductCatalog, ProductFilters, build_products_query, decode_cursor, encode_cursor
+)
+
+NOW = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def product(product_id, minutes_ago=0):
+    return {
+        "id": product_id, "name": f"Item {product_id}", "price": 10.0 + product_id,
+        "original_price": None, "currency": "USD", "competitor": "amazon",
+        "url": f"https://www.amazon.com/dp/{product_id}", "image_url": None, "rating": None,
+        "review_count": None, "availability": None,
+        "scraped_at": NOW - timedelta(minutes=minutes_ago), "confidence_score": 1.0,
+        "canonical_id": None, "metadata": {"asin": str(product_id)}
+    }
+
+
+class FakeResult:
+    def __init__(self, rows, batch_size=2):
+        self.rows = rows
+        self.batch_size = batch_size
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    async def partitions(self):
+        for start in range(0, len(self.rows), self.batch_size):
+            yield self.rows[start:start + self.batch_size]
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return FakeResult(self.rows[:statement._limit])
+
+    async def stream(self, statement):
+        self.statements.append(statement)
+        return FakeResult(self.rows)
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    cursor = encode_cursor(42)
+    assert decode_cursor(cursor) == 42
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+
+
+def test_query_seeks_past_the_cursor_with_filters():
+    """Keyset predicate on the immutable id instead of OFFSET, plus the filters"""
+    filters = ProductFilters(competitor="amazon", min_price=10, max_price=20, name_prefix="iPhone 15%")
+    sql = compile_sql(build_products_query(filters, encode_cursor(42), 101))
+
+    assert "products.id < " in sql
+    assert "ORDER BY products.id DESC" in sql
+    assert "scraped_at <" not in sql
+    assert "OFFSET" not in sql
+    assert "products.competitor =" in sql
+    assert "products.price >=" in sql and "products.price <=" in sql
+    assert "lower(products.name) LIKE" in sql and "ESCAPE '/'" in sql
+
+
+def test_page_returns_next_cursor_only_when_more_rows_exist():
+    rows = [product(i, minutes_ago=i) for i in range(3)]
+    catalog = ProductCatalog(session_factory=lambda: FakeSession(rows))
+
+    first, next_cursor = asyncio.run(catalog.page(ProductFilters(), limit=2))
+    assert [row["id"] for row in first] == [0, 1]
+    assert decode_cursor(next_cursor) == 1
+
+    last, next_cursor = asyncio.run(catalog.page(ProductFilters(), limit=5))
+    assert len(last) == 3 and next_cursor is None
+
+
+def test_export_streams_csv_in_batches():
+    rows = [product(i) for i in range(5)]
+    session = FakeSession(rows)
+    catalog = ProductCatalog(session_factory=lambda: session, export_batch_size=2)
+
+    async def collect():
+        return [chunk async for chunk in catalog.export(ProductFilters(), "csv")]
+
+    chunks = asyncio.run(collect())
+    lines = "".join(chunks).splitlines()
+
+    assert len(chunks) == 3
+    assert lines[0].startswith("id,name,price")
+    assert len(lines) == 6
+    assert '"{""asin"": ""0""}"' in lines[1]
+    assert session.statements[0].get_execution_options()["yield_per"] == 2
@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.product_matching import (
+    ProductMatcher, extract_model_numbers, normalize_tokens, product_identifiers
+)
+
+
+def test_titles_are_normalized_to_comparable_tokens():
+    assert normalize_tokens("Apple iPhone 15 Pro Max 256GB") == ["apple", "iphone", "15", "pro", "max", "256gb"]
+    assert normalize_tokens("iPhone 15 Pro Max - 256 GB") == ["iphone", "15", "pro", "max", "256gb"]
+    assert "65in" in normalize_tokens('Samsung 65" Class QLED')
+    assert "wh1000xm5" in normalize_tokens("Sony WH-1000XM5")
+
+
+def test_model_numbers_skip_measurements():
+    assert extract_model_numbers("SAMSUNG 65-Inch QLED Q60C (QN65Q60CAFXZA, 2023)") == {"QN65Q60CAFXZA"}
+    assert extract_model_numbers("Apple iPhone 15 Pro Max 256GB") == set()
+    assert product_identifiers({"name": "TV", "metadata": {"upc": "8806 0947"}}) == {"88060947"}
+    assert extract_model_numbers("Replacement Ear Pads for Sony WH-1000XM5") == set()
+
+
+def test_listings_of_the_same_product_share_a_canonical_id():
+    """Reworded titles match; a different storage size does not"""
+    matcher = ProductMatcher()
+    amazon, bestbuy, walmart = matcher.assign([
+        {"name": "Apple iPhone 15 Pro Max 256GB"},
+        {"name": "iPhone 15 Pro Max - 256 GB"},
+        {"name": "Apple iPhone 15 Pro Max, 512GB"}
+    ])
+
+    assert amazon["canonical_id"] == bestbuy["canonical_id"]
+    assert walmart["canonical_id"] != amazon["canonical_id"]
+
+
+def test_model_numbers_match_dissimilar_titles():
+    matcher = ProductMatcher()
+    first = matcher.match({"name": "Sony WH-1000XM5 Headphones"})
+    second = matcher.match({"name": "Sony WH1000XM5 Wireless Noise Canceling Over-Ear Headphones, Black"})
+
+    assert first == second
+    assert matcher.stats()["matched_identifier"] == 1
+
+
+def test_shared_model_number_does_not_merge_storage_variants():
+    matcher = ProductMatcher()
+    small = matcher.match({"name": "Samsung Galaxy S24 Ultra SM-S928U 256GB"})
+    large = matcher.match({"name": "Samsung Galaxy S24 Ultra SM-S928U 512GB"})
+    reworded = matcher.match({"name": "Galaxy S24 Ultra (SM-S928U) 256 GB Unlocked"})
+
+    assert small != large
+    assert reworded == small
+
+
+def test_accessories_do_not_merge_with_the_product_they_fit():
+    matcher = ProductMatcher()
+    headphones = matcher.match({"name": "Sony WH-1000XM5 Wireless Headphones"})
+    pads = matcher.match({"name": "Replacement Ear Pads for Sony WH-1000XM5"})
+    cushions = matcher.match({"name": "Sony WH-1000XM5 Ear Cushions Replacement"})
+
+    assert headphones not in (pads, cushions)
+    assert matcher.stats()["matched_identifier"] == 0
+
+
+def test_canonical_ids_agree_across_processes():
+    """Two matchers that never saw each other derive the same id for the same listing"""
+    assert (ProductMatcher().match({"name": "Samsung Galaxy S24 Ultra SM-S928U"})
+            == ProductMatcher().match({"name": "Samsung Galaxy S24 Ultra SM-S928U"}))
+
+
+def test_lookup_only_scores_bucket_candidates():
+    """Matching a listing compares it with LSH candidates, not the whole catalog"""
+    matcher = ProductMatcher()
+    for i in range(2000):
+        matcher.add_known(f"c-{i}", f"Brand{i} Widget{i} Series{i} Gadget{i} Plus")
+    scored = []
+
+    class CountingDict(dict):
+        def __getitem__(self, key):
+            scored.append(key)
+            return super().__getitem__(key)
+
+    matcher._products = CountingDict(matcher._products)
+    canonical_id = matcher.match({"name": "Brand1234 Widget1234 Series1234 Gadget1234 Plus Black"})
+
+    assert canonical_id == "c-1234"
+    assert len(scored) < 20
+
+
+class StoredListings:
+    """Plays the products table shared by several processes"""
+
+    def __init__(self):
+        self.rows = []
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def store(self, canonical_id, name):
+        self.now += timedelta(seconds=1)
+        self.rows.append(SimpleNamespace(canonical_id=canonical_id, name=name, metadata=None, scraped_at=self.now))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        return SimpleNamespace(scalar_one=lambda: self.now)
+
+    async def stream(self, statement):
+        since = [value for value in statement.compile(dialect=postgresql.dialect()).params.values() if isinstance(value, datetime)]
+        rows = [row for row in self.rows if not since or row.scraped_at >= since[0]]
+
+        async def result():
+            for row in rows:
+                yield row
+        return result()
+
+
+def test_canonical_products_created_by_another_process_are_picked_up():
+    """A worker refreshed after another one stored a new cluster joins it"""
+    listings = StoredListings()
+    first, second = ProductMatcher(refresh_interval=0), ProductMatcher(refresh_interval=0)
+    asyncio.run(first.warm(lambda: listings))
+    asyncio.run(second.warm(lambda: listings))
+
+    name = "Sony WH-1000XM5 Wireless Noise Canceling Headphones Black"
+    listings.store(first.match({"name": name}), name)
+    asyncio.run(second.refresh_if_stale(lambda: listings))
+
+    similar = {"name": "Sony WH-1000XM5 Wireless Noise Canceling Over-Ear Headphones, Black"}
+    assert ProductMatcher().match(similar) != listings.rows[0].canonical_id
+    assert second.match(similar) == listings.rows[0].canonical_id
+    assert second.stats()["refreshed"] == 1
@@ -0,0 +1,286 @@
+import asyncio
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import Values
+
+from app.services.product_store import (
+    ProductStore, build_competitor_stats_upsert, build_product_stats_upsert, build_rollup_upsert,
+    build_upsert, prepare_rows
+)
+
+
+def test_prepare_rows_dedupes_and_skips_missing_urls():
+    """One row per URL, last scrape wins, URL-less listings are dropped"""
+    rows = prepare_rows([
+        {"name": "TV", "price": 499.0, "url": "https://www.walmart.com/ip/1"},
+        {"name": "TV", "price": 479.0, "url": "https://www.walmart.com/ip/1"},
+        {"name": "Radio", "price": 20.0, "url": ""}
+    ], "walmart")
+
+    assert len(rows) == 1
+    assert rows[0]["price"] == 479.0
+    assert rows[0]["competitor"] == "walmart"
+
+
+def test_upsert_is_a_single_multi_row_statement():
+    """The whole chunk is written by one INSERT ... ON CONFLICT DO UPDATE"""
+    rows = prepare_rows([
+        {"name": f"Item {i}", "price": float(i), "url": f"https://www.amazon.com/dp/{i}"}
+        for i in range(3)
+    ], "amazon")
+    sql = str(build_upsert(rows).compile(dialect=postgresql.dialect()))
+
+    assert sql.count("INSERT INTO products") == 1
+    assert "ON CONFLICT (competitor, url) DO UPDATE" in sql
+    assert "price = excluded.price" in sql
+    assert "WHERE products.price IS DISTINCT FROM excluded.price OR" in sql
+    assert "RETURNING products.id, products.url, products.price, (xmax = 0) AS inserted" in sql
+
+
+class StoredRow:
+    def __init__(self, id, price, inserted, url=""):
+        self.id, self.price, self.inserted, self.url = id, price, inserted, url
+
+
+def test_running_stats_are_folded_in_by_upserts():
+    """Per-product and per-competitor statistics update incrementally on conflict"""
+    stored = [StoredRow(1, 10.0, True), StoredRow(2, 30.0, False)]
+
+    product_sql = str(build_product_stats_upsert(stored, "amazon", 0.3).compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (product_id) DO UPDATE" in product_sql
+    assert "observations = (product_price_stats.observations +" in product_sql
+    assert "min_price = least(product_price_stats.min_price, excluded.min_price)" in product_sql
+
+    statement = build_competitor_stats_upsert([10.0, 30.0], 1, "amazon", 0.3)
+    params = statement.compile(dialect=postgresql.dialect()).params
+    assert params["observations"] == 2
+    assert params["price_sum"] == 40.0
+    assert params["ewma_price"] == 20.0
+    assert params["products"] == 1
+    competitor_sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (competitor) DO UPDATE" in competitor_sql
+    assert "greatest(competitor_price_stats.max_price, excluded.max_price)" in competitor_sql
+
+
+def test_rollups_keep_ohlc_per_hour_and_day():
+    sql = str(build_rollup_upsert([StoredRow(1, 10.0, True)], "amazon").compile(dialect=postgresql.dialect()))
+
+    assert sql.count("date_trunc(") == 2
+    assert "ON CONFLICT (product_id, granularity, bucket_start) DO UPDATE" in sql
+    assert "high = greatest(price_rollups.high, excluded.high)" in sql
+    assert "close = excluded.close" in sql
+    assert "open =" not in sql
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class StoredState:
+    def __init__(self, id, url, price, availability=None, competitor="amazon"):
+        self.id, self.url, self.price = id, url, price
+        self.availability, self.competitor = availability, competitor
+
+
+def expected_rows(statement):
+    """The (id, price, availability) rows of a statement joined against VALUES"""
+    for criterion in statement._where_criteria:
+        table = getattr(criterion.right, "table", None)
+        if isinstance(table, Values):
+            return [row for rows in table._data for row in rows]
+    return []
+
+
+class FakeSession:
+    """Plays the products table for the store's lookup, touch and upsert statements"""
+
+    def __init__(self, stored):
+        self.stored = {state.url: state for state in stored}
+        self.next_id = 100
+        self.executed = []
+        self.history = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def begin(self):
+        return self
+
+    async def execute(self, statement, params=None):
+        compiled = statement.compile(dialect=postgresql.dialect())
+        if statement.is_select and expected_rows(statement):
+            self.executed.append("confirm")
+            expected = set(expected_rows(statement))
+            return FakeResult([state for state in self.stored.values()
+                               if (state.id, state.price, state.availability) in expected])
+        if statement.is_select:
+            self.executed.append("lookup")
+            urls = [url for value in compiled.params.values() if isinstance(value, list) for url in value]
+            return FakeResult([state for url, state in self.stored.items() if url in urls])
+        table = statement.table.name
+        self.executed.append(f"{'update' if statement.is_update else 'insert'} {table}")
+        if table == "products" and statement.is_update:
+            expected = set(expected_rows(statement))
+            ids = [state.id for state in self.stored.values()
+                   if (state.id, state.price, state.availability) in expected]
+            return FakeResult([StoredRow(product_id, 0, False) for product_id in ids])
+        if table == "products":
+            rows = []
+            for row in statement._multi_values[0]:
+                url, price = row["url"], row["price"]
+                state = self.stored.get(url)
+                if state is not None and (state.price, state.availability) == (price, row.get("availability")):
+                    # ON CONFLICT ... WHERE skips rows whose price and availability are unchanged
+                    continue
+                inserted = state is None
+                if inserted:
+                    state = self.stored[url] = StoredState(self.next_id, url, price)
+                    self.next_id += 1
+                state.price, state.availability = price, row.get("availability")
+                rows.append(StoredRow(state.id, price, inserted, url))
+            return FakeResult(rows)
+        if table == "price_history":
+            self.history.extend(params)
+        return FakeResult([])
+
+
+def listing(i, price, availability=None):
+    return {"name": f"Item {i}", "price": price, "url": f"https://www.amazon.com/dp/{i}",
+            "availability": availability}
+
+
+def test_only_new_listings_and_price_changes_are_written():
+    """Unchanged listings get a last-seen bump; history only sees changes"""
+    session = FakeSession([StoredState(0, listing(0, 0)["url"], 10.0), StoredState(1, listing(1, 0)["url"], 25.0)])
+    store = ProductStore(session_factory=lambda: session)
+
+    changes = []
+    counts = asyncio.run(store.save_batch(
+        [listing(0, 10.0), listing(1, 20.0), listing(2, 30.0)], "amazon", changes))
+
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1, "skipped": 0}
+    assert sorted(row["product_id"] for row in session.history) == [1, 100]
+    assert sorted((change["name"], change["price"], change["previous_price"]) for change in changes) == [
+        ("Item 1", 20.0, 25.0), ("Item 2", 30.0, None)]
+    assert "update products" in session.executed
+
+
+def test_rescrape_of_unchanged_listings_writes_no_rows():
+    session = FakeSession([StoredState(0, listing(0, 0)["url"], 10.0)])
+    store = ProductStore(session_factory=lambda: session)
+    asyncio.run(store.save_batch([listing(0, 10.0)], "amazon"))
+    session.executed.clear()
+
+    counts = asyncio.run(store.save_batch([listing(0, 10.0)], "amazon"))
+
+    assert counts["unchanged"] == 1
+    assert session.executed == ["confirm"]
+
+
+def test_stale_index_entries_fall_back_to_the_upsert():
+    """A price changed by another process is not mistaken for an unchanged listing"""
+    session = FakeSession([StoredState(0, listing(0, 0)["url"], 12.0)])
+    store = ProductStore(session_factory=lambda: session)
+    store.price_index.remember("amazon", listing(0, 0)["url"], 0, 10.0, None)
+
+    counts = asyncio.run(store.save_batch([listing(0, 10.0)], "amazon"))
+
+    assert counts["updated"] == 1 and counts["unchanged"] == 0
+    assert session.stored[listing(0, 0)["url"]].price == 10.0
+    assert [row["price"] for row in session.history] == [10.0]
+
+
+def test_a_change_saved_by_two_processes_is_recorded_once():
+    """A second store with a stale index sees the locked row and writes nothing"""
+    url = listing(0, 0)["url"]
+    session = FakeSession([StoredState(0, url, 100.0)])
+    stores = [ProductStore(session_factory=lambda: session) for _ in range(2)]
+    for store in stores:
+        store.price_index.remember("amazon", url, 0, 100.0, None)
+
+    changes = [[], []]
+    counts = [asyncio.run(store.save_batch([listing(0, 90.0)], "amazon", found))
+              for store, found in zip(stores, changes)]
+
+    assert counts[0]["updated"] == 1
+    assert counts[1] == {"inserted": 0, "updated": 0, "unchanged": 1, "skipped": 0}
+    assert [row["price"] for row in session.history] == [90.0]
+    assert [change["previous_price"] for change in changes[0]] == [100.0]
+    assert changes[1] == []
+    assert stores[1].price_index.get("amazon", url).price == 90.0
+
+
+def test_touch_only_confirms_listings_whose_availability_still_matches():
+    """Each row of the touch is matched on id, price and availability together"""
+    urls = [listing(i, 0)["url"] for i in range(3)]
+    session = FakeSession([StoredState(0, urls[0], 10.0, "in stock"), StoredState(1, urls[1], 20.0, "in stock"),
+                           StoredState(2, urls[2], 30.0, "out of stock")])
+    store = ProductStore(session_factory=lambda: session)
+    store.price_index.remember("amazon", urls[0], 0, 10.0, "in stock")
+    store.price_index.remember("amazon", urls[1], 1, 20.0, None)
+    store.price_index.remember("amazon", urls[2], 2, 30.0, "out of stock")
+
+    counts = asyncio.run(store.save_batch(
+        [listing(0, 10.0, "in stock"), listing(1, 20.0), listing(2, 30.0, "out of stock")], "amazon"))
+
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 2, "skipped": 0}
+    assert session.stored[urls[1]].availability is None
+    assert store.price_index.get("amazon", urls[1]).availability is None
+
+
+class FailingCommit:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        raise RuntimeError("commit failed")
+
+
+def test_index_is_not_updated_when_the_transaction_rolls_back():
+    """A price that was never committed must not make the next scrape look unchanged"""
+    url = listing(0, 0)["url"]
+    session = FakeSession([StoredState(0, url, 100.0)])
+    session.begin = FailingCommit
+    store = ProductStore(session_factory=lambda: session)
+    store.price_index.remember("amazon", url, 0, 100.0, None)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.save_batch([listing(0, 90.0), listing(1, 20.0)], "amazon"))
+
+    assert store.price_index.get("amazon", url).price == 100.0
+    assert store.price_index.get("amazon", listing(1, 0)["url"]) is None
+
+
+def test_a_recently_seen_price_is_confirmed_against_the_stored_row():
+    """A price another worker moved away and back is not skipped from a stale index"""
+    url = listing(0, 0)["url"]
+    session = FakeSession([StoredState(0, url, 100.0)])
+    first, second = (ProductStore(session_factory=lambda: session) for _ in range(2))
+    asyncio.run(second.save_batch([listing(0, 100.0)], "amazon"))
+
+    asyncio.run(first.save_batch([listing(0, 90.0)], "amazon"))
+    changes = []
+    counts = asyncio.run(second.save_batch([listing(0, 100.0)], "amazon", changes))
+
+    assert counts["updated"] == 1 and counts["unchanged"] == 0
+    assert [row["price"] for row in session.history] == [90.0, 100.0]
+    assert [(change["price"], change["previous_price"]) for change in changes] == [(100.0, 90.0)]
+
+
+def test_competitor_and_product_stats_count_the_same_observations():
+    """Both aggregates take a listing's price once per hour, however often it is scraped"""
+    session = FakeSession([])
+    store = ProductStore(session_factory=lambda: session)
+    for _ in range(3):
+        asyncio.run(store.save_batch([listing(0, 10.0), listing(1, 20.0)], "amazon"))
+
+    assert session.executed.count("insert product_price_stats") == 1
+    assert session.executed.count("insert competitor_price_stats") == 1
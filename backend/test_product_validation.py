@@ -0,0 +1,47 @@
+from app.services.product_validation import canonical_url, score_record, validate_products
+
+
+def test_canonical_url_drops_tracking_and_collapses_amazon_links():
+    assert canonical_url("/Apple-iPhone/dp/B0CHX1W1XY/ref=sr_1_1?keywords=iphone&qid=1",
+                         "https://www.amazon.com") == "https://www.amazon.com/dp/B0CHX1W1XY"
+    assert canonical_url("https://www.bestbuy.com/site/iphone/6525.p?skuId=6525&utm_source=feed#reviews") == \
+        "https://www.bestbuy.com/site/iphone/6525.p?skuId=6525"
+    assert canonical_url("HTTP://WWW.Walmart.com/ip/iphone/1?athbdg=L1600") == "https://www.walmart.com/ip/iphone/1"
+    assert canonical_url("javascript:void(0)") is None
+    assert canonical_url(None) is None
+
+
+def test_validate_products_normalizes_and_reports_rejections():
+    products = [
+        {"name": "  Sponsored Ad - Apple  iPhone 15 ", "price": "$1,199.99", "original_price": 999.0,
+         "url": "https://www.walmart.com/ip/iphone/1?athbdg=L1", "rating": 4.5, "review_count": "1,250",
+         "confidence_score": 0.9},
+        {"name": "Galaxy S24", "price": "£799", "url": "/ip/galaxy/2", "rating": 7.5},
+        {"name": "Unknown Product", "price": 0.0, "url": "", "rating": None},
+        {"name": "Pixel 8", "price": 250000, "url": "https://www.walmart.com/ip/pixel/3"}
+    ]
+
+    report = validate_products(products, "https://www.walmart.com")
+
+    iphone, galaxy = report.valid
+    assert iphone == {
+        "name": "Apple iPhone 15", "price": 1199.99, "original_price": None, "currency": "USD",
+        "url": "https://www.walmart.com/ip/iphone/1", "rating": 4.5, "review_count": 1250,
+        "confidence_score": 0.9
+    }
+    assert galaxy["currency"] == "GBP"
+    assert galaxy["url"] == "https://www.walmart.com/ip/galaxy/2"
+    assert galaxy["rating"] is None
+    assert "confidence_score" not in galaxy
+    # Both were repaired locally (discarded original price, out-of-range rating)
+    assert report.review == [0, 1]
+
+    assert [r["reasons"] for r in report.rejected] == [
+        ["name_missing", "price_missing", "url_invalid"], ["price_out_of_range"]]
+    assert report.reason_counts()["price_missing"] == 1
+
+
+def test_score_record_weights_failed_rules():
+    assert score_record({"name": "TV", "price": 5.0, "url": "https://x.com/1", "rating": 4.0}) == (1.0, [])
+    assert score_record({"name": "Unknown Product", "price": 0.0, "url": "/dp/1"}) == (
+        0.1, ["price", "name", "url"])
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from app.services.rate_limiter import DomainRateLimiter, TokenBucket, domain_of
+
+
+def test_domain_normalization():
+    """URLs and hosts map to the same bucket key"""
+    assert domain_of("https://www.amazon.com/s?k=tv") == "amazon.com"
+    assert domain_of("www.amazon.com") == "amazon.com"
+    assert domain_of("https://BestBuy.com/site") == "bestbuy.com"
+
+
+def test_token_bucket_spaces_out_requests():
+    """After the burst is spent, requests wait for refill"""
+    async def run():
+        bucket = TokenBucket(rate=20.0, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    assert 0.08 <= elapsed < 0.5
+
+
+def test_buckets_are_per_domain():
+    """Each domain gets its own bucket with optional rate overrides"""
+    limiter = DomainRateLimiter(default_rate=1.0, burst=1, overrides={"walmart.com": 5.0})
+    assert limiter.bucket("https://www.amazon.com/s") is limiter.bucket("amazon.com")
+    assert limiter.bucket("https://www.walmart.com/search").rate == 5.0
+    assert limiter.bucket("https://www.bestbuy.com/site").rate == 1.0
+
+
+def test_aimd_backoff_on_throttle_and_recovery():
+    """429s halve the rate and pause the domain; successes add back slowly"""
+    async def run():
+        limiter = DomainRateLimiter(default_rate=1.0, burst=10, max_rate=2.0,
+                                    min_rate=0.1, base_backoff=0.0)
+        url = "https://www.amazon.com/s?k=tv"
+
+        async with limiter.request(url) as permit:
+            permit.report(429)
+        assert limiter.bucket(url).rate == 0.5
+
+        async with limiter.request(url) as permit:
+            permit.report(200, blocked=True)
+        assert limiter.bucket(url).rate == 0.25
+
+        async with limiter.request(url) as permit:
+            permit.report(200)
+        assert abs(limiter.bucket(url).rate - 0.30) < 1e-9
+
+        stats = limiter.snapshot()["amazon.com"]
+        assert stats["throttled"] == 2
+        assert stats["successes"] == 1
+        assert stats["consecutive_throttles"] == 0
+
+    asyncio.run(run())
+
+
+def test_in_flight_requests_are_capped_per_domain():
+    """No more than max_in_flight requests run against one domain"""
+    async def run():
+        limiter = DomainRateLimiter(default_rate=1000.0, burst=1000, max_in_flight=2)
+        peak = 0
+
+        async def hit():
+            nonlocal peak
+            async with limiter.request("https://www.walmart.com/search") as permit:
+                peak = max(peak, limiter.snapshot()["walmart.com"]["in_flight"])
+                await asyncio.sleep(0.01)
+                permit.report(200)
+
+        await asyncio.gather(*(hit() for _ in range(6)))
+        return peak
+
+    assert asyncio.run(run()) == 2
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+from app.schemas import ScrapingRequest
+from app.services.job_store import JobStore
+from app.services.local_redis import LocalRedis
+from app.services.price_index import PriceIndex
+from app.services.scraper_service import ScraperService
+
+
+class FakeScraper:
+    def __init__(self, base_url, delay=0.01):
+        self.base_url = base_url
+        self.delay = delay
+        self.urls = []
+        self.running = 0
+        self.peak = 0
+
+    async def scrape_products(self, url, max_products=100, use_ai_parsing=True):
+        self.urls.append(url)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return [{"name": url, "price": 1.0, "url": url}]
+
+    async def cleanup(self):
+        pass
+
+
+class FakeProductStore:
+    def __init__(self):
+        self.batches = []
+        self.price_index = PriceIndex()
+
+    async def save_batch(self, products, competitor, changes=None):
+        self.batches.append((competitor, products))
+        return {"inserted": len(products), "updated": 0, "unchanged": 0, "skipped": 0}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    service = ScraperService()
+    service.product_store = FakeProductStore()
+    service.job_store = JobStore(client=LocalRedis(), flush_interval=0)
+    service.scrapers = {
+        "amazon": FakeScraper("https://www.amazon.com"),
+        "bestbuy": FakeScraper("https://www.bestbuy.com"),
+        "walmart": FakeScraper("https://www.walmart.com")
+    }
+    return service
+
+
+def test_every_url_is_routed_to_its_site(service):
+    """Each URL is scraped once, by the scraper for its hostname"""
+    request = ScrapingRequest(
+        urls=[f"https://www.amazon.com/s?k=item{i}" for i in range(5)] + [
+            "https://www.bestbuy.com/site/searchpage.jsp?st=tv",
+            "https://www.walmart.com/search?q=tv",
+            "https://www.example.com/search?q=tv"
+        ],
+        target_sites=["amazon", "bestbuy"]
+    )
+    service.job_concurrency = 3
+
+    async def run():
+        job = await service.create_job(request)
+        await service.run_scraping_job(job, request)
+        return job, await service.get_job_status(job.job_id)
+
+    job, stored = asyncio.run(run())
+
+    assert len(service.scrapers["amazon"].urls) == 5
+    assert service.scrapers["amazon"].peak <= 3
+    assert service.scrapers["bestbuy"].urls == ["https://www.bestbuy.com/site/searchpage.jsp?st=tv"]
+    assert service.scrapers["walmart"].urls == []
+
+    urls = job.extra_metadata["urls"]
+    assert urls["https://www.walmart.com/search?q=tv"]["status"] == "skipped"
+    assert urls["https://www.example.com/search?q=tv"]["status"] == "failed"
+    assert urls["https://www.amazon.com/s?k=item0"]["products_found"] == 1
+    assert job.status == "completed"
+    assert job.progress == 1.0
+    assert job.products_scraped == 6
+    assert stored["status"] == "completed"
+    assert stored["products_scraped"] == 6
+    assert stored["urls"]["https://www.walmart.com/search?q=tv"]["status"] == "skipped"
+
+
+class FakeAIService:
+    available = True
+
+    def __init__(self):
+        self.cards = []
+
+    async def extract_products_batch(self, cards, site):
+        self.cards.extend(cards)
+        return [{"name": "Recovered TV", "price": 349.0, "rating": 4.2} for _ in cards]
+
+
+def test_only_low_confidence_records_reach_the_llm(service):
+    """Selector records that score well skip the LLM; weak ones are repaired by it"""
+    products = [
+        {"name": f"TV {i}", "price": 299.0 + i, "rating": 4.0,
+         "url": f"https://www.amazon.com/dp/{i}", "_html": f"<div>TV {i}</div>"}
+        for i in range(19)
+    ] + [{"name": "Unknown Product", "price": 0.0, "rating": None,
+          "url": "https://www.amazon.com/dp/broken", "_html": "<div>broken card</div>"}]
+    service.ai_service = FakeAIService()
+
+    refined = asyncio.run(service._refine_products(products, "amazon-tiered", use_ai_parsing=True))
+
+    assert service.ai_service.cards == ["<div>broken card</div>"]
+    assert refined[-1]["name"] == "Recovered TV"
+    assert refined[-1]["price"] == 349.0
+    assert refined[-1]["rating"] == 4.2
+    assert refined[-1]["confidence_score"] == 1.0
+    assert all(p["confidence_score"] == 1.0 for p in refined)
+    assert not any("_html" in p for p in refined)
+
+    stats = service.get_metrics()["extraction"]["amazon-tiered"]
+    assert stats["records"] == 20
+    assert stats["sent_to_llm"] == 1
+    assert stats["recovered"] == 1
+    assert stats["llm_call_rate"] == 0.05
+
+
+def test_ai_parsing_can_be_disabled(service):
+    products = [{"name": "Unknown Product", "price": 0.0, "url": "/dp/1", "_html": "<div></div>"}]
+    service.ai_service = FakeAIService()
+
+    refined = asyncio.run(service._refine_products(products, "walmart", use_ai_parsing=False))
+
+    assert service.ai_service.cards == []
+    assert refined[0]["confidence_score"] < service.ai_confidence_threshold
+
+
+def test_llm_validation_is_an_opt_in_second_opinion(service):
+    """Only records the local validator repaired are sent to the LLM validator"""
+    class ValidatingAI(FakeAIService):
+        def __init__(self):
+            super().__init__()
+            self.validated = []
+
+        async def validate_product_data(self, data):
+            self.validated.append(data["name"])
+            return {"rating": 4.7}
+
+    products = [
+        {"name": "TV", "price": 299.0, "url": "https://www.amazon.com/dp/B000000001", "rating": 4.0},
+        {"name": "Soundbar", "price": 99.0, "url": "https://www.amazon.com/dp/B000000002", "rating": 47},
+        {"name": "Unknown Product", "price": 0.0, "url": "https://www.amazon.com/dp/B000000003"}
+    ]
+    service.ai_service = ValidatingAI()
+
+    local_only = asyncio.run(service._validate_products([dict(p) for p in products], "amazon"))
+    assert service.ai_service.validated == []
+    assert [p["rating"] for p in local_only] == [4.0, None]
+
+    service.llm_validation = True
+    checked = asyncio.run(service._validate_products([dict(p) for p in products], "amazon"))
+    assert service.ai_service.validated == ["Soundbar"]
+    assert [p["rating"] for p in checked] == [4.0, 4.7]
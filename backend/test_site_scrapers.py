@@ -0,0 +1,302 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.services.fetch_engines import FetchResult, fetch_stats
+from app.services.rate_limiter import DomainRateLimiter
+from app.services.site_scrapers import (
+    AmazonScraper, BestBuyScraper, CrawlState, ListingPage, WalmartScraper
+)
+
+AMAZON_CARD = {
+    "name": "  Apple iPhone 15 Pro Max ",
+    "price": "1,199.",
+    "rating": "4.5 out of 5 stars",
+    "review_count": "1,250",
+    "image_url": "https://m.media-amazon.com/images/iphone.jpg",
+    "url": "/Apple-iPhone-15-Pro-Max/dp/B0CM5KJ8QZ"
+}
+
+
+class FakeNode:
+    def __init__(self, text, attributes):
+        self.text = text
+        self.attributes = attributes
+
+    async def text_content(self):
+        return self.text
+
+    async def get_attribute(self, name):
+        return self.attributes.get(name)
+
+
+class FakeCard:
+    def __init__(self, scraper, raw):
+        self.nodes = {}
+        for field, (selector, attribute) in scraper.field_selectors.items():
+            if raw.get(field) is None:
+                continue
+            node = self.nodes.setdefault(selector, FakeNode(None, {}))
+            if attribute:
+                node.attributes[attribute] = raw[field]
+            else:
+                node.text = raw[field]
+
+    async def query_selector(self, selector):
+        return self.nodes.get(selector)
+
+
+class FakePage:
+    def __init__(self, scraper, raw_records):
+        self.scraper = scraper
+        self.raw_records = raw_records
+        self.evaluate_calls = 0
+
+    async def evaluate(self, script, arg):
+        self.evaluate_calls += 1
+        return self.raw_records[:arg["limit"]]
+
+    async def query_selector_all(self, selector):
+        return [FakeCard(self.scraper, raw) for raw in self.raw_records]
+
+
+def test_normalize_amazon_record():
+    """Raw card strings are parsed into the product dict shape"""
+    product = AmazonScraper().normalize_records([AMAZON_CARD])[0]
+    assert product == {
+        "name": "Apple iPhone 15 Pro Max",
+        "price": 1199.0,
+        "rating": 4.5,
+        "review_count": 1250,
+        "image_url": "https://m.media-amazon.com/images/iphone.jpg",
+        "url": "https://www.amazon.com/Apple-iPhone-15-Pro-Max/dp/B0CM5KJ8QZ",
+        "competitor": "amazon",
+        "availability": "In Stock"
+    }
+
+
+def test_batch_and_element_modes_match():
+    """One evaluate call yields the same records as per-element queries"""
+    scraper = BestBuyScraper()
+    raw_records = [
+        {"name": "iPhone 15", "price": "$799.99", "rating": "Rating 4.7",
+         "image_url": "https://img", "url": "/site/iphone-15/123.p"},
+        {"name": None, "price": None, "rating": None,
+         "image_url": None, "url": None}
+    ]
+    page = FakePage(scraper, raw_records)
+
+    batch = asyncio.run(scraper.extract_products(page, 10))
+    by_element = asyncio.run(scraper._extract_products_by_element(page, 10))
+
+    assert page.evaluate_calls == 1
+    assert batch == by_element
+    assert batch[1]["name"] == "Unknown Product"
+    assert batch[1]["url"] == ""
+
+
+def unthrottled():
+    return DomainRateLimiter(default_rate=1000.0, burst=1000)
+
+
+class FakeHttpEngine:
+    name = "http"
+
+    def __init__(self, html, status=200):
+        self.html = html
+        self.status = status
+
+    async def fetch(self, url):
+        return FetchResult(url, self.status, self.html, self.name)
+
+
+def test_static_engine_parses_listing_html():
+    """Server-rendered cards and the next-page link are read without a browser"""
+    html = """
+        <div data-item-id="1">
+            <a href="/ip/iphone-15/1"><span data-testid="product-title">iPhone 15</span></a>
+            <div data-testid="price-wrap"><span>$699.00</span></div>
+            <img src="https://i5.walmartimages.com/iphone.jpg">
+        </div>
+        <a data-testid="NextPage" href="/search?q=iphone&page=2">Next</a>
+    """
+    scraper = WalmartScraper(http_engine=FakeHttpEngine(html), rate_limiter=unthrottled())
+
+    async def run():
+        listing = await scraper.fetch_listing("https://www.walmart.com/search?q=iphone")
+        return listing, await scraper.extract_listing(listing, 10)
+
+    listing, products = asyncio.run(run())
+    assert listing.next_url == "https://www.walmart.com/search?q=iphone&page=2"
+    assert products == [{
+        "name": "iPhone 15",
+        "price": 699.0,
+        "rating": 0.0,
+        "review_count": 0,
+        "image_url": "https://i5.walmartimages.com/iphone.jpg",
+        "url": "https://www.walmart.com/ip/iphone-15/1",
+        "competitor": "walmart",
+        "availability": "In Stock"
+    }]
+
+    assert "_html" not in products[0]
+
+    # Card markup is only kept when the LLM fallback may need it
+    crawl = CrawlState()
+    crawl.include_html = True
+    listing = asyncio.run(scraper.fetch_listing("https://www.walmart.com/search?q=iphone", crawl))
+    assert listing.products[0]["_html"].startswith('<div data-item-id="1">')
+
+
+def test_static_engine_falls_back_when_blocked():
+    """Blocked responses hand the page over to the browser"""
+    before = fetch_stats.snapshot().get("http", {}).get("fallbacks", 0)
+
+    blocked = WalmartScraper(http_engine=FakeHttpEngine("", status=503),
+                             rate_limiter=unthrottled())
+    assert asyncio.run(blocked._fetch_static("https://www.walmart.com/search?q=tv")) is None
+
+    assert fetch_stats.snapshot()["http"]["fallbacks"] == before + 1
+
+
+class JsShellScraper(WalmartScraper):
+    """Serves an empty static shell; cards and the next-page link only exist once rendered"""
+
+    def __init__(self, pages):
+        super().__init__(http_engine=FakeHttpEngine("<div id='root'></div>"), rate_limiter=unthrottled())
+        self.pages = pages
+        self.rendered = []
+
+    async def _fetch_rendered(self, url, include_html=False):
+        number = int(url.rsplit("=", 1)[1])
+        self.rendered.append(number)
+        products = [{"name": f"Item {number}", "url": f"https://www.walmart.com/ip/{number}"}]
+        next_url = f"https://www.walmart.com/search?page={number + 1}" if number < self.pages else None
+        return ListingPage(url, "browser", products=products, next_url=next_url)
+
+
+def test_unparseable_static_page_follows_the_rendered_next_page():
+    """A JS shell re-fetched in the browser keeps paginating from the rendered page"""
+    scraper = JsShellScraper(pages=3)
+    products = asyncio.run(scraper.scrape_products("https://www.walmart.com/search?page=1", max_products=50))
+
+    assert [p["name"] for p in products] == ["Item 1", "Item 2", "Item 3"]
+    assert scraper.rendered == [1, 2, 3]
+
+
+class LazyGridPage:
+    """A rendered listing whose second batch of cards only loads once scrolled"""
+
+    url = "https://www.bestbuy.com/site/searchpage.jsp?st=tv"
+
+    def __init__(self):
+        self.cards = [{"name": "TV 1", "price": "$100", "url": "/site/tv-1/1.p"}]
+        self.scrolled = False
+
+    async def goto(self, url, wait_until=None):
+        return None
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        return None
+
+    async def evaluate(self, script, arg=None):
+        if "scrollTo" in script:
+            self.scrolled = True
+            self.cards.append({"name": "TV 2", "price": "$200", "url": "/site/tv-2/2.p"})
+        elif isinstance(arg, dict):
+            return self.cards[:arg["limit"]]
+        elif "length" in script:
+            return len(self.cards)
+        return None
+
+    async def wait_for_function(self, script, arg=None, timeout=None):
+        return None
+
+
+class LazyGridScraper(BestBuyScraper):
+    def __init__(self, page):
+        super().__init__(rate_limiter=unthrottled())
+        self.page = page
+
+    @asynccontextmanager
+    async def create_page(self):
+        yield self.page
+
+
+def test_rendered_pages_are_scrolled_for_lazily_loaded_cards():
+    page = LazyGridPage()
+    listing = asyncio.run(LazyGridScraper(page)._fetch_rendered(page.url))
+
+    assert page.scrolled
+    assert [product["name"] for product in listing.products] == ["TV 1", "TV 2"]
+
+
+class PagedScraper(WalmartScraper):
+    """Serves numbered listing pages of three products each"""
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.fetched = []
+
+    async def fetch_listing(self, url, crawl=None):
+        number = int(url.rsplit("=", 1)[1])
+        self.fetched.append(number)
+        products = [
+            {"name": f"Item {number}-{i}", "url": f"https://www.walmart.com/ip/{number}-{i}"}
+            for i in range(3)
+        ]
+        next_url = f"https://www.walmart.com/search?page={number + 1}" if number < self.pages else None
+        return ListingPage(url, "browser", products=products, next_url=next_url)
+
+
+def test_pagination_stops_at_max_products():
+    """Pages are crawled until max_products unique products are collected"""
+    scraper = PagedScraper(pages=10)
+    products = asyncio.run(scraper.scrape_products("https://www.walmart.com/search?page=1", max_products=7))
+
+    assert [p["name"] for p in products][-1] == "Item 3-0"
+    assert len(products) == 7
+    # At most one page is prefetched beyond the last one consumed
+    assert len(scraper.fetched) <= 5
+
+
+class SlowExtractionScraper(PagedScraper):
+    async def extract_listing(self, listing, limit, crawl=None):
+        # Give the producer time to fill the prefetch queue
+        await asyncio.sleep(0.01)
+        return listing.products[:limit]
+
+
+def test_early_stop_with_a_full_prefetch_queue_does_not_hang():
+    """Stopping at max_products while the producer waits on a full queue still returns"""
+    scraper = SlowExtractionScraper(pages=10)
+
+    async def run():
+        return await asyncio.wait_for(
+            scraper.scrape_products("https://www.walmart.com/search?page=1", max_products=4), timeout=2)
+
+    products = asyncio.run(run())
+
+    assert len(products) == 4
+    assert len(scraper.fetched) <= 4
+
+
+def test_pagination_stops_without_next_page():
+    """The crawl ends when no next-page link is discovered"""
+    scraper = PagedScraper(pages=2)
+    products = asyncio.run(scraper.scrape_products("https://www.walmart.com/search?page=1", max_products=50))
+
+    assert len(products) == 6
+    assert scraper.fetched == [1, 2]
+
+
+def test_interception_profile_rules():
+    """Only first-party scripts and data requests survive the Amazon profile"""
+    profile = AmazonScraper.interception_profile
+    assert not profile.should_block("document", "https://www.amazon.com/s?k=tv")
+    assert not profile.should_block("script", "https://m.media-amazon.com/js/app.js")
+    assert not profile.should_block("xhr", "https://www.amazon.com/s/query")
+    assert profile.should_block("image", "https://m.media-amazon.com/images/I/tv.jpg")
+    assert profile.should_block("font", "https://www.amazon.com/font.woff2")
+    assert profile.should_block("script", "https://www.googletagmanager.com/gtm.js")
+    assert profile.should_block("script", "https://cdn.example-widgets.com/w.js")